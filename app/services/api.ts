@@ -123,6 +123,21 @@ export const api = {
         return res.json();
     },
 
+    uploadDocument: async (file: File, meta: Record<string, string | boolean>) => {
+        // multipart/form-data: the browser sets the boundary, so no JSON Content-Type
+        const { "Content-Type": _, ...headers } = getHeaders();
+        const form = new FormData();
+        form.append("file", file);
+        Object.entries(meta).forEach(([key, value]) => form.append(key, String(value)));
+        const res = await fetch(`${API_URL}/documents/upload`, {
+            method: "POST",
+            headers,
+            body: form,
+        });
+        if (!res.ok) throw new Error("Failed to upload document");
+        return res.json();
+    },
+
     deleteDocument: async (id: number) => {
         const res = await fetch(`${API_URL}/documents/${id}`, {
             method: "DELETE",
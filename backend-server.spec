@@ -6,7 +6,7 @@ a = Analysis(
     pathex=['.'],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['pymupdf'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
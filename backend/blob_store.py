@@ -0,0 +1,455 @@
+"""
+Content-addressed on-disk store for document and certificate payloads.
+
+Payload bytes live under <data dir>/blobs/<first two hex chars>/<sha256>;
+database rows only keep the hex digest (doc_ref / cert_ref) and the size, so
+metadata queries never pull file contents through SQLite's page cache.
+Identical payloads are stored once.
+
+Payloads created through the JSON API hold the client's base64 text; files
+uploaded as multipart are stored as raw bytes (put_stream). The owning row
+records which one it is (ENCODING_BASE64 / ENCODING_RAW).
+
+Blobs are compressed on write when that actually saves space
+(backend.utils.codec). The codec is part of the file name (<sha256>.zz for
+zlib, .xz for lzma) and is mirrored in the row's doc_codec / cert_codec
+column; the reference is always the hash of the uncompressed payload, so
+deduplication is unaffected. NULL in a codec column means the blob predates
+compression and has not been looked at by backend.recompress yet.
+
+put() returns early when the blob already exists, so a new row can share a
+blob that a concurrent delete is about to remove. Both sides therefore run
+on the single writer: delete_unreferenced() checks and unlinks as a writer
+job, and the job inserting a row re-checks its blob (put() again, or
+require()) before the INSERT. Whichever runs first, no committed row points
+at a missing file.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple, Union
+from backend.database import DATA_DIR, execute_write
+from backend.utils import codec as codecs
+from backend.utils.codec import CODEC_LZMA, CODEC_NONE, CODEC_ZLIB
+
+BLOB_DIR = os.path.join(DATA_DIR, "blobs")
+
+ENCODING_BASE64 = "base64"
+ENCODING_RAW = "raw"
+
+_SUFFIXES = {CODEC_NONE: "", CODEC_ZLIB: ".zz", CODEC_LZMA: ".xz"}
+
+# Blobs whose files could not be removed (on Windows, while a reader still has
+# them open or mapped): ref -> codec to keep, None for the whole blob.
+# remove_leftovers() retries them.
+_leftovers: Dict[str, Optional[str]] = {}
+_leftovers_lock = threading.Lock()
+
+CHUNK_SIZE = 1024 * 1024
+# Upper bound for streamed uploads; MARINETRACKER_MAX_UPLOAD_MB overrides it
+MAX_UPLOAD_SIZE = int(os.getenv("MARINETRACKER_MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# Decompressed payloads opened for streaming stay in memory up to this size
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+class BlobTooLarge(ValueError):
+    def __init__(self, limit: int):
+        super().__init__(f"Payload exceeds the {limit // (1024 * 1024)} MB limit")
+        self.limit = limit
+
+class BlobMissing(FileNotFoundError):
+    pass
+
+def _tmp_dir() -> str:
+    path = os.path.join(BLOB_DIR, "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def mkstemp(suffix: str = "") -> Tuple[int, str]:
+    """A temp file next to the blobs, so moving it into the store is a rename."""
+    return tempfile.mkstemp(dir=_tmp_dir(), suffix=suffix)
+
+def blob_path(ref: str, codec: Optional[str] = CODEC_NONE) -> str:
+    return os.path.join(BLOB_DIR, ref[:2], ref + _SUFFIXES[codec or CODEC_NONE])
+
+def locate(ref: str, codec: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """
+    (path, codec) of the stored blob, trying the expected codec first. The
+    fallback covers rows whose codec column lags a concurrent recompression.
+    """
+    expected = codec or CODEC_NONE
+    for candidate in (expected,) + tuple(c for c in codecs.CODECS if c != expected):
+        path = blob_path(ref, candidate)
+        if os.path.exists(path):
+            return path, candidate
+    return None
+
+def _open(ref: str, codec: Optional[str]) -> Tuple[BinaryIO, str]:
+    found = locate(ref, codec)
+    if found is None:
+        raise FileNotFoundError(blob_path(ref, codec))
+    path, codec = found
+    return open(path, "rb"), codec
+
+def exists(ref: str) -> bool:
+    return locate(ref) is not None
+
+def require(ref: str):
+    """
+    Call from the writer job that inserts a row pointing at `ref`: raises
+    BlobMissing if a delete removed the blob after it was stored.
+    """
+    if locate(ref) is None:
+        raise BlobMissing(blob_path(ref))
+
+def to_bytes(payload: Union[bytes, str, memoryview]) -> bytes:
+    if isinstance(payload, str):
+        return payload.encode('utf-8')
+    return bytes(payload)
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=_tmp_dir())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def ref_of(payload: Union[bytes, str]) -> str:
+    """The reference put() would give a payload, without storing anything."""
+    return hashlib.sha256(to_bytes(payload)).hexdigest()
+
+def put(payload: Union[bytes, str], compress: bool = True, ref: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Store a payload; returns its SHA-256 reference and the codec it is stored
+    with. Pass ref when the caller already hashed the payload with ref_of().
+    """
+    data = to_bytes(payload)
+    ref = ref or hashlib.sha256(data).hexdigest()
+    found = locate(ref)
+    if found:
+        return ref, found[1]
+    codec, stored = codecs.compress(data) if compress else (CODEC_NONE, data)
+    _write(blob_path(ref, codec), stored)
+    return ref, codec
+
+def _compress_file(tmp_path: str, size: int) -> Tuple[str, str]:
+    """Compress a freshly streamed temp file if it pays off; returns (path, codec) to keep."""
+    with open(tmp_path, "rb") as f:
+        if not codecs.compressible(f.read(codecs.SAMPLE_BYTES)):
+            return tmp_path, CODEC_NONE
+        f.seek(0)
+        if size <= codecs.LZMA_MAX_BYTES:
+            codec, stored = codecs.compress(f.read())
+            if codec == CODEC_NONE:
+                return tmp_path, CODEC_NONE
+            packed_path = tmp_path + _SUFFIXES[codec]
+            with open(packed_path, "wb") as out:
+                out.write(stored)
+                out.flush()
+                os.fsync(out.fileno())
+        else:
+            # Too big to hold in memory or to spend lzma time on
+            codec = CODEC_ZLIB
+            packed_path = tmp_path + _SUFFIXES[codec]
+            with open(packed_path, "wb") as out:
+                written = codecs.copy_compressed(codec, f, out)
+                out.flush()
+                os.fsync(out.fileno())
+            if not codecs.worth_it(size, written):
+                os.remove(packed_path)
+                return tmp_path, CODEC_NONE
+    os.remove(tmp_path)
+    return packed_path, codec
+
+def put_stream(source: BinaryIO, max_size: Optional[int] = None, compress: bool = True) -> Tuple[str, int, str]:
+    """
+    Store a payload read from a file object in CHUNK_SIZE pieces.
+
+    The hash and size are computed while the chunks are written to a temp
+    file, so the payload is never held in memory. Raises BlobTooLarge (and
+    keeps nothing) once more than max_size bytes have been read.
+    Returns (ref, size, codec).
+    """
+    max_size = MAX_UPLOAD_SIZE if max_size is None else max_size
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=_tmp_dir())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise BlobTooLarge(max_size)
+                digest.update(chunk)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+        ref = digest.hexdigest()
+        found = locate(ref)
+        if found:
+            os.remove(tmp_path)
+            return ref, size, found[1]
+        codec = CODEC_NONE
+        if compress:
+            tmp_path, codec = _compress_file(tmp_path, size)
+        path = blob_path(ref, codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        for leftover in (tmp_path, tmp_path + ".zz", tmp_path + ".xz"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    return ref, size, codec
+
+def _map(f: BinaryIO) -> Optional[mmap.mmap]:
+    """Read-only memory map of an open blob file; None for empty files, which can't be mapped."""
+    if os.fstat(f.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def read(ref: Optional[str], codec: Optional[str] = None) -> Optional[bytes]:
+    if not ref:
+        return None
+    f, codec = _open(ref, codec)
+    with f:
+        if codec != CODEC_NONE:
+            return codecs.decompress(codec, f.read())
+        # Uncompressed blobs are copied straight out of the page cache
+        mapped = _map(f)
+        if mapped is None:
+            return b""
+        with mapped:
+            return bytes(mapped)
+
+def read_text(ref: Optional[str], codec: Optional[str] = None) -> Optional[str]:
+    data = read(ref, codec)
+    return data.decode('utf-8') if data is not None else None
+
+def _open_decoded(ref: str, codec: Optional[str]) -> BinaryIO:
+    """A seekable file of the blob's uncompressed bytes."""
+    f, codec = _open(ref, codec)
+    if codec == CODEC_NONE:
+        return f
+    with f:
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, dir=_tmp_dir())
+        try:
+            codecs.copy_decompressed(codec, f, spooled)
+        except BaseException:
+            spooled.close()
+            raise
+    return spooled
+
+def _data_url_offset(head: bytes) -> int:
+    """Where the base64 text starts: past a data: URL prefix, if there is one."""
+    if head.startswith(b"data:") and b"," in head:
+        return head.index(b",") + 1
+    return 0
+
+def _base64_extent(body: int, tail: bytes) -> Tuple[int, int]:
+    """
+    (text length, decoded size) of `body` characters of base64 text ending in
+    `tail`, ignoring a trailing newline and the padding.
+    """
+    stripped = tail.rstrip()
+    text_len = body - (len(tail) - len(stripped))
+    padding = len(stripped) - len(stripped.rstrip(b"="))
+    full, rest = divmod(text_len, 4)
+    return text_len, full * 3 + max(0, rest - 1) - padding
+
+def decoded_size(payload: Union[bytes, str]) -> int:
+    """Size of the bytes a base64 payload (as the JSON API takes it) decodes to."""
+    data = to_bytes(payload)
+    body = len(data) - _data_url_offset(data[:256])
+    return _base64_extent(body, data[len(data) - min(body, 8):])[1]
+
+class Payload:
+    """
+    Random access to a blob's decoded payload bytes.
+
+    Raw blobs are read as-is. Base64 blobs (optionally carrying a data: URL
+    prefix) are decoded on the fly: any decoded byte range maps to a 4-char
+    aligned slice of the text, so a range read only touches the part of the
+    file it needs. The file is opened up front, so a concurrent delete does
+    not break a read already in progress. Uncompressed blobs are
+    memory-mapped, so range reads are slices of the page cache rather than
+    seek/read calls; compressed blobs are decompressed once into a spooled
+    temp file.
+    """
+
+    def __init__(self, ref: str, encoding: Optional[str] = ENCODING_BASE64, codec: Optional[str] = None):
+        self.ref = ref
+        self.media_type = None
+        self._file = _open_decoded(ref, codec)
+        # The stored file itself (CODEC_NONE) is mapped; a decompressed spool is read as a file
+        self._mapped = _map(self._file) if isinstance(self._file, io.BufferedReader) else None
+        stored = self._file.seek(0, os.SEEK_END)
+        self._file.seek(0)
+        self._base64 = encoding != ENCODING_RAW
+        self._offset = 0
+        if not self._base64:
+            self.size = stored
+            return
+
+        head = self._read_stored(0, 256)
+        self._offset = _data_url_offset(head)
+        if self._offset:
+            self.media_type = head[5:self._offset - 1].split(b";")[0].decode("ascii", "replace") or None
+        body = stored - self._offset
+        tail_start = self._offset + max(0, body - 8)
+        self._text_len, self.size = _base64_extent(body, self._read_stored(tail_start, stored - tail_start))
+
+    def iter_range(self, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield decoded bytes start..end (inclusive) in chunks of about chunk_size."""
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+        position = start
+        while position <= end:
+            length = min(chunk_size, end - position + 1)
+            yield self._read(position, length)
+            position += length
+
+    def read(self, start: int = 0, length: Optional[int] = None) -> bytes:
+        if length is None:
+            length = self.size - start
+        return self._read(start, max(0, min(length, self.size - start)))
+
+    def _read_stored(self, start: int, length: int) -> bytes:
+        if self._mapped is not None:
+            return self._mapped[start:start + length]
+        self._file.seek(start)
+        return self._file.read(length)
+
+    def _read(self, start: int, length: int) -> bytes:
+        if not self._base64:
+            return self._read_stored(start, length)
+        # Decoded byte n lives in base64 quantum n // 3 (4 chars)
+        first_quantum = start // 3
+        last_quantum = (start + length - 1) // 3
+        text_start = first_quantum * 4
+        text_end = min((last_quantum + 1) * 4, self._text_len)
+        text = self._read_stored(self._offset + text_start, text_end - text_start)
+        text += b"=" * (-len(text) % 4)
+        try:
+            decoded = base64.b64decode(text)
+        except binascii.Error as e:
+            raise ValueError(f"Blob {self.ref} is not valid base64: {e}")
+        skip = start - first_quantum * 3
+        return decoded[skip:skip + length]
+
+    def close(self):
+        if self._mapped is not None:
+            self._mapped.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def is_referenced(conn, ref: str) -> bool:
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT 1 FROM documents WHERE doc_ref = ?
+        UNION ALL
+        SELECT 1 FROM certificates WHERE cert_ref = ?
+        LIMIT 1
+    ''', (ref, ref))
+    return cursor.fetchone() is not None
+
+def _remove_variants(ref: str, keep: Optional[str] = None) -> int:
+    removed = 0
+    for codec in codecs.CODECS:
+        if codec == keep:
+            continue
+        try:
+            os.remove(blob_path(ref, codec))
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # The row change has committed; leave the file for remove_leftovers()
+            print(f"Could not remove blob {blob_path(ref, codec)}: {e}")
+            with _leftovers_lock:
+                _leftovers[ref] = keep
+    return removed
+
+def is_leftover(ref: str) -> bool:
+    with _leftovers_lock:
+        return ref in _leftovers
+
+def remove_leftovers(conn) -> int:
+    """Writer job: retry the removals that failed earlier; whole blobs only if still unreferenced."""
+    with _leftovers_lock:
+        pending = dict(_leftovers)
+        _leftovers.clear()
+    removed = 0
+    for ref, keep in pending.items():
+        if keep is None:
+            removed += delete_if_unreferenced(conn, ref)
+        else:
+            removed += _remove_variants(ref, keep=keep) > 0
+    return removed
+
+def delete_if_unreferenced(conn, ref: Optional[str]) -> bool:
+    """Remove a blob once no document or certificate row points at it; conn must be the writer's."""
+    if not ref or is_referenced(conn, ref):
+        return False
+    return _remove_variants(ref) > 0
+
+def delete_unreferenced(refs: Iterable[Optional[str]]) -> int:
+    """Remove the blobs among `refs` that no row points at any more, as one writer job."""
+    refs = sorted({ref for ref in refs if ref})
+    if not refs and not _leftovers:
+        return 0
+    return execute_write(lambda conn: remove_leftovers(conn) + sum(delete_if_unreferenced(conn, ref) for ref in refs))
+
+def stored_size(ref: str, codec: Optional[str] = None) -> int:
+    """Bytes the blob takes on disk (0 if it is missing)."""
+    found = locate(ref, codec)
+    return os.path.getsize(found[0]) if found else 0
+
+def recompress(ref: str) -> Tuple[str, int, int]:
+    """
+    Write a compressed copy of an uncompressed blob when that saves space.
+    Returns (codec, bytes before, bytes after); both sizes are 0 when the
+    blob was already compressed. The uncompressed file is left in place:
+    call discard_uncompressed() once the rows point at the new codec.
+    """
+    found = locate(ref)
+    if found is None:
+        raise FileNotFoundError(blob_path(ref))
+    path, current = found
+    if current != CODEC_NONE:
+        return current, 0, 0
+    with open(path, "rb") as f:
+        data = f.read()
+    codec, packed = codecs.compress(data)
+    if codec == CODEC_NONE:
+        return CODEC_NONE, len(data), len(data)
+    # Never swap in a copy that doesn't round-trip to the same content hash
+    if hashlib.sha256(codecs.decompress(codec, packed)).hexdigest() != ref:
+        raise ValueError(f"Blob {ref} did not survive {codec} compression")
+    _write(blob_path(ref, codec), packed)
+    return codec, len(data), len(packed)
+
+def discard_uncompressed(ref: str, codec: str) -> int:
+    """Drop the other stored variants of a blob now kept with `codec`."""
+    if codec in (None, CODEC_NONE):
+        return 0
+    return _remove_variants(ref, keep=codec)
@@ -0,0 +1,329 @@
+"""
+Bulk import of documents from a ZIP archive.
+
+POST /documents/import spools the archive to disk and returns a job at once;
+GET /documents/import/{job_id} reports progress and per-file results.
+
+The job fans the archive's entries out to a process pool. Each worker
+streams its entry straight from the archive into the blob store (hashing and
+compressing it on the way), picks a category from the user's category
+patterns and renders the thumbnail, so the CPU-heavy work runs on every core.
+The job thread collects results as they complete and inserts the rows in
+batches of INSERT_BATCH_SIZE, one writer job (one transaction) per batch.
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from sqlite3 import Connection
+from typing import BinaryIO, List, Optional, Tuple
+
+from backend import blob_store, classifier, duplicates, thumbnails
+from backend.cache import invalidate_user
+from backend.database import execute_write, get_db_connection
+from backend.utils.expiry import status_of
+
+IMPORT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+INSERT_BATCH_SIZE = 50
+# Upper bound for the archive itself; MARINETRACKER_MAX_IMPORT_MB overrides it
+MAX_IMPORT_SIZE = int(os.getenv("MARINETRACKER_MAX_IMPORT_MB", "500")) * 1024 * 1024
+MAX_IMPORT_ENTRIES = 1000
+# Finished jobs kept for status polling, oldest dropped first
+FINISHED_JOBS_KEPT = 20
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Per-file outcomes
+IMPORTED = "imported"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+ERROR = "failed"
+
+_pool = None
+_pool_lock = threading.Lock()
+_jobs = OrderedDict()  # job id -> ImportJob
+_jobs_lock = threading.Lock()
+
+# --- Worker process ------------------------------------------------------------
+
+_archives = {}  # archive path -> open ZipFile, per worker process
+
+def _init_worker(blob_dir: str, thumbnail_dir: str):
+    # Spawned workers re-import the modules; point them at the parent's directories
+    blob_store.BLOB_DIR = blob_dir
+    thumbnails.THUMBNAIL_DIR = thumbnail_dir
+
+def _archive(path: str) -> zipfile.ZipFile:
+    archive = _archives.get(path)
+    if archive is None:
+        for stale in _archives.values():
+            stale.close()
+        _archives.clear()
+        archive = _archives[path] = zipfile.ZipFile(path)
+    return archive
+
+def categorize(name: str, patterns: Tuple[Tuple[str, str], ...]) -> str:
+    """First category whose pattern matches the entry path (case-insensitive), like the documents page."""
+    # Compiled once per worker process for the job's patterns
+    label = classifier.compile_patterns(patterns).classify(name)
+    if label is not None:
+        return label
+    # Files sorted into folders named after a category
+    folder = name.replace("\\", "/").split("/")[0].lower()
+    for label, _ in patterns:
+        if label.lower() == folder:
+            return label
+    return classifier.DEFAULT_CATEGORY
+
+def process_entry(archive_path: str, name: str, patterns: Tuple[Tuple[str, str], ...]) -> dict:
+    """
+    Worker: store one archive entry as a blob, categorize it and render its
+    thumbnail. put_stream enforces MAX_UPLOAD_SIZE on the actual decompressed
+    bytes, whatever size the archive declares.
+    """
+    archive = _archive(archive_path)
+    info = archive.getinfo(name)
+    with archive.open(info) as source:
+        ref, size, codec = blob_store.put_stream(source)
+    thumbnail = None
+    if not thumbnails.is_cached(ref):
+        # A preview is optional: a file that can't be rendered is still imported
+        try:
+            with blob_store.Payload(ref, blob_store.ENCODING_RAW, codec) as payload:
+                thumbnail = thumbnails.render(payload)
+        except Exception as e:
+            print(f"Error rendering thumbnail for {name}: {e}")
+    return {
+        "file": name,
+        "ref": ref,
+        "size": size,
+        "codec": codec,
+        "category": categorize(name, patterns),
+        "modified": datetime(*info.date_time).isoformat(),
+        "thumbnail": thumbnail,
+    }
+
+# --- Job ---------------------------------------------------------------------
+
+class ImportJob:
+    def __init__(self, user_id: int, archive_path: str, entries: List[str], on_duplicate: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.archive_path = archive_path
+        self.entries = entries
+        self.on_duplicate = on_duplicate
+        self.state = QUEUED
+        self.error = None
+        self.results = []
+        self.counts = {IMPORTED: 0, DUPLICATE: 0, REJECTED: 0, ERROR: 0}
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, result: dict):
+        with self._lock:
+            self.results.append(result)
+            self.counts[result["status"]] += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            processed = len(self.results)
+            elapsed = (self.finished or time.perf_counter()) - self.started
+            return {
+                "jobId": self.id,
+                "state": self.state,
+                "error": self.error,
+                "total": len(self.entries),
+                "processed": processed,
+                "progress": round(processed / len(self.entries), 3) if self.entries else 1.0,
+                "counts": dict(self.counts),
+                "elapsedMs": round(elapsed * 1000, 1),
+                "results": list(self.results),
+            }
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs the writer and pool threads is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=IMPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(blob_store.BLOB_DIR, thumbnails.THUMBNAIL_DIR),
+            )
+        return _pool
+
+def _category_patterns(user_id: int) -> Tuple[Tuple[str, str], ...]:
+    conn = get_db_connection()
+    try:
+        # A tuple so workers can cache the compiled classifier by it
+        return tuple(classifier.category_patterns(conn, user_id, classifier.DOCUMENT))
+    finally:
+        conn.close()
+
+def _insert_batch(conn: Connection, user_id: int, rows: List[dict], on_duplicate: str) -> List[dict]:
+    """Writer job: insert one batch of imported files; returns their per-file results."""
+    refs = json.dumps(sorted({row["ref"] for row in rows}))
+    existing = dict(conn.execute(
+        'SELECT doc_ref, MIN(id) FROM documents WHERE user_id = ? AND doc_ref IN (SELECT value FROM json_each(?)) GROUP BY doc_ref',
+        (user_id, refs)
+    ).fetchall())
+    uploaded = datetime.now().isoformat()
+    status = status_of(None)
+    results = []
+    for row in rows:
+        duplicate_of = existing.get(row["ref"])
+        result = {"file": row["file"], "id": None, "category": row["category"], "duplicateOf": duplicate_of}
+        if duplicate_of is not None:
+            duplicates.record("documents", on_duplicate)
+            if on_duplicate == duplicates.DUPLICATE_REUSE:
+                results.append({**result, "status": DUPLICATE, "id": duplicate_of})
+                continue
+            if on_duplicate == duplicates.DUPLICATE_REJECT:
+                results.append({**result, "status": REJECTED})
+                continue
+        if not blob_store.exists(row["ref"]):
+            # Deleted (as unreferenced) between the worker storing it and this insert
+            results.append({**result, "status": ERROR, "error": "The stored file was removed during the import; import it again"})
+            continue
+        name = os.path.basename(row["file"].replace("\\", "/"))
+        cursor = conn.execute(
+            '''INSERT INTO documents (docID, doc_ref, doc_size, doc_encoding, doc_codec, docType, category, status, expiry, docName, issueDate, uploadDate, hidden, archived, issuedBy, user_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            ('', row["ref"], row["size"], blob_store.ENCODING_RAW, row["codec"], os.path.splitext(name)[0], row["category"],
+             status, None, name, row["modified"], uploaded, False, False, 'Self', user_id)
+        )
+        existing.setdefault(row["ref"], cursor.lastrowid)
+        results.append({**result, "status": IMPORTED, "id": cursor.lastrowid})
+    return results
+
+def _flush(job: ImportJob, rows: List[dict]):
+    if not rows:
+        return
+    for result in execute_write(_insert_batch, job.user_id, rows, job.on_duplicate):
+        job.add(result)
+    invalidate_user(job.user_id)
+
+def _run(job: ImportJob):
+    job.state = RUNNING
+    try:
+        patterns = _category_patterns(job.user_id)
+        pool = _get_pool()
+        futures = {pool.submit(process_entry, job.archive_path, name, patterns): name for name in job.entries}
+        pending = []
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except Exception as e:
+                job.add({"file": futures[future], "status": ERROR, "id": None, "error": str(e)})
+                continue
+            if row["thumbnail"]:
+                thumbnails.put(row["ref"], row["thumbnail"])
+            pending.append(row)
+            if len(pending) >= INSERT_BATCH_SIZE:
+                _flush(job, pending)
+                pending = []
+        _flush(job, pending)
+        job.state = DONE
+    except Exception as e:
+        print(f"Error importing archive for job {job.id}: {e}")
+        job.error = str(e)
+        job.state = FAILED
+    finally:
+        job.finished = time.perf_counter()
+        try:
+            os.remove(job.archive_path)
+        except OSError as e:
+            # Windows: a worker may still hold the archive open
+            print(f"Could not remove import archive {job.archive_path}: {e}")
+    counts = job.counts
+    print(f"Import {job.id}: {counts[IMPORTED]} imported, {counts[DUPLICATE] + counts[REJECTED]} duplicates, "
+          f"{counts[ERROR]} failed in {round(job.finished - job.started, 2)}s")
+
+def _spool(source: BinaryIO) -> str:
+    """Copy the uploaded archive to a temp file (zipfile needs random access)."""
+    fd, path = blob_store.mkstemp(suffix=".zip")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = source.read(blob_store.CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_IMPORT_SIZE:
+                    raise blob_store.BlobTooLarge(MAX_IMPORT_SIZE)
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def _entries(path: str) -> List[str]:
+    if not zipfile.is_zipfile(path):
+        raise ValueError("Not a ZIP archive")
+    with zipfile.ZipFile(path) as archive:
+        names = []
+        for info in archive.infolist():
+            base = os.path.basename(info.filename.rstrip("/"))
+            # Folders and OS metadata (__MACOSX/, .DS_Store, ._resource forks)
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith("."):
+                continue
+            names.append(info.filename)
+    if not names:
+        raise ValueError("The archive contains no files")
+    if len(names) > MAX_IMPORT_ENTRIES:
+        raise ValueError(f"The archive has more than {MAX_IMPORT_ENTRIES} files")
+    return names
+
+def start_import(user_id: int, source: BinaryIO, on_duplicate: str = duplicates.DUPLICATE_ALLOW) -> ImportJob:
+    """
+    Spool and validate an archive, then import it on a background thread.
+    Raises ValueError for an unusable archive and BlobTooLarge past the limits.
+    """
+    path = _spool(source)
+    try:
+        entries = _entries(path)
+    except BaseException:
+        os.remove(path)
+        raise
+    job = ImportJob(user_id, path, entries, on_duplicate)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        finished = [j.id for j in _jobs.values() if j.state in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del _jobs[job_id]
+    threading.Thread(target=_run, args=(job,), name=f"import-{job.id[:8]}", daemon=True).start()
+    return job
+
+def get_job(job_id: str, user_id: int) -> Optional[ImportJob]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    return job if job is not None and job.user_id == user_id else None
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def get_import_stats() -> dict:
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return {
+        "workers": IMPORT_WORKERS,
+        "poolStarted": _pool is not None,
+        "running": sum(1 for job in jobs if job.state in (QUEUED, RUNNING)),
+        "tracked": len(jobs),
+    }
@@ -0,0 +1,119 @@
+"""
+Per-user result cache with write-driven invalidation.
+
+Each user has a generation counter that controllers bump after every write
+affecting that user's data. A cached value is served only while its user's
+generation and the local date are unchanged since it was computed, so day
+counts roll over at midnight without a timer. Memory is bounded by LRU
+eviction.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Optional
+
+DASHBOARD_CACHE_SIZE = 256
+SEA_INTERVAL_CACHE_SIZE = 256
+CATEGORY_CACHE_SIZE = 256
+
+class UserCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> (generation, value)
+        self._generations = {}
+        self._epoch = 0  # bumped by clear(); part of every generation
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def _current(self, user_id: int) -> tuple:
+        # The date is part of the generation so entries expire at midnight
+        return (self._epoch, self._generations.get(user_id, 0), date.today())
+
+    def generation(self, user_id: int) -> tuple:
+        with self._lock:
+            return self._current(user_id)
+
+    def get(self, user_id: int):
+        """Cached value for user_id, or None when missing or stale."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                generation, value = entry
+                if generation == self._current(user_id):
+                    self._entries.move_to_end(user_id)
+                    self._hits += 1
+                    return value
+                del self._entries[user_id]
+            self._misses += 1
+            return None
+
+    def put(self, user_id: int, generation: tuple, value: Any):
+        """Store value computed at `generation`; dropped if a write has happened since."""
+        with self._lock:
+            if generation != self._current(user_id):
+                return
+            self._entries[user_id] = (generation, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get_or_compute(self, user_id: int, compute: Callable[[], Any]):
+        # Read the generation before computing: a write that lands meanwhile
+        # bumps it and the result is discarded instead of cached
+        generation = self.generation(user_id)
+        value = self.get(user_id)
+        if value is None:
+            value = compute()
+            self.put(user_id, generation, value)
+        return value
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+            self._invalidations += 1
+
+    def clear(self):
+        """Drop every entry (bulk changes such as the status sweep)."""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 3) if lookups else 0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+dashboard_cache = UserCache(DASHBOARD_CACHE_SIZE)
+sea_interval_cache = UserCache(SEA_INTERVAL_CACHE_SIZE)
+# Compiled category classifiers (backend.classifier), per user
+category_cache = UserCache(CATEGORY_CACHE_SIZE)
+
+def invalidate_user(user_id: int):
+    """Call after any write that changes a user's certificates, documents or sea time."""
+    dashboard_cache.invalidate(user_id)
+    sea_interval_cache.invalidate(user_id)
+
+def invalidate_categories(user_id: Optional[int] = None):
+    """Call after a category write; None (a system category changed) drops every user's classifier."""
+    if user_id is None:
+        category_cache.clear()
+    else:
+        category_cache.invalidate(user_id)
+
+def get_cache_stats() -> dict:
+    return {"dashboard": dashboard_cache.stats(), "seaIntervals": sea_interval_cache.stats(),
+            "categories": category_cache.stats()}
@@ -0,0 +1,112 @@
+"""
+Category auto-tagging from document_categories.pattern.
+
+A pattern is a case-insensitive regex, in practice pipe-separated keywords
+such as 'passport|visa|book|seaman|travel'. All of a user's patterns for a
+scope (their own plus the system ones, in id order) are compiled into one
+alternation of zero-width lookaheads:
+
+    (?=(?P<c0>passport|visa|...)|(?P<c1>safety|stcw|...)|...)
+
+finditer() then visits every position of the text once, and at each
+position the lowest-numbered alternative that matches wins. The smallest
+winner over the whole text is the first category, in priority order, whose
+pattern matches anywhere, which is what testing each pattern in turn
+would give, at the cost of one pass per text.
+
+Compiled classifiers are cached per user in backend.cache.category_cache
+until that user's categories change (or any system category does).
+"""
+import re
+from functools import lru_cache
+from sqlite3 import Connection
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from backend.cache import category_cache
+
+if TYPE_CHECKING:
+    # backend.database imports the migrations, which import this module
+    from backend.database import UnitOfWork
+
+DOCUMENT = "document"
+CERTIFICATE = "certificate"
+SCOPES = (DOCUMENT, CERTIFICATE)
+
+# Imported files that match no pattern (nor a category-named folder)
+DEFAULT_CATEGORY = "Other"
+
+class Classifier:
+    def __init__(self, categories: Iterable[Tuple[str, str]]):
+        """categories: (label, pattern) in priority order; invalid patterns are skipped."""
+        self.labels = []
+        self._patterns = []
+        for label, pattern in categories:
+            if not pattern:
+                continue
+            try:
+                self._patterns.append(re.compile(pattern, re.IGNORECASE))
+            except re.error:
+                continue
+            self.labels.append(label)
+        self._combined = None
+        if self._patterns:
+            alternatives = "|".join(f"(?P<c{i}>{p.pattern})" for i, p in enumerate(self._patterns))
+            try:
+                self._combined = re.compile(f"(?={alternatives})", re.IGNORECASE)
+            except re.error:
+                # Patterns that only compile alone (clashing group names,
+                # numbered backreferences) fall back to one search each
+                self._combined = None
+
+    def classify(self, text: Optional[str]) -> Optional[str]:
+        """Label of the first category whose pattern matches `text`, or None."""
+        if not text or not self._patterns:
+            return None
+        if self._combined is None:
+            for label, pattern in zip(self.labels, self._patterns):
+                if pattern.search(text):
+                    return label
+            return None
+        best = None
+        for match in self._combined.finditer(text):
+            # The outermost group closes last, so lastgroup is the cN wrapper
+            index = int(match.lastgroup[1:])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return self.labels[best] if best is not None else None
+
+    def classify_many(self, texts: Iterable[Optional[str]]) -> List[Optional[str]]:
+        return [self.classify(text) for text in texts]
+
+@lru_cache(maxsize=64)
+def compile_patterns(categories: Tuple[Tuple[str, str], ...]) -> Classifier:
+    """Classifier for a fixed (label, pattern) tuple; used where there is no database (import workers)."""
+    return Classifier(categories)
+
+def category_patterns(conn: Connection, user_id: int, scope: str) -> List[Tuple[str, str]]:
+    rows = conn.execute('''
+        SELECT label, pattern FROM document_categories
+        WHERE (user_id = ? OR is_system = 1) AND scope = ? AND pattern IS NOT NULL AND pattern != ''
+        ORDER BY id
+    ''', (user_id, scope)).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+def _load(conn: Connection, user_id: int) -> Dict[str, Classifier]:
+    return {scope: Classifier(category_patterns(conn, user_id, scope)) for scope in SCOPES}
+
+def get_classifier(db: "UnitOfWork", user_id: int, scope: str) -> Classifier:
+    """The user's compiled classifier for `scope`, built on first use after a category change."""
+    def compute():
+        # Fresh snapshot after the cache generation has been read, as for the dashboard
+        db.refresh()
+        return _load(db.conn, user_id)
+
+    return category_cache.get_or_compute(user_id, compute)[scope]
+
+def document_text(docType: Optional[str], docName: Optional[str]) -> str:
+    return f"{docType or ''} {docName or ''}"
+
+def certificate_text(certType: Optional[str], certName: Optional[str]) -> str:
+    return f"{certType or ''} {certName or ''}"
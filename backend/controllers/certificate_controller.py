@@ -1,131 +1,248 @@
-from typing import List, Optional
-from backend.database import get_db_connection
+from typing import List, Optional, Tuple
+from backend.database import UnitOfWork
+from backend import blob_store, classifier, duplicates
+from backend.cache import invalidate_user
+from backend.utils import batch, fieldsets, pagination
+from backend.utils.expiry import status_of
+from backend.models.batch import BatchOperation, BatchResponse
 from backend.models.certificate import Certificate, CertificateCreate, CertificateUpdate, CertificateSummary
+from pydantic import ValidationError
+import json
 import sqlite3
-from datetime import datetime
-
-def create_certificate(cert: CertificateCreate, user_id: int) -> Certificate:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        '''INSERT INTO certificates (cert, certType, issuedBy, status, expiry, certName, issueDate, uploadDate, hidden, user_id) 
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        (cert.cert, cert.certType, cert.issuedBy, cert.status, cert.expiry_date.isoformat() if cert.expiry_date else None, 
-         cert.certName, cert.issueDate.isoformat() if cert.issueDate else None, cert.uploadDate.isoformat() if cert.uploadDate else None, cert.hidden, user_id)
-    )
-    cert_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return Certificate(id=cert_id, user_id=user_id, **cert.model_dump())
-
-def update_certificate(cert_id: int, cert_update: CertificateUpdate, user_id: int) -> Optional[Certificate]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+from datetime import date, datetime
+
+# Fields a batch update may change; the payload and status are not among them
+BATCH_UPDATE_FIELDS = {'certType', 'issuedBy', 'expiry', 'certName', 'issueDate', 'hidden', 'category'}
+SORTABLE_FIELDS = ('uploadDate', 'expiry')
+
+# Sparse fieldsets: API field -> column; None marks the payload, read from the blob store
+_BASE_COLUMNS = {name: name for name in (
+    'id', 'certType', 'issuedBy', 'status', 'certName', 'issueDate', 'uploadDate', 'hidden', 'category', 'user_id'
+)}
+SUMMARY_COLUMNS = {**_BASE_COLUMNS, 'expiry': 'expiry'}
+DETAIL_COLUMNS = {**_BASE_COLUMNS, 'expiry_date': 'expiry', 'cert': None}
+
+def create_certificate(db: UnitOfWork, cert: CertificateCreate, user_id: int, on_duplicate: str = duplicates.DUPLICATE_ALLOW) -> Certificate:
+    cert_bytes = blob_store.to_bytes(cert.cert)
+    # Hash first: a rejected or reused duplicate never touches the blob store
+    cert_ref = blob_store.ref_of(cert_bytes)
+    duplicate_of = duplicates.check(db.conn, 'certificates', user_id, cert_ref, on_duplicate)
+    if duplicate_of is not None and on_duplicate == duplicates.DUPLICATE_REUSE:
+        return get_certificate_by_id(db, duplicate_of, user_id).model_copy(update={'duplicateOf': duplicate_of})
+    blob_store.put(cert_bytes, ref=cert_ref)
+    status = status_of(cert.expiry_date)
+    category = cert.category or classifier.get_classifier(db, user_id, classifier.CERTIFICATE).classify(
+        classifier.certificate_text(cert.certType, cert.certName)
+    ) or classifier.DEFAULT_CATEGORY
+
+    def insert(conn):
+        # The check above ran on the read snapshot; repeat it here, serialized with other creates
+        existing = duplicate_of if duplicate_of is not None else duplicates.check(conn, 'certificates', user_id, cert_ref, on_duplicate)
+        if existing is not None and on_duplicate == duplicates.DUPLICATE_REUSE:
+            return None, existing
+        # Stores the blob again if a concurrent delete removed it (just a stat otherwise)
+        _, codec = blob_store.put(cert_bytes, ref=cert_ref)
+        cursor = conn.execute(
+            '''INSERT INTO certificates (cert_ref, cert_size, cert_codec, certType, issuedBy, status, expiry, certName, issueDate, uploadDate, hidden, category, user_id) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (cert_ref, blob_store.decoded_size(cert_bytes), codec, cert.certType, cert.issuedBy, status, cert.expiry_date.isoformat() if cert.expiry_date else None, 
+             cert.certName, cert.issueDate.isoformat() if cert.issueDate else None, cert.uploadDate.isoformat() if cert.uploadDate else None, cert.hidden,
+             category, user_id)
+        )
+        return cursor.lastrowid, existing
+
+    cert_id, duplicate_of = db.write(insert)
+    if cert_id is None:
+        return get_certificate_by_id(db, duplicate_of, user_id).model_copy(update={'duplicateOf': duplicate_of})
+    invalidate_user(user_id)
+    return Certificate(id=cert_id, user_id=user_id, duplicateOf=duplicate_of, **{**cert.model_dump(), 'status': status, 'category': category})
+
+def update_certificate(db: UnitOfWork, cert_id: int, cert_update: CertificateUpdate, user_id: int) -> Optional[Certificate]:
     # Filter out None values to update only provided fields
     update_data = {k: v for k, v in cert_update.model_dump().items() if v is not None}
+    # status is derived from expiry, never taken from the client
+    update_data.pop('status', None)
     
     if not update_data:
-        conn.close()
-        return get_certificate_by_id(cert_id, user_id)
+        return get_certificate_by_id(db, cert_id, user_id)
 
     # Convert datetime objects to isoformat strings
     for key, value in update_data.items():
         if isinstance(value, datetime):
             update_data[key] = value.isoformat()
 
+    if 'expiry' in update_data:
+        update_data['status'] = status_of(update_data['expiry'])
+
+    # Payload goes to the blob store; the row only keeps its reference
+    cert_bytes = None
+    if 'cert' in update_data:
+        cert_bytes = blob_store.to_bytes(update_data.pop('cert'))
+        update_data['cert_ref'], update_data['cert_codec'] = blob_store.put(cert_bytes)
+        update_data['cert_size'] = blob_store.decoded_size(cert_bytes)
+
     set_clause = ', '.join([f"{key} = ?" for key in update_data.keys()])
-    values = list(update_data.values())
-    values.append(cert_id)
-    values.append(user_id)
 
-    cursor.execute(f'UPDATE certificates SET {set_clause} WHERE id = ? AND user_id = ?', values)
-    conn.commit()
-    
-    rows_affected = cursor.rowcount
-    conn.close()
-    
+    def update(conn):
+        old_ref = None
+        if cert_bytes is not None:
+            # As in create_certificate: stores the blob again if a concurrent delete removed it
+            update_data['cert_codec'] = blob_store.put(cert_bytes, ref=update_data['cert_ref'])[1]
+            row = conn.execute('SELECT cert_ref FROM certificates WHERE id = ? AND user_id = ?', (cert_id, user_id)).fetchone()
+            old_ref = row['cert_ref'] if row else None
+        values = list(update_data.values()) + [cert_id, user_id]
+        cursor = conn.execute(f'UPDATE certificates SET {set_clause} WHERE id = ? AND user_id = ?', values)
+        return cursor.rowcount, old_ref
+
+    rows_affected, old_ref = db.write(update)
+    invalidate_user(user_id)
+    if rows_affected == 0 and cert_bytes is not None:
+        # No such certificate for this user: drop the payload stored for it
+        blob_store.delete_unreferenced([update_data['cert_ref']])
+    elif old_ref and old_ref != update_data['cert_ref']:
+        blob_store.delete_unreferenced([old_ref])
+
     if rows_affected > 0:
-        return get_certificate_by_id(cert_id, user_id)
+        return get_certificate_by_id(db, cert_id, user_id)
     return None
 
-def get_certificates(user_id: int) -> List[CertificateSummary]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM certificates WHERE user_id = ?', (user_id,))
-    rows = cursor.fetchall()
-    
-    if not rows:
-        conn.close()
-        return []
+def get_certificates(
+    db: UnitOfWork,
+    user_id: int,
+    status: Optional[List[str]] = None,
+    cert_type: Optional[List[str]] = None,
+    hidden: Optional[bool] = None,
+    category: Optional[List[str]] = None,
+    expiry_from: Optional[date] = None,
+    expiry_to: Optional[date] = None,
+    sort: str = '-uploadDate',
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    count: bool = False,
+    fields: Optional[List[str]] = None,
+) -> Tuple[list, Optional[str], Optional[int]]:
+    """One page of the user's certificates: (summaries, next page cursor, total if count), partial with `fields`."""
+    pagination.parse_sort(sort, SORTABLE_FIELDS)
+    # status is kept current at write time and by the daily sweep
+    where, params = ['user_id = ?'], [user_id]
+    for conditions, values in (
+        pagination.one_of('status', status),
+        pagination.one_of('certType', cert_type),
+        pagination.one_of('category', category),
+        pagination.date_range('expiry', expiry_from, expiry_to),
+    ):
+        where += conditions
+        params += values
+    if hidden is not None:
+        where.append('hidden = ?')
+        params.append(hidden)
+    columns = fieldsets.select_list(fields or list(SUMMARY_COLUMNS), SUMMARY_COLUMNS)
+    rows, next_cursor, total = pagination.fetch_page(db.conn, 'certificates', columns, where, params, sort, cursor, limit, count)
+    if fields is not None:
+        return [fieldsets.build(CertificateSummary, fields, dict(row)) for row in rows], next_cursor, total
+    return [CertificateSummary(**dict(row)) for row in rows], next_cursor, total
 
-    certificates = []
-    updates_made = False
-    
-    for row in rows:
-        cert_dict = dict(row)
-        try:
-            # Parse expiry date
-            expiry_val = cert_dict['expiry']
-            expiry_date = None
-            if expiry_val:
-                if isinstance(expiry_val, str):
-                    # Handle potential Z suffix or other ISO variations if needed
-                    expiry_date = datetime.fromisoformat(expiry_val.replace('Z', '+00:00'))
-                else:
-                    expiry_date = expiry_val
-                
-            # Calculate updated status
-            new_status = cert_dict['status']
-            
-            if expiry_date:
-                today = datetime.now()
-                if expiry_date.tzinfo:
-                    today = today.astimezone()
-    
-                delta = expiry_date - today
-                
-                new_status = "VALID"
-                if delta.total_seconds() < 0:
-                     new_status = "EXPIRED"
-                elif delta.days <= 90:
-                     new_status = "EXPIRING"
-            else:
-                # No expiry date = Unlimited validity
-                new_status = "VALID"
-            
-            # Update if different
-            if cert_dict['status'] != new_status:
-                cursor.execute('UPDATE certificates SET status = ? WHERE id = ? AND user_id = ?', (new_status, cert_dict['id'], user_id))
-                cert_dict['status'] = new_status
-                updates_made = True
-                
-        except Exception as e:
-            print(f"Error checking status for cert {cert_dict.get('id')}: {e}")
-
-        certificates.append(CertificateSummary(**cert_dict))
-    
-    if updates_made:
-        conn.commit()
-        
-    conn.close()
-    return certificates
-
-def get_certificate_by_id(cert_id: int, user_id: int) -> Optional[Certificate]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM certificates WHERE id = ? AND user_id = ?', (cert_id, user_id))
+def get_certificate_by_id(db: UnitOfWork, cert_id: int, user_id: int, fields: Optional[List[str]] = None):
+    """The certificate with its payload, or a partial model of just `fields` (the payload only if listed)."""
+    cursor = db.conn.cursor()
+    if fields is None:
+        cursor.execute('SELECT * FROM certificates WHERE id = ? AND user_id = ?', (cert_id, user_id))
+    else:
+        columns = fieldsets.select_list(fields, DETAIL_COLUMNS)
+        if 'cert' in fields:
+            columns += ', cert_ref, cert_codec'
+        cursor.execute(f'SELECT {columns} FROM certificates WHERE id = ? AND user_id = ?', (cert_id, user_id))
     row = cursor.fetchone()
-    conn.close()
     if row:
-        return Certificate(**dict(row))
+        cert_dict = dict(row)
+        if cert_dict.get('cert_ref'):
+            cert_dict['cert'] = blob_store.read_text(cert_dict['cert_ref'], cert_dict['cert_codec'])
+        if fields is not None:
+            return fieldsets.build(Certificate, fields, cert_dict)
+        return Certificate(**cert_dict)
     return None
 
-def delete_certificate(cert_id: int, user_id: int) -> bool:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM certificates WHERE id = ? AND user_id = ?', (cert_id, user_id))
-    conn.commit()
-    changes = cursor.rowcount
-    conn.close()
+def get_certificate_payload(db: UnitOfWork, cert_id: int, user_id: int) -> Optional[Tuple[blob_store.Payload, str]]:
+    """Open the certificate's payload (stored as base64 text) for streaming; None if missing."""
+    cursor = db.conn.cursor()
+    cursor.execute('SELECT cert_ref, cert_codec, certName FROM certificates WHERE id = ? AND user_id = ?', (cert_id, user_id))
+    row = cursor.fetchone()
+    if not row or not row['cert_ref']:
+        return None
+    return blob_store.Payload(row['cert_ref'], blob_store.ENCODING_BASE64, row['cert_codec']), row['certName']
+
+def delete_certificate(db: UnitOfWork, cert_id: int, user_id: int) -> bool:
+    def delete(conn):
+        row = conn.execute('SELECT cert_ref FROM certificates WHERE id = ? AND user_id = ?', (cert_id, user_id)).fetchone()
+        cursor = conn.execute('DELETE FROM certificates WHERE id = ? AND user_id = ?', (cert_id, user_id))
+        return cursor.rowcount, row['cert_ref'] if row else None
+
+    changes, cert_ref = db.write(delete)
+    invalidate_user(user_id)
+    blob_store.delete_unreferenced([cert_ref])
     return changes > 0
+
+def _batch_changes(changes: dict) -> dict:
+    # Validated through CertificateUpdate so types match the single-item PUT
+    update = CertificateUpdate(**{k: v for k, v in changes.items() if k in BATCH_UPDATE_FIELDS})
+    update_data = {k: v.isoformat() if isinstance(v, datetime) else v
+                   for k, v in update.model_dump(exclude_none=True).items()}
+    if 'expiry' in update_data:
+        update_data['status'] = status_of(update_data['expiry'])
+    return update_data
+
+def _check_batch_operation(op: BatchOperation) -> Optional[str]:
+    if op.op == batch.UPDATE:
+        try:
+            if not op.changes or not _batch_changes(op.changes):
+                return f"update needs changes to any of: {', '.join(sorted(BATCH_UPDATE_FIELDS))}"
+        except ValidationError as e:
+            return f"Invalid changes: {e.errors()[0]['loc'][0]}: {e.errors()[0]['msg']}"
+    elif op.op == batch.ARCHIVE:
+        return "Certificates can't be archived; hide them with an update"
+    elif op.op != batch.DELETE:
+        return f"Unknown op: {op.op}"
+    return None
+
+def apply_batch(db: UnitOfWork, operations: List[BatchOperation], user_id: int) -> BatchResponse:
+    """Apply update / delete operations in one transaction; per-item results."""
+    valid, errors = batch.validate(operations, _check_batch_operation)
+
+    def apply(conn):
+        found = batch.owned_ids(conn, 'certificates', user_id, [op.id for op in valid])
+        ops = [op for op in valid if op.id in found]
+        batch.apply_updates(conn, 'certificates', user_id,
+                            [(op.id, _batch_changes(op.changes)) for op in ops if op.op == batch.UPDATE])
+        deleted = [op.id for op in ops if op.op == batch.DELETE]
+        refs = []
+        if deleted:
+            refs = [row[0] for row in conn.execute(
+                'SELECT DISTINCT cert_ref FROM certificates WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))',
+                (user_id, json.dumps(deleted))
+            )]
+            conn.executemany('DELETE FROM certificates WHERE id = ? AND user_id = ?', [(cert_id, user_id) for cert_id in deleted])
+        return found, refs
+
+    found, refs = db.write(apply) if valid else (set(), [])
+    if found:
+        invalidate_user(user_id)
+    blob_store.delete_unreferenced(refs)
+    return batch.summarize(operations, errors, found)
+
+def reclassify_certificates(db: UnitOfWork, user_id: int) -> dict:
+    """Re-run the category patterns over all of the user's certificates; rows no pattern matches keep their category."""
+    categorize = classifier.get_classifier(db, user_id, classifier.CERTIFICATE).classify
+    rows = db.conn.execute('SELECT id, certType, certName, category FROM certificates WHERE user_id = ?', (user_id,)).fetchall()
+    matched = 0
+    updates = []
+    for row in rows:
+        label = categorize(classifier.certificate_text(row['certType'], row['certName']))
+        if label is None:
+            continue
+        matched += 1
+        if label != row['category']:
+            updates.append((label, row['id'], user_id))
+    if updates:
+        db.write(lambda conn: conn.executemany('UPDATE certificates SET category = ? WHERE id = ? AND user_id = ?', updates))
+        invalidate_user(user_id)
+    return {"scanned": len(rows), "matched": matched, "changed": len(updates)}
@@ -1,112 +1,172 @@
+import base64
+import json
 import sqlite3
-from backend.database import get_db_connection
-from backend.models.document import Document, DocumentCreate, DocumentSummary
-from typing import List, Optional
-
-def create_document(doc: DocumentCreate, user_id: int) -> Document:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        '''INSERT INTO documents (docID, doc, docType, category, status, expiry, docName, issueDate, uploadDate, hidden, archived,  issuedBy, user_id) 
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        (doc.docID, doc.doc, doc.docType, doc.category, doc.status, doc.expiry.isoformat() if doc.expiry else None, 
-         doc.docName, doc.issueDate.isoformat(), doc.uploadDate.isoformat(), doc.hidden, doc.archived, doc.issuedBy, user_id)
+from backend.database import UnitOfWork
+from backend import blob_store, classifier, duplicates, thumbnails
+from backend.cache import invalidate_user
+from backend.utils import batch, fieldsets, pagination
+from backend.utils.expiry import status_of
+from backend.models.batch import BatchOperation, BatchResponse
+from backend.models.document import Document, DocumentBase, DocumentCreate, DocumentSummary, DocumentUpdate
+from datetime import date, datetime
+from pydantic import ValidationError
+from typing import BinaryIO, List, Optional, Tuple
+
+UPDATABLE_FIELDS = {'docName', 'docType', 'issuedBy', 'issueDate', 'expiry', 'category'}
+SORTABLE_FIELDS = ('uploadDate', 'expiry')
+
+# Sparse fieldsets: API field -> column; None marks the payload, read from the blob store
+_BASE_COLUMNS = {name: name for name in (
+    'id', 'docID', 'docType', 'category', 'status', 'expiry', 'docName', 'issueDate', 'uploadDate', 'hidden', 'archived',
+    'issuedBy', 'user_id'
+)}
+SUMMARY_COLUMNS = {**_BASE_COLUMNS, 'docSize': 'doc_size'}
+DETAIL_COLUMNS = {**_BASE_COLUMNS, 'doc': None}
+
+def _category(db: UnitOfWork, doc: DocumentBase, user_id: int) -> str:
+    # A blank category asks for one from the user's category patterns
+    if doc.category.strip():
+        return doc.category
+    label = classifier.get_classifier(db, user_id, classifier.DOCUMENT).classify(
+        classifier.document_text(doc.docType, doc.docName)
     )
-    doc_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return Document(id=doc_id, user_id=user_id, **doc.model_dump())
-
-def calculate_status(expiry_str: Optional[str]) -> str:
-    if not expiry_str:
-        return "VALID"
+    return label or classifier.DEFAULT_CATEGORY
+
+def create_document(db: UnitOfWork, doc: DocumentCreate, user_id: int, on_duplicate: str = duplicates.DUPLICATE_ALLOW) -> Document:
+    # Hash first: a rejected or reused duplicate never touches the blob store
+    doc_ref = blob_store.ref_of(doc.doc)
+    duplicate_of = duplicates.check(db.conn, 'documents', user_id, doc_ref, on_duplicate)
+    if duplicate_of is not None and on_duplicate == duplicates.DUPLICATE_REUSE:
+        return get_document_by_id(db, duplicate_of, user_id).model_copy(update={'duplicateOf': duplicate_of})
+    blob_store.put(doc.doc, ref=doc_ref)
+    status = status_of(doc.expiry)
+    category = _category(db, doc, user_id)
+
+    def insert(conn):
+        # The check above ran on the read snapshot; repeat it here, serialized with other creates
+        existing = duplicate_of if duplicate_of is not None else duplicates.check(conn, 'documents', user_id, doc_ref, on_duplicate)
+        if existing is not None and on_duplicate == duplicates.DUPLICATE_REUSE:
+            return None, None, existing
+        # Stores the blob again if a concurrent delete removed it (just a stat otherwise)
+        _, codec = blob_store.put(doc.doc, ref=doc_ref)
+        cursor = conn.execute(
+            '''INSERT INTO documents (docID, doc_ref, doc_size, doc_codec, docType, category, status, expiry, docName, issueDate, uploadDate, hidden, archived,  issuedBy, user_id) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (doc.docID, doc_ref, blob_store.decoded_size(doc.doc), codec, doc.docType, category, status, doc.expiry.isoformat() if doc.expiry else None, 
+             doc.docName, doc.issueDate.isoformat(), doc.uploadDate.isoformat(), doc.hidden, doc.archived, doc.issuedBy, user_id)
+        )
+        return cursor.lastrowid, codec, existing
+
+    doc_id, doc_codec, duplicate_of = db.write(insert)
+    if doc_id is None:
+        return get_document_by_id(db, duplicate_of, user_id).model_copy(update={'duplicateOf': duplicate_of})
+    invalidate_user(user_id)
+    thumbnails.schedule(doc_ref, blob_store.ENCODING_BASE64, doc_codec)
+    return Document(id=doc_id, user_id=user_id, duplicateOf=duplicate_of, **{**doc.model_dump(), 'status': status, 'category': category})
+
+def create_document_from_upload(db: UnitOfWork, meta: DocumentBase, source: BinaryIO, user_id: int,
+                                on_duplicate: str = duplicates.DUPLICATE_ALLOW) -> DocumentSummary:
+    """Create a document whose payload is streamed from a file object (multipart upload)."""
+    # A duplicate's blob already exists, so put_stream keeps nothing new for it
+    doc_ref, doc_size, doc_codec = blob_store.put_stream(source)
+    duplicate_of = duplicates.check(db.conn, 'documents', user_id, doc_ref, on_duplicate)
+    if duplicate_of is not None and on_duplicate == duplicates.DUPLICATE_REUSE:
+        return get_document_summary(db, duplicate_of, user_id).model_copy(update={'duplicateOf': duplicate_of})
+    status = status_of(meta.expiry)
+    category = _category(db, meta, user_id)
+
+    def insert(conn):
+        # The check above ran on the read snapshot; repeat it here, serialized with other creates
+        existing = duplicate_of if duplicate_of is not None else duplicates.check(conn, 'documents', user_id, doc_ref, on_duplicate)
+        if existing is not None and on_duplicate == duplicates.DUPLICATE_REUSE:
+            return None, existing
+        blob_store.require(doc_ref)
+        cursor = conn.execute(
+            '''INSERT INTO documents (docID, doc_ref, doc_size, doc_encoding, doc_codec, docType, category, status, expiry, docName, issueDate, uploadDate, hidden, archived, issuedBy, user_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (meta.docID, doc_ref, doc_size, blob_store.ENCODING_RAW, doc_codec, meta.docType, category, status,
+             meta.expiry.isoformat() if meta.expiry else None, meta.docName, meta.issueDate.isoformat(),
+             meta.uploadDate.isoformat(), meta.hidden, meta.archived, meta.issuedBy, user_id)
+        )
+        return cursor.lastrowid, existing
+
     try:
-        from datetime import datetime, timedelta
-        expiry_date = datetime.fromisoformat(expiry_str).date() if 'T' in expiry_str else datetime.strptime(expiry_str, "%Y-%m-%d").date()
-        today = datetime.now().date()
-        
-        if expiry_date < today:
-            return "EXPIRED"
-        elif expiry_date <= today + timedelta(days=90):
-            return "EXPIRING"
-        else:
-            return "VALID"
-    except Exception:
-        return "VALID" # Fallback
-
-def get_documents(user_id: int, archived: bool = False) -> List[DocumentSummary]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
+        doc_id, duplicate_of = db.write(insert)
+    except blob_store.BlobMissing:
+        # A concurrent delete removed the existing blob this upload was deduplicated against
+        source.seek(0)
+        doc_ref, doc_size, doc_codec = blob_store.put_stream(source)
+        doc_id, duplicate_of = db.write(insert)
+    if doc_id is None:
+        return get_document_summary(db, duplicate_of, user_id).model_copy(update={'duplicateOf': duplicate_of})
+    invalidate_user(user_id)
+    thumbnails.schedule(doc_ref, blob_store.ENCODING_RAW, doc_codec)
+    return DocumentSummary(id=doc_id, user_id=user_id, docSize=doc_size, duplicateOf=duplicate_of,
+                           **{**meta.model_dump(), 'status': status, 'category': category})
+
+def get_documents(
+    db: UnitOfWork,
+    user_id: int,
+    archived: bool = False,
+    status: Optional[List[str]] = None,
+    category: Optional[List[str]] = None,
+    hidden: Optional[bool] = None,
+    expiry_from: Optional[date] = None,
+    expiry_to: Optional[date] = None,
+    sort: str = '-uploadDate',
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    count: bool = False,
+    fields: Optional[List[str]] = None,
+) -> Tuple[list, Optional[str], Optional[int]]:
+    """
+    One page of the user's documents: (summaries, next page cursor, total if
+    count). With `fields` (from fieldsets.parse) only those columns are read
+    and the summaries are partial models.
+    """
+    pagination.parse_sort(sort, SORTABLE_FIELDS)
+    # status is kept current at write time and by the daily sweep
+    where, params = ['user_id = ?', 'archived = ?'], [user_id, archived]
+    for conditions, values in (
+        pagination.one_of('status', status),
+        pagination.one_of('category', category),
+        pagination.date_range('expiry', expiry_from, expiry_to),
+    ):
+        where += conditions
+        params += values
+    if hidden is not None:
+        where.append('hidden = ?')
+        params.append(hidden)
+    columns = fieldsets.select_list(fields or list(SUMMARY_COLUMNS), SUMMARY_COLUMNS)
+    rows, next_cursor, total = pagination.fetch_page(db.conn, 'documents', columns, where, params, sort, cursor, limit, count)
+    if fields is not None:
+        return [fieldsets.build(DocumentSummary, fields, dict(row)) for row in rows], next_cursor, total
+    return [DocumentSummary(**dict(row)) for row in rows], next_cursor, total
+
+def get_document_summary(db: UnitOfWork, doc_id: int, user_id: int) -> Optional[DocumentSummary]:
+    cursor = db.conn.cursor()
     cursor.execute('''
         SELECT id, docID, docType, category, status, expiry, docName, issueDate, uploadDate, hidden, archived, issuedBy, user_id,
-        LENGTH(doc) as docSize
-        FROM documents 
-        WHERE user_id = ? AND archived = ?
-    ''', (user_id, archived))
-    rows = cursor.fetchall()
-    
-    results = []
-    updates_made = False
+        doc_size as docSize
+        FROM documents
+        WHERE id = ? AND user_id = ?
+    ''', (doc_id, user_id))
+    row = cursor.fetchone()
+    return DocumentSummary(**dict(row)) if row else None
 
-    from datetime import datetime
+def _changes(updates: dict) -> dict:
+    # Validated through DocumentUpdate; fields sent as null are cleared, omitted ones kept
+    update = DocumentUpdate(**{k: v for k, v in updates.items() if k in UPDATABLE_FIELDS})
+    changes = {k: v.isoformat() if isinstance(v, (date, datetime)) else v
+               for k, v in update.model_dump(exclude_unset=True).items()}
+    if 'expiry' in changes:
+        changes['status'] = status_of(changes['expiry'])
+    return changes
+
+def update_document(db: UnitOfWork, doc_id: int, user_id: int, updates: dict) -> bool:
+    """Raises ValidationError for values of the wrong type."""
+    filtered_updates = _changes(updates)
 
-    for row in rows:
-        d = dict(row)
-        try:
-            # Parse expiry date
-            expiry_val = d['expiry']
-            expiry_date = None
-            if expiry_val:
-                if isinstance(expiry_val, str):
-                    # Handle potential Z suffix or other ISO variations
-                    expiry_date = datetime.fromisoformat(expiry_val.replace('Z', '+00:00'))
-                else:
-                    expiry_date = expiry_val
-
-            if expiry_date:
-                today = datetime.now()
-                # Ensure we compare date objects to avoid time component issues
-                today_date = today.date() if isinstance(today, datetime) else today
-                expiry_d = expiry_date.date() if isinstance(expiry_date, datetime) else expiry_date
-                
-                delta_days = (expiry_d - today_date).days
-
-                new_status = "VALID"
-                if delta_days < 0:
-                     new_status = "EXPIRED"
-                elif delta_days <= 90:
-                     new_status = "EXPIRING"
-            else:
-                # No expiry date = Unlimited validity
-                new_status = "VALID"
-
-            # Update if different
-            if d['status'] != new_status:
-                cursor.execute('UPDATE documents SET status = ? WHERE id = ? AND user_id = ?', (new_status, d['id'], user_id))
-                d['status'] = new_status
-                updates_made = True
-        except Exception as e:
-            print(f"Error checking status for doc {d.get('id')}: {e}")
-            # Fallback to existing status if error
-            pass
-
-        results.append(DocumentSummary(**d))
-
-    if updates_made:
-        conn.commit()
-
-    conn.close()
-
-    return results
-
-def update_document(doc_id: int, user_id: int, updates: dict) -> bool:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Filter allowed fields
-    allowed_fields = {'docName', 'docType', 'issuedBy', 'issueDate', 'expiry', 'category'}
-    filtered_updates = {k: v for k, v in updates.items() if k in allowed_fields}
-    
     if not filtered_updates:
         return False
 
@@ -115,36 +175,123 @@ def update_document(doc_id: int, user_id: int, updates: dict) -> bool:
     values.append(doc_id)
     values.append(user_id)
     
-    cursor.execute(f'UPDATE documents SET {set_clause} WHERE id = ? AND user_id = ?', values)
-    conn.commit()
-    changes = cursor.rowcount
-    conn.close()
+    changes = db.write(lambda conn: conn.execute(f'UPDATE documents SET {set_clause} WHERE id = ? AND user_id = ?', values).rowcount)
+    invalidate_user(user_id)
     return changes > 0
 
-def get_document_by_id(doc_id: int, user_id: int) -> Optional[Document]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id))
+def get_document_by_id(db: UnitOfWork, doc_id: int, user_id: int, fields: Optional[List[str]] = None):
+    """The document with its payload, or a partial model of just `fields` (the payload only if listed)."""
+    cursor = db.conn.cursor()
+    if fields is None:
+        cursor.execute('SELECT * FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id))
+    else:
+        columns = fieldsets.select_list(fields, DETAIL_COLUMNS)
+        if 'doc' in fields:
+            columns += ', doc_ref, doc_encoding, doc_codec'
+        cursor.execute(f'SELECT {columns} FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id))
     row = cursor.fetchone()
-    conn.close()
     if row:
-        return Document(**dict(row))
+        d = dict(row)
+        if d.get('doc_ref'):
+            d['doc'] = blob_store.read(d['doc_ref'], d['doc_codec'])
+            if d['doc_encoding'] == blob_store.ENCODING_RAW:
+                # The JSON API always carries base64 text
+                d['doc'] = base64.b64encode(d['doc'])
+        if fields is not None:
+            return fieldsets.build(Document, fields, d)
+        return Document(**d)
     return None
 
-def delete_document(doc_id: int, user_id: int) -> bool:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id))
-    conn.commit()
-    changes = cursor.rowcount
-    conn.close()
+def get_document_payload(db: UnitOfWork, doc_id: int, user_id: int) -> Optional[Tuple[blob_store.Payload, str]]:
+    """Open the document's payload for streaming, with its file name; None if missing."""
+    cursor = db.conn.cursor()
+    cursor.execute('SELECT doc_ref, doc_encoding, doc_codec, docName FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id))
+    row = cursor.fetchone()
+    if not row or not row['doc_ref']:
+        return None
+    return blob_store.Payload(row['doc_ref'], row['doc_encoding'], row['doc_codec']), row['docName']
+
+def get_document_thumbnail(db: UnitOfWork, doc_id: int, user_id: int) -> Optional[Tuple[bytes, str]]:
+    """(JPEG bytes, content hash) of the document's preview; None if it has none."""
+    cursor = db.conn.cursor()
+    cursor.execute('SELECT doc_ref, doc_encoding, doc_codec FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id))
+    row = cursor.fetchone()
+    if not row or not row['doc_ref']:
+        return None
+    image = thumbnails.get_thumbnail(row['doc_ref'], row['doc_encoding'], row['doc_codec'])
+    return (image, row['doc_ref']) if image else None
+
+def delete_document(db: UnitOfWork, doc_id: int, user_id: int) -> bool:
+    def delete(conn):
+        row = conn.execute('SELECT doc_ref FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id)).fetchone()
+        cursor = conn.execute('DELETE FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id))
+        return cursor.rowcount, row['doc_ref'] if row else None
+
+    changes, doc_ref = db.write(delete)
+    invalidate_user(user_id)
+    blob_store.delete_unreferenced([doc_ref])
     return changes > 0
 
-def toggle_archive_status(doc_id: int, user_id: int, archived: bool) -> bool:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE documents SET archived = ? WHERE id = ? AND user_id = ?', (archived, doc_id, user_id))
-    conn.commit()
-    changes = cursor.rowcount
-    conn.close()
+def toggle_archive_status(db: UnitOfWork, doc_id: int, user_id: int, archived: bool) -> bool:
+    changes = db.write(lambda conn: conn.execute('UPDATE documents SET archived = ? WHERE id = ? AND user_id = ?', (archived, doc_id, user_id)).rowcount)
+    invalidate_user(user_id)
     return changes > 0
+
+def _check_batch_operation(op: BatchOperation) -> Optional[str]:
+    if op.op == batch.UPDATE:
+        try:
+            if not op.changes or not _changes(op.changes):
+                return f"update needs changes to any of: {', '.join(sorted(UPDATABLE_FIELDS))}"
+        except ValidationError as e:
+            return f"Invalid changes: {e.errors()[0]['loc'][0]}: {e.errors()[0]['msg']}"
+    elif op.op == batch.ARCHIVE:
+        if op.archived is None:
+            return "archive needs archived: true or false"
+    elif op.op != batch.DELETE:
+        return f"Unknown op: {op.op}"
+    return None
+
+def apply_batch(db: UnitOfWork, operations: List[BatchOperation], user_id: int) -> BatchResponse:
+    """Apply update / archive / delete operations in one transaction; per-item results."""
+    valid, errors = batch.validate(operations, _check_batch_operation)
+
+    def apply(conn):
+        found = batch.owned_ids(conn, 'documents', user_id, [op.id for op in valid])
+        ops = [op for op in valid if op.id in found]
+        batch.apply_updates(conn, 'documents', user_id,
+                            [(op.id, _changes(op.changes)) for op in ops if op.op == batch.UPDATE])
+        conn.executemany('UPDATE documents SET archived = ? WHERE id = ? AND user_id = ?',
+                         [(op.archived, op.id, user_id) for op in ops if op.op == batch.ARCHIVE])
+        deleted = [op.id for op in ops if op.op == batch.DELETE]
+        refs = []
+        if deleted:
+            refs = [row[0] for row in conn.execute(
+                'SELECT DISTINCT doc_ref FROM documents WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))',
+                (user_id, json.dumps(deleted))
+            )]
+            conn.executemany('DELETE FROM documents WHERE id = ? AND user_id = ?', [(doc_id, user_id) for doc_id in deleted])
+        return found, refs
+
+    found, refs = db.write(apply) if valid else (set(), [])
+    if found:
+        invalidate_user(user_id)
+    blob_store.delete_unreferenced(refs)
+    return batch.summarize(operations, errors, found)
+
+def reclassify_documents(db: UnitOfWork, user_id: int) -> dict:
+    """Re-run the category patterns over all of the user's documents; rows no pattern matches keep their category."""
+    categorize = classifier.get_classifier(db, user_id, classifier.DOCUMENT).classify
+    rows = db.conn.execute('SELECT id, docType, docName, category FROM documents WHERE user_id = ?', (user_id,)).fetchall()
+    matched = 0
+    updates = []
+    for row in rows:
+        label = categorize(classifier.document_text(row['docType'], row['docName']))
+        if label is None:
+            continue
+        matched += 1
+        if label != row['category']:
+            updates.append((label, row['id'], user_id))
+    if updates:
+        db.write(lambda conn: conn.executemany('UPDATE documents SET category = ? WHERE id = ? AND user_id = ?', updates))
+        invalidate_user(user_id)
+    return {"scanned": len(rows), "matched": matched, "changed": len(updates)}
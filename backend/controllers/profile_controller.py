@@ -1,14 +1,13 @@
 import sqlite3
 import json
 from typing import Optional
-from backend.database import get_db_connection
+from backend.database import UnitOfWork
 from backend.models.profile import Profile, ProfileUpdate, ProfileCreate
 from backend.utils.security import get_password_hash
 
-def get_profile(profile_id: int = 1) -> Optional[Profile]:
-    conn = get_db_connection()
+def get_profile(db: UnitOfWork, profile_id: int = 1) -> Optional[Profile]:
+    conn = db.conn
     profile = conn.execute('SELECT * FROM profiles WHERE id = ?', (profile_id,)).fetchone()
-    conn.close()
     
     if profile:
         profile_dict = dict(profile)
@@ -20,11 +19,10 @@ def get_profile(profile_id: int = 1) -> Optional[Profile]:
         return Profile(**profile_dict)
     return None
 
-def get_profile_by_email(email: str) -> Optional[dict]:
+def get_profile_by_email(db: UnitOfWork, email: str) -> Optional[dict]:
     # Returns dict including password_hash for auth verification
-    conn = get_db_connection()
+    conn = db.conn
     profile = conn.execute('SELECT * FROM profiles WHERE email = ?', (email,)).fetchone()
-    conn.close()
     
     if profile:
         profile_dict = dict(profile)
@@ -36,22 +34,10 @@ def get_profile_by_email(email: str) -> Optional[dict]:
         return profile_dict
     return None
 
-def create_profile(profile_data: ProfileCreate) -> Profile:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+def create_profile(db: UnitOfWork, profile_data: ProfileCreate) -> Profile:
     hashed_password = get_password_hash(profile_data.password)
     
-    cursor.execute('''
-        INSERT INTO profiles (
-            first_name, last_name, middle_name, nationality, 
-            place_of_birth, date_available, email, phone, 
-            job_title, bio, skills, password_hash, dob, gender,
-            permanent_address, present_address, next_of_kin, physical_description,
-            rank, department
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
+    values = (
         profile_data.first_name, 
         profile_data.last_name,
         profile_data.middle_name,
@@ -72,18 +58,22 @@ def create_profile(profile_data: ProfileCreate) -> Profile:
         profile_data.physical_description,
         profile_data.rank,
         profile_data.department
-    ))
+    )
     
-    profile_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    profile_id = db.write(lambda conn: conn.execute('''
+        INSERT INTO profiles (
+            first_name, last_name, middle_name, nationality, 
+            place_of_birth, date_available, email, phone, 
+            job_title, bio, skills, password_hash, dob, gender,
+            permanent_address, present_address, next_of_kin, physical_description,
+            rank, department
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', values).lastrowid)
     
-    return get_profile(profile_id)
+    return get_profile(db, profile_id)
 
-def update_profile(profile_data: ProfileUpdate, profile_id: int = 1) -> Profile:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+def update_profile(db: UnitOfWork, profile_data: ProfileUpdate, profile_id: int = 1) -> Profile:
     # Filter out None values to only update provided fields
     update_data = {k: v for k, v in profile_data.model_dump().items() if v is not None}
     
@@ -98,15 +88,12 @@ def update_profile(profile_data: ProfileUpdate, profile_id: int = 1) -> Profile:
     update_data.pop('address', None)
 
     if not update_data:
-        conn.close()
-        return get_profile(profile_id)
+        return get_profile(db, profile_id)
 
     set_clause = ", ".join([f"{key} = ?" for key in update_data.keys()])
     values = list(update_data.values())
     values.append(profile_id)
     
-    cursor.execute(f'UPDATE profiles SET {set_clause} WHERE id = ?', values)
-    conn.commit()
-    conn.close()
+    db.write(lambda conn: conn.execute(f'UPDATE profiles SET {set_clause} WHERE id = ?', values))
     
-    return get_profile(profile_id)
+    return get_profile(db, profile_id)
@@ -1,74 +1,235 @@
 import sqlite3
-from backend.database import get_db_connection
+from backend.database import UnitOfWork
+from backend.cache import invalidate_user, sea_interval_cache
+from backend import sea_time_rollups
+from backend.utils import fieldsets, pagination
+from backend.utils.intervals import IntervalSet
+from datetime import date, datetime
 from backend.models.seatimelog import SeaTimeLog, SeaTimeLogCreate
-from typing import List, Optional
-
-def create_seatimelog(log: SeaTimeLogCreate, user_id: int) -> SeaTimeLog:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        '''INSERT INTO sea_time_logs (imo, offNo, flag, vesselName, type, company, dept, mainEngine, bhp, kw, dwt, rank, signOn, signOff, uploadDate, user_id) 
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        (log.imo, log.offNo, log.flag, log.vesselName, log.type, log.company, log.dept or "ENGINE",
-         log.mainEngine or "", log.bhp or 0, log.kw or 0, log.dwt, log.rank, 
-         log.signOn.isoformat(), log.signOff.isoformat(), log.uploadDate.isoformat(), user_id)
-    )
-    log_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+from typing import List, Optional, Dict, Any, Tuple
+
+_ROLLUP_SELECT = f"SELECT {', '.join(sea_time_rollups.LOG_COLUMNS)} FROM sea_time_logs WHERE id = ? AND user_id = ?"
+
+# Breakdowns offered by the analytics endpoint; 'year' is summed from month rollups
+ANALYTICS_GROUPS = {
+    'rank': sea_time_rollups.RANK,
+    'type': sea_time_rollups.VESSEL_TYPE,
+    'dept': sea_time_rollups.DEPT,
+    'power': sea_time_rollups.POWER,
+    'year': None,
+}
+
+# Longest analytics timeline, in months (a century)
+MAX_TIMELINE_MONTHS = 1200
+
+SORTABLE_FIELDS = ('signOn',)
+
+# Sparse fieldsets: API field -> column
+COLUMNS = {name: name for name in ('id', *SeaTimeLogCreate.model_fields, 'user_id')}
+
+def _rollup_fields(log: SeaTimeLogCreate) -> dict:
+    # The columns sea_time_rollups reads, as they are stored
+    return {
+        'signOn': log.signOn.isoformat(), 'signOff': log.signOff.isoformat(), 'rank': log.rank, 'type': log.type,
+        'dept': log.dept or "ENGINE", 'kw': log.kw or 0, 'bhp': log.bhp or 0
+    }
+
+def create_seatimelog(db: UnitOfWork, log: SeaTimeLogCreate, user_id: int) -> SeaTimeLog:
+    def insert(conn):
+        cursor = conn.execute(
+            '''INSERT INTO sea_time_logs (imo, offNo, flag, vesselName, type, company, dept, mainEngine, bhp, kw, dwt, rank, signOn, signOff, uploadDate, user_id) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (log.imo, log.offNo, log.flag, log.vesselName, log.type, log.company, log.dept or "ENGINE",
+             log.mainEngine or "", log.bhp or 0, log.kw or 0, log.dwt, log.rank, 
+             log.signOn.isoformat(), log.signOff.isoformat(), log.uploadDate.isoformat(), user_id)
+        )
+        sea_time_rollups.apply_log(conn, user_id, _rollup_fields(log))
+        return cursor.lastrowid
+
+    log_id = db.write(insert)
+    invalidate_user(user_id)
     return SeaTimeLog(id=log_id, user_id=user_id, **log.model_dump())
 
-def get_seatimelogs(user_id: int) -> List[SeaTimeLog]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM sea_time_logs WHERE user_id = ? ORDER BY signOn DESC', (user_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    if not rows:
-        return []
-    return [SeaTimeLog(**dict(row)) for row in rows]
+def get_seatimelogs(
+    db: UnitOfWork,
+    user_id: int,
+    rank: Optional[List[str]] = None,
+    vessel_type: Optional[List[str]] = None,
+    dept: Optional[List[str]] = None,
+    sign_on_from: Optional[date] = None,
+    sign_on_to: Optional[date] = None,
+    sort: str = '-signOn',
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    count: bool = False,
+    fields: Optional[List[str]] = None,
+) -> Tuple[list, Optional[str], Optional[int]]:
+    """One page of the user's sea time logs: (logs, next page cursor, total if count), partial with `fields`."""
+    pagination.parse_sort(sort, SORTABLE_FIELDS)
+    where, params = ['user_id = ?'], [user_id]
+    for conditions, values in (
+        pagination.one_of('rank', rank),
+        pagination.one_of('type', vessel_type),
+        pagination.one_of('dept', dept),
+        pagination.date_range('signOn', sign_on_from, sign_on_to),
+    ):
+        where += conditions
+        params += values
+    columns = fieldsets.select_list(fields, COLUMNS) if fields is not None else '*'
+    rows, next_cursor, total = pagination.fetch_page(db.conn, 'sea_time_logs', columns, where, params, sort, cursor, limit, count)
+    if fields is not None:
+        return [fieldsets.build(SeaTimeLog, fields, dict(row)) for row in rows], next_cursor, total
+    return [SeaTimeLog(**dict(row)) for row in rows], next_cursor, total
 
-def get_seatimelog_by_id(log_id: int, user_id: int) -> Optional[SeaTimeLog]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM sea_time_logs WHERE id = ? AND user_id = ?', (log_id, user_id))
+def get_seatimelog_by_id(db: UnitOfWork, log_id: int, user_id: int, fields: Optional[List[str]] = None):
+    cursor = db.conn.cursor()
+    columns = fieldsets.select_list(fields, COLUMNS) if fields is not None else '*'
+    cursor.execute(f'SELECT {columns} FROM sea_time_logs WHERE id = ? AND user_id = ?', (log_id, user_id))
     row = cursor.fetchone()
-    conn.close()
     if row:
+        if fields is not None:
+            return fieldsets.build(SeaTimeLog, fields, dict(row))
         return SeaTimeLog(**dict(row))
     return None
 
 
-def delete_seatimelog(log_id: int, user_id: int) -> bool:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM sea_time_logs WHERE id = ? AND user_id = ?', (log_id, user_id))
-    conn.commit()
-    changes = cursor.rowcount
-    conn.close()
+def delete_seatimelog(db: UnitOfWork, log_id: int, user_id: int) -> bool:
+    def delete(conn):
+        old = conn.execute(_ROLLUP_SELECT, (log_id, user_id)).fetchone()
+        if old is None:
+            return 0
+        conn.execute('DELETE FROM sea_time_logs WHERE id = ? AND user_id = ?', (log_id, user_id))
+        sea_time_rollups.apply_log(conn, user_id, old, sign=-1)
+        return 1
+
+    changes = db.write(delete)
+    invalidate_user(user_id)
     return changes > 0
 
-def update_seatimelog(log_id: int, log: SeaTimeLogCreate, user_id: int) -> Optional[SeaTimeLog]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if exists
-    cursor.execute('SELECT id FROM sea_time_logs WHERE id = ? AND user_id = ?', (log_id, user_id))
-    if not cursor.fetchone():
-        conn.close()
-        return None
+def update_seatimelog(db: UnitOfWork, log_id: int, log: SeaTimeLogCreate, user_id: int) -> Optional[SeaTimeLog]:
+    def update(conn):
+        old = conn.execute(_ROLLUP_SELECT, (log_id, user_id)).fetchone()
+        if old is None:
+            return 0
+        cursor = conn.execute(
+            '''UPDATE sea_time_logs 
+               SET imo = ?, offNo = ?, flag = ?, vesselName = ?, type = ?, company = ?, dept = ?, 
+                   mainEngine = ?, bhp = ?, kw = ?, dwt = ?, rank = ?, signOn = ?, signOff = ?, uploadDate = ?
+               WHERE id = ? AND user_id = ?''',
+            (log.imo, log.offNo, log.flag, log.vesselName, log.type, log.company, log.dept or "ENGINE",
+             log.mainEngine or "", log.bhp or 0, log.kw or 0, log.dwt, log.rank, 
+             log.signOn.isoformat(), log.signOff.isoformat(), log.uploadDate.isoformat(), 
+             log_id, user_id)
+        )
+        sea_time_rollups.apply_log(conn, user_id, old, sign=-1)
+        sea_time_rollups.apply_log(conn, user_id, _rollup_fields(log))
+        return cursor.rowcount
 
-    cursor.execute(
-        '''UPDATE sea_time_logs 
-           SET imo = ?, offNo = ?, flag = ?, vesselName = ?, type = ?, company = ?, dept = ?, 
-               mainEngine = ?, bhp = ?, kw = ?, dwt = ?, rank = ?, signOn = ?, signOff = ?, uploadDate = ?
-           WHERE id = ? AND user_id = ?''',
-        (log.imo, log.offNo, log.flag, log.vesselName, log.type, log.company, log.dept or "ENGINE",
-         log.mainEngine or "", log.bhp or 0, log.kw or 0, log.dwt, log.rank, 
-         log.signOn.isoformat(), log.signOff.isoformat(), log.uploadDate.isoformat(), 
-         log_id, user_id)
-    )
-    conn.commit()
-    conn.close()
+    # rowcount doubles as the existence check
+    if db.write(update) == 0:
+        return None
+    invalidate_user(user_id)
     
     return SeaTimeLog(id=log_id, user_id=user_id, **log.model_dump())
+
+def get_sea_intervals(db: UnitOfWork, user_id: int) -> IntervalSet:
+    """The user's voyages merged into disjoint intervals (cached until their logs change)."""
+    def compute():
+        db.refresh()
+        cursor = db.conn.cursor()
+        cursor.execute('SELECT signOn, signOff FROM sea_time_logs WHERE user_id = ?', (user_id,))
+        return IntervalSet.from_timestamps(cursor.fetchall())
+
+    return sea_interval_cache.get_or_compute(user_id, compute)
+
+def nri_status(intervals: IntervalSet, fiscal_year: int) -> Dict[str, Any]:
+    start_date, end_date = sea_time_rollups.fiscal_year_bounds(fiscal_year)
+    return _nri_block(intervals.covered_days(start_date, end_date), start_date, end_date)
+
+def _nri_block(days: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    return {
+        'days': days,
+        'startDate': start_date.strftime('%d %b %Y'),
+        'endDate': end_date.strftime('%d %b %Y'),
+        'isRetained': days > 182,
+        'daysRemaining': max(0, 183 - days)
+    }
+
+def get_nri_history(db: UnitOfWork, user_id: int) -> List[Dict[str, Any]]:
+    """NRI status for every fiscal year from the first voyage to the current year."""
+    intervals = get_sea_intervals(db, user_id)
+    current = sea_time_rollups.current_fiscal_year(datetime.now())
+    if not len(intervals):
+        return []
+    first = sea_time_rollups.current_fiscal_year(intervals.first)
+    years = list(range(first, current + 1))
+    bounds = [sea_time_rollups.fiscal_year_bounds(year) for year in years]
+    days = intervals.covered_days_many(bounds)
+    return [
+        {'fiscalYear': year, **_nri_block(int(d), start, end)}
+        for year, (start, end), d in zip(years, bounds, days)
+    ]
+
+def _check_month(value: Optional[str]):
+    # The route only checks the YYYY-MM shape; month 13 would never end the timeline loop
+    if value is None:
+        return
+    try:
+        datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise ValueError(f"Invalid month {value}; use YYYY-MM")
+
+def _month_range(first: str, last: str) -> List[str]:
+    year, month = int(first[:4]), int(first[5:7])
+    span = (int(last[:4]) - year) * 12 + int(last[5:7]) - month + 1
+    if span > MAX_TIMELINE_MONTHS:
+        raise ValueError(f"Timeline {first}..{last} spans {span} months; the limit is {MAX_TIMELINE_MONTHS}")
+    months = []
+    while f"{year:04d}-{month:02d}" <= last:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def get_sea_time_analytics(db: UnitOfWork, user_id: int, group_by: Optional[List[str]] = None,
+                           start_month: Optional[str] = None, end_month: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Sea service broken down by the requested groups plus a month timeline,
+    read from sea_time_rollups. Months are 'YYYY-MM'; the timeline covers
+    start_month..end_month, defaulting to the first and last month at sea.
+    """
+    groups = group_by or list(ANALYTICS_GROUPS)
+    unknown = [g for g in groups if g not in ANALYTICS_GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown analytics group: {', '.join(unknown)}")
+    _check_month(start_month)
+    _check_month(end_month)
+
+    dimensions = [ANALYTICS_GROUPS[g] for g in groups if ANALYTICS_GROUPS[g]]
+    dimensions += [sea_time_rollups.TOTAL, sea_time_rollups.MONTH]
+    rollups = sea_time_rollups.get_breakdowns(db.conn, user_id, dimensions)
+
+    month_days = {row['key']: row['days'] for row in rollups[sea_time_rollups.MONTH]}
+    total = rollups[sea_time_rollups.TOTAL]
+
+    breakdowns = {}
+    for group in groups:
+        if group == 'year':
+            years = {}
+            for month, days in month_days.items():
+                years[month[:4]] = years.get(month[:4], 0) + days
+            breakdowns['year'] = [{'key': year, 'days': days} for year, days in sorted(years.items())]
+        else:
+            breakdowns[group] = rollups[ANALYTICS_GROUPS[group]]
+
+    timeline = []
+    if month_days or (start_month and end_month):
+        first = start_month or min(month_days)
+        last = end_month or max(month_days)
+        timeline = [{'month': m, 'days': month_days.get(m, 0)} for m in _month_range(first, last)]
+
+    return {
+        'totalDays': total[0]['days'] if total else 0,
+        'logs': total[0]['logs'] if total else 0,
+        'breakdowns': breakdowns,
+        'timeline': timeline
+    }
@@ -2,8 +2,16 @@ import sqlite3
 import os
 import sys
 import platform
+import threading
+import weakref
+import asyncio
+import functools
+import queue
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from sqlite3 import Connection
-from backend.utils.security import get_password_hash
+from backend.migrations import migrate
 
 def get_db_path():
     # Get the directory of the current file (backend/database.py)
@@ -20,306 +28,431 @@ def get_db_path():
     return os.path.join(data_dir, "certmanager.db")
 
 DATABASE_NAME = get_db_path()
+DATA_DIR = os.path.dirname(DATABASE_NAME)
 
-def get_db_connection() -> Connection:
-    conn = sqlite3.connect(DATABASE_NAME)
+# Applied once per physical connection when the pool opens it.
+# journal_mode is persistent in the database file; the rest are per-connection.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+    "PRAGMA cache_size = -16000",    # ~16 MB page cache
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+)
+STATEMENT_CACHE_SIZE = 256
+MAX_IDLE_PER_THREAD = 2
+
+# MARINETRACKER_DEBUG=1 turns on asyncio debug mode and makes any database
+# call issued from the event loop thread raise instead of silently blocking it.
+DEBUG = os.getenv("MARINETRACKER_DEBUG", "") == "1"
+DB_THREADS = 4
+
+# Writes arriving within this window of the first queued write share one commit
+GROUP_COMMIT_WINDOW = 0.002  # seconds
+GROUP_COMMIT_MAX_BATCH = 64
+
+class BlockingCallError(RuntimeError):
+    pass
+
+def _check_not_on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise BlockingCallError(
+        "Blocking SQLite call on the event loop; use run_db() or the fetch_*/execute helpers"
+    )
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool."""
+
+    _pool = None
+
+    def cursor(self, *args, **kwargs):
+        if DEBUG:
+            _check_not_on_event_loop()
+        return super().cursor(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        if DEBUG:
+            _check_not_on_event_loop()
+        return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        if DEBUG:
+            _check_not_on_event_loop()
+        return super().executemany(*args, **kwargs)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def _close(self):
+        super().close()
+
+def open_connection(database: str, **kwargs) -> Connection:
+    """Open a connection with the standard tuning pragmas applied."""
+    conn = sqlite3.connect(
+        database,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+        **kwargs
+    )
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     conn.row_factory = sqlite3.Row
     return conn
 
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create Certificates Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS certificates (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cert BLOB,
-            certType TEXT,
-            issuedBy TEXT,
-            status TEXT,
-            expiry TEXT,
-            certName TEXT,
-            issueDate TEXT,
-            uploadDate TEXT,
-            hidden BOOLEAN,
-            archived BOOLEAN DEFAULT 0,
-            user_id INTEGER
-        )
-    ''')
-
-    # Check for user_id in certificates and migrate
-    cursor.execute("PRAGMA table_info(certificates)")
-    columns = [info[1] for info in cursor.fetchall()]
-    if 'user_id' not in columns:
-        try:
-            cursor.execute("ALTER TABLE certificates ADD COLUMN user_id INTEGER")
-            print("Migrated: Added column user_id to certificates")
-        except Exception as e:
-            print(f"Migration error for certificates user_id: {e}")
-    
-    if 'archived' not in columns:
-        try:
-            cursor.execute("ALTER TABLE documents ADD COLUMN archived BOOLEAN DEFAULT 0")
-            print("Migrated: Added column archived to documents")
-        except Exception as e:
-            print(f"Migration error for documents archived: {e}")
+class ConnectionPool:
+    """
+    Per-thread pool of tuned SQLite connections.
+
+    Each worker thread keeps its own idle connections so a request served on
+    that thread reuses a warm page cache and statement cache instead of
+    opening the database file again.
+    """
 
-    # Check for issuedBy in documents and migrate
-    if 'issuedBy' not in columns:
+    def __init__(self, database: str, max_idle_per_thread: int = MAX_IDLE_PER_THREAD):
+        self.database = database
+        self.max_idle_per_thread = max_idle_per_thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()
+        self._created = 0
+        self._reused = 0
+        self._released = 0
+        self._discarded = 0
+        self._in_use = 0
+
+    def _idle(self) -> list:
+        idle = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def _connect(self) -> PooledConnection:
+        conn = open_connection(self.database, factory=PooledConnection)
+        conn._pool = self
+        with self._lock:
+            self._connections.add(conn)
+            self._created += 1
+        return conn
+
+    def acquire(self) -> Connection:
+        idle = self._idle()
+        if idle:
+            conn = idle.pop()
+            with self._lock:
+                self._reused += 1
+                self._in_use += 1
+        else:
+            conn = self._connect()
+            with self._lock:
+                self._in_use += 1
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn: PooledConnection):
         try:
-            cursor.execute("ALTER TABLE documents ADD COLUMN issuedBy TEXT DEFAULT 'Self'")
-            print("Migrated: Added column issuedBy to documents")
-        except Exception as e:
-            print(f"Migration error for documents issuedBy: {e}")
-
-    # Create Profiles Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS profiles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name TEXT DEFAULT '',
-            last_name TEXT DEFAULT '',
-            middle_name TEXT DEFAULT '',
-            nationality TEXT DEFAULT '',
-            place_of_birth TEXT DEFAULT '',
-            date_available TEXT DEFAULT '',
-            email TEXT DEFAULT '',
-            phone TEXT DEFAULT '',
-            job_title TEXT DEFAULT '',
-            bio TEXT DEFAULT '',
-            avatar_url TEXT DEFAULT '',
-            skills TEXT DEFAULT '[]',
-            password_hash TEXT DEFAULT '',
-            dob TEXT DEFAULT '',
-            gender TEXT DEFAULT '',
-            permanent_address TEXT DEFAULT '{}',
-            present_address TEXT DEFAULT '{}',
-            next_of_kin TEXT DEFAULT '{}',
-            physical_description TEXT DEFAULT '{}',
-            rank TEXT DEFAULT '',
-            department TEXT DEFAULT ''
-        )
-    ''')
-    
-    # Check for missing columns and migrate
-    cursor.execute("PRAGMA table_info(profiles)")
-    columns = [info[1] for info in cursor.fetchall()]
-    
-    new_columns = {
-        'middle_name': "TEXT DEFAULT ''",
-        'nationality': "TEXT DEFAULT ''",
-        'place_of_birth': "TEXT DEFAULT ''",
-        'date_available': "TEXT DEFAULT ''",
-        'dob': "TEXT DEFAULT ''",
-        'gender': "TEXT DEFAULT ''",
-        'password_hash': "TEXT DEFAULT ''",
-        'permanent_address': "TEXT DEFAULT '{}'",
-        'present_address': "TEXT DEFAULT '{}'",
-        'next_of_kin': "TEXT DEFAULT '{}'",
-        'physical_description': "TEXT DEFAULT '{}'",
-        'rank': "TEXT DEFAULT ''",
-        'department': "TEXT DEFAULT ''"
-    }
-
-    for col_name, col_def in new_columns.items():
-        if col_name not in columns:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        conn.row_factory = sqlite3.Row
+        idle = self._idle()
+        with self._lock:
+            self._in_use -= 1
+            self._released += 1
+            keep = len(idle) < self.max_idle_per_thread
+            if not keep:
+                self._discarded += 1
+                self._connections.discard(conn)
+        if keep:
+            idle.append(conn)
+        else:
+            conn._close()
+
+    def _discard(self, conn: PooledConnection):
+        with self._lock:
+            self._in_use -= 1
+            self._discarded += 1
+            self._connections.discard(conn)
+        conn._close()
+
+    def close_all(self):
+        """Close every connection the pool has opened (used at shutdown)."""
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
             try:
-                cursor.execute(f"ALTER TABLE profiles ADD COLUMN {col_name} {col_def}")
-                print(f"Migrated: Added column {col_name} to profiles")
-            except Exception as e:
-                print(f"Migration error for {col_name}: {e}")
-    
-    # Create Sea Time Logs Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sea_time_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            imo INTEGER,
-            offNo INTEGER,
-            flag TEXT,
-            vesselName TEXT,
-            type TEXT,
-            company TEXT,
-            dept TEXT DEFAULT 'ENGINE',
-            mainEngine TEXT,
-            bhp REAL,
-            kw REAL,
-            torque REAL,
-            dwt REAL,
-            rank TEXT,
-            signOn TEXT,
-            signOff TEXT,
-            uploadDate TEXT,
-            user_id INTEGER
-        )
-    ''')
-
-    # Migrate sea_time_logs table - add dept column if missing
-    cursor.execute("PRAGMA table_info(sea_time_logs)")
-    stl_columns = {col[1] for col in cursor.fetchall()}
-    if 'dept' not in stl_columns:
-        try:
-            cursor.execute("ALTER TABLE sea_time_logs ADD COLUMN dept TEXT DEFAULT 'ENGINE'")
-            print("Migrated: Added column dept to sea_time_logs")
-        except Exception as e:
-            print(f"Migration error for dept: {e}")
+                conn._close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
 
-    # Migrate sea_time_logs table - add kw column if missing
-    cursor.execute("PRAGMA table_info(sea_time_logs)")
-    stl_columns = {col[1] for col in cursor.fetchall()}
-    if 'kw' not in stl_columns:
-        try:
-            cursor.execute("ALTER TABLE sea_time_logs ADD COLUMN kw REAL")
-            print("Migrated: Added column kw to sea_time_logs")
-            # Populate kw from bhp (approx conversion) or torque if available
-            cursor.execute("UPDATE sea_time_logs SET kw = bhp * 0.7457 WHERE kw IS NULL AND bhp IS NOT NULL")
-        except Exception as e:
-            print(f"Migration error for kw: {e}")
-    
-    # Check if user_id column exists in sea_time_logs (migration)
-    cursor.execute("PRAGMA table_info(sea_time_logs)")
-    columns = [info[1] for info in cursor.fetchall()]
-    if 'user_id' not in columns:
-        cursor.execute("ALTER TABLE sea_time_logs ADD COLUMN user_id INTEGER")
-        
-    # Check if dept column exists
-    if 'dept' not in columns:
-        cursor.execute("ALTER TABLE sea_time_logs ADD COLUMN dept TEXT")
-
-    # Create Documents Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS documents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            docID TEXT,
-            doc BLOB,
-            docType TEXT,
-            category TEXT,
-            status TEXT,
-            expiry TEXT,
-            docName TEXT,
-            issueDate TEXT,
-            uploadDate TEXT,
-            hidden BOOLEAN,
-            archived BOOLEAN DEFAULT 0,
-            user_id INTEGER
-        )
-    ''')
-
-    # Check for user_id in documents and migrate
-    cursor.execute("PRAGMA table_info(documents)")
-    columns = [info[1] for info in cursor.fetchall()]
-    if 'user_id' not in columns:
-        try:
-            cursor.execute("ALTER TABLE documents ADD COLUMN user_id INTEGER")
-            print("Migrated: Added column user_id to documents")
-        except Exception as e:
-            print(f"Migration error for documents user_id: {e}")
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "database": self.database,
+                "open": len(self._connections),
+                "inUse": self._in_use,
+                "created": self._created,
+                "reused": self._reused,
+                "released": self._released,
+                "discarded": self._discarded,
+            }
 
-    # Check for archived in documents and migrate
-    if 'archived' not in columns:
-        try:
-            cursor.execute("ALTER TABLE documents ADD COLUMN archived BOOLEAN DEFAULT 0")
-            print("Migrated: Added column archived to documents")
-        except Exception as e:
-            print(f"Migration error for documents archived: {e}")
+pool = ConnectionPool(DATABASE_NAME)
 
-    # Check for issuedBy in documents and migrate
-    if 'issuedBy' not in columns:
-        try:
-            cursor.execute("ALTER TABLE documents ADD COLUMN issuedBy TEXT DEFAULT 'Self'")
-            print("Migrated: Added column issuedBy to documents")
-        except Exception as e:
-            print(f"Migration error for documents issuedBy: {e}")
-
-    # Seed Default Profile if empty
-    cursor.execute('SELECT count(*) FROM profiles')
-    if cursor.fetchone()[0] == 0:
-        default_password = get_password_hash("password123")
-        cursor.execute('''
-            INSERT INTO profiles (first_name, last_name, email, phone, job_title, bio, skills, password_hash)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', ('John', 'Doe', 'john.doe@example.com', '+1 (555) 0123', 'Marine Engineer', 'Experienced marine engineer.', '["Safety Management", "Navigation", "First Aid"]', default_password))
-
-     # Create Document Categories Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS document_categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            label TEXT NOT NULL,
-            color TEXT NOT NULL,
-            icon TEXT NOT NULL,
-            pattern TEXT,
-            user_id INTEGER,
-            is_system BOOLEAN DEFAULT 0,
-            scope TEXT DEFAULT 'document'
-        )
-    ''')
-
-    # Migrate document_categories - add scope column if missing
-    cursor.execute("PRAGMA table_info(document_categories)")
-    dc_columns = {col[1] for col in cursor.fetchall()}
-    if 'scope' not in dc_columns:
+def get_db_connection() -> Connection:
+    """Borrow a pooled connection; calling close() on it returns it to the pool."""
+    return pool.acquire()
+
+def get_pool_stats() -> dict:
+    return pool.stats()
+
+# --- Single writer -----------------------------------------------------------
+
+_STOP = object()
+
+class DatabaseWriter:
+    """
+    Serializes every mutation through one connection on a dedicated thread.
+
+    Callers submit a function taking the writer's connection; it runs inside
+    its own SAVEPOINT, and all jobs queued within GROUP_COMMIT_WINDOW of the
+    first one share a single COMMIT (one fsync). A job that raises is rolled
+    back to its savepoint without affecting the rest of the batch. Jobs must
+    not call commit() or rollback() themselves.
+    """
+
+    def __init__(self, database: str, window: float = GROUP_COMMIT_WINDOW, max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.database = database
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self._failed = 0
+        self._batches = 0
+        self._max_batch_seen = 0
+        self._commit_total = 0.0
+        self._commit_max = 0.0
+        self._commit_last = 0.0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def write(self, fn, *args, **kwargs):
+        """Submit a write job and block until its batch has committed."""
+        if DEBUG:
+            _check_not_on_event_loop()
+        return self.submit(fn, *args, **kwargs).result()
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _run(self):
+        # isolation_level=None: transactions are managed explicitly below
+        conn = open_connection(self.database, isolation_level=None)
         try:
-            cursor.execute("ALTER TABLE document_categories ADD COLUMN scope TEXT DEFAULT 'document'")
-            print("Migrated: Added column scope to document_categories")
-        except Exception as e:
-            print(f"Migration error for scope: {e}")
-
-    # Seed Default Categories if empty (for documents)
-    cursor.execute("SELECT count(*) FROM document_categories WHERE scope = 'document'")
-    if cursor.fetchone()[0] == 0:
-        default_categories = [
-            ('Medical', 'emerald', 'Stethoscope', 'medical|health|fever', 1, 1, 'document'),
-            ('Safety', 'orange', 'Anchor', 'safety|stcw|fire|security', 1, 1, 'document'),
-            ('Travel', 'blue', 'Plane', 'passport|visa|book|seaman|travel', 1, 1, 'document'),
-            ('Tech', 'purple', 'Wrench', 'technical|engineering|mechanical|repair', 1, 1, 'document')
-        ]
-        cursor.executemany('''
-            INSERT INTO document_categories (label, color, icon, pattern, user_id, is_system, scope)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', default_categories)
-        print("Seeded default document categories")
-
-    # Seed Default Categories if empty (for certificates)
-    cursor.execute("SELECT count(*) FROM document_categories WHERE scope = 'certificate'")
-    if cursor.fetchone()[0] == 0:
-        cert_categories = [
-            ('CoC', 'orange', 'Award', 'coc|competency|certificate of competency', 1, 1, 'certificate'),
-            ('STCW', 'blue', 'Anchor', 'stcw|training|safety', 1, 1, 'certificate'),
-            ('Medical', 'emerald', 'Stethoscope', 'medical|health', 1, 1, 'certificate'),
-            ('License', 'purple', 'FileText', 'license|endorsement', 1, 1, 'certificate'),
-            ('Other', 'zinc', 'File', 'other|misc', 1, 1, 'certificate')
-        ]
-        cursor.executemany('''
-            INSERT INTO document_categories (label, color, icon, pattern, user_id, is_system, scope)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', cert_categories)
-        print("Seeded default certificate categories")
-
-    conn.commit()
-    conn.close()
-
-    # Create Resume Drafts Table
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS resume_drafts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            name TEXT NOT NULL,
-            data TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Check for user_id in resume_drafts and migrate (just in case, though likely new)
-    cursor.execute("PRAGMA table_info(resume_drafts)")
-    columns = [info[1] for info in cursor.fetchall()]
-    if 'user_id' not in columns:
+            while True:
+                job = self._queue.get()
+                if job is _STOP:
+                    return
+                batch = [job]
+                stop = False
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        job = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if job is _STOP:
+                        stop = True
+                        break
+                    batch.append(job)
+                self._commit_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn: Connection, batch: list):
+        started = time.perf_counter()
+        outcomes = []
         try:
-            cursor.execute("ALTER TABLE resume_drafts ADD COLUMN user_id INTEGER")
-            print("Migrated: Added column user_id to resume_drafts")
+            conn.execute("BEGIN IMMEDIATE")
+            for future, fn, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = fn(conn, *args, **kwargs)
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
         except Exception as e:
-            print(f"Migration error for resume_drafts user_id: {e}")
+            # BEGIN/COMMIT itself failed: nothing in the batch was persisted
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(future, None, e) for future, _, _, _ in batch if not future.cancelled()]
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._batches += 1
+            self._jobs += len(batch)
+            self._failed += sum(1 for _, _, error in outcomes if error is not None)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._commit_total += elapsed
+            self._commit_max = max(self._commit_max, elapsed)
+            self._commit_last = elapsed
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queueDepth": self._queue.qsize(),
+                "jobs": self._jobs,
+                "failedJobs": self._failed,
+                "batches": self._batches,
+                "avgBatchSize": round(self._jobs / self._batches, 2) if self._batches else 0,
+                "maxBatchSize": self._max_batch_seen,
+                "avgCommitMs": round(self._commit_total / self._batches * 1000, 3) if self._batches else 0,
+                "maxCommitMs": round(self._commit_max * 1000, 3),
+                "lastCommitMs": round(self._commit_last * 1000, 3),
+            }
+
+writer = DatabaseWriter(DATABASE_NAME)
+
+def execute_write(fn, *args, **kwargs):
+    """Run fn(conn, *args, **kwargs) on the single writer and return its result."""
+    return writer.write(fn, *args, **kwargs)
+
+async def run_write(fn, *args, **kwargs):
+    """Awaitable execute_write() for async route handlers."""
+    return await asyncio.wrap_future(writer.submit(fn, *args, **kwargs))
 
-    conn.commit()
-    conn.close()
+def get_writer_stats() -> dict:
+    return writer.stats()
+
+# --- Async access -----------------------------------------------------------
+# async route handlers must not touch sqlite3 directly: every call blocks the
+# event loop. They await run_db() (or the UnitOfWork helpers built on it),
+# which runs on a dedicated thread pool so the loop keeps serving requests.
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+WriteResult = namedtuple("WriteResult", ["lastrowid", "rowcount"])
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking database function on the DB thread pool and await it."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(fn, *args, **kwargs))
+
+def _execute(conn: Connection, sql: str, params) -> WriteResult:
+    cursor = conn.execute(sql, params)
+    return WriteResult(cursor.lastrowid, cursor.rowcount)
+
+# --- Unit of work --------------------------------------------------------------
+
+class UnitOfWork:
+    """
+    Database access for a single request.
+
+    Every read in the request goes through one pooled connection inside one
+    read transaction, so auth and the controller see the same snapshot and the
+    connection is borrowed once. Mutations are handed to the single writer via
+    write(); once it returns the write is committed and the read snapshot is
+    refreshed so follow-up reads see it. The get_db dependency commits or rolls
+    back and returns the connection when the request ends.
+    """
+
+    def __init__(self):
+        self._conn = None
+
+    @property
+    def conn(self) -> Connection:
+        if self._conn is None:
+            self._conn = get_db_connection()
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+        return self._conn
+
+    def refresh(self):
+        # End the read transaction; the next read starts a fresh snapshot
+        if self._conn is not None and self._conn.in_transaction:
+            self._conn.rollback()
+
+    def write(self, fn, *args, **kwargs):
+        result = execute_write(fn, *args, **kwargs)
+        self.refresh()
+        return result
+
+    async def run_write(self, fn, *args, **kwargs):
+        result = await run_write(fn, *args, **kwargs)
+        await run_db(self.refresh)
+        return result
+
+    async def fetch_all(self, sql: str, params=()) -> list:
+        return await run_db(lambda: self.conn.execute(sql, params).fetchall())
+
+    async def fetch_one(self, sql: str, params=()):
+        return await run_db(lambda: self.conn.execute(sql, params).fetchone())
+
+    async def execute(self, sql: str, params=()) -> WriteResult:
+        return await self.run_write(_execute, sql, params)
+
+    def commit(self):
+        if self._conn is not None and self._conn.in_transaction:
+            self._conn.commit()
+
+    def rollback(self):
+        if self._conn is not None and self._conn.in_transaction:
+            self._conn.rollback()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+def init_db():
+    """Apply any pending schema migrations; a no-op pragma read when current."""
+    conn = get_db_connection()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
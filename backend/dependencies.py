@@ -3,12 +3,26 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from backend.utils.security import SECRET_KEY, ALGORITHM
 from backend.controllers.profile_controller import get_profile_by_email
+from backend.database import run_db, UnitOfWork
 from backend.models.profile import Profile
 import json
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def get_db():
+    """One UnitOfWork per request, shared by get_current_user and the route."""
+    db = UnitOfWork()
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    else:
+        db.commit()
+    finally:
+        db.close()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: UnitOfWork = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -22,7 +36,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
     
-    user_dict = get_profile_by_email(email)
+    user_dict = await run_db(get_profile_by_email, db, email)
     if user_dict is None:
         raise credentials_exception
         
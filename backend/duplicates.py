@@ -0,0 +1,81 @@
+"""
+Per-user duplicate detection for document and certificate payloads.
+
+A payload's blob reference is its SHA-256, so "has this user stored these
+bytes before" is an index lookup on (user_id, doc_ref) / (user_id, cert_ref).
+The blob store already keeps a single copy of identical bytes; this lets a
+create call also skip the new row (reuse the earlier one) or refuse it.
+
+The hash covers the payload as stored: a scan re-sent through the same
+endpoint is matched, but a JSON (base64) upload and a multipart upload of
+the same file are not.
+"""
+import threading
+from sqlite3 import Connection
+from typing import Optional
+
+# What a create call does when the user already has the same payload
+DUPLICATE_ALLOW = "allow"    # store a new row pointing at the existing blob
+DUPLICATE_REUSE = "reuse"    # return the existing row instead
+DUPLICATE_REJECT = "reject"  # raise DuplicatePayload
+POLICIES = (DUPLICATE_ALLOW, DUPLICATE_REUSE, DUPLICATE_REJECT)
+POLICY_PATTERN = f"^({'|'.join(POLICIES)})$"
+
+# table -> (kind used in messages, reference column)
+_TABLES = {
+    "documents": ("document", "doc_ref"),
+    "certificates": ("certificate", "cert_ref"),
+}
+
+_lock = threading.Lock()
+_stats = {table: {"detected": 0, "allowed": 0, "reused": 0, "rejected": 0} for table in _TABLES}
+
+class DuplicatePayload(Exception):
+    def __init__(self, table: str, existing_id: int):
+        self.kind = _TABLES[table][0]
+        self.existing_id = existing_id
+        super().__init__(f"Duplicate of {self.kind} {existing_id}")
+
+def find(conn: Connection, table: str, user_id: int, ref: Optional[str]) -> Optional[int]:
+    """Id of the user's earliest row in `table` holding the payload `ref`, if any."""
+    if not ref:
+        return None
+    column = _TABLES[table][1]
+    row = conn.execute(
+        f'SELECT id FROM {table} WHERE user_id = ? AND {column} = ? ORDER BY id LIMIT 1', (user_id, ref)
+    ).fetchone()
+    return row[0] if row else None
+
+def check(conn: Connection, table: str, user_id: int, ref: Optional[str], policy: str = DUPLICATE_ALLOW) -> Optional[int]:
+    """
+    Look the payload up before a create. Returns the earlier row's id (None if
+    the payload is new) and raises DuplicatePayload under DUPLICATE_REJECT.
+    """
+    existing = find(conn, table, user_id, ref)
+    if existing is None:
+        return None
+    record(table, policy)
+    if policy == DUPLICATE_REJECT:
+        raise DuplicatePayload(table, existing)
+    return existing
+
+def record(table: str, policy: str):
+    outcome = {DUPLICATE_ALLOW: "allowed", DUPLICATE_REUSE: "reused", DUPLICATE_REJECT: "rejected"}[policy]
+    with _lock:
+        _stats[table]["detected"] += 1
+        _stats[table][outcome] += 1
+
+def stored_duplicates(conn: Connection, user_id: int) -> dict:
+    """Rows of the user's that repeat a payload they already have, per table."""
+    result = {}
+    for table, (_, column) in _TABLES.items():
+        # Covered by the (user_id, ref) index
+        rows, payloads = conn.execute(
+            f'SELECT COUNT({column}), COUNT(DISTINCT {column}) FROM {table} WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        result[table] = {"duplicateRows": rows - payloads}
+    return result
+
+def get_duplicate_stats() -> dict:
+    with _lock:
+        return {table: dict(counts) for table, counts in _stats.items()}
@@ -9,16 +9,41 @@ from backend.routes import (
     seatimelog_routes,
     seatimelog_routes,
     category_routes,
-    resume_routes
+    resume_routes,
+    search_routes,
+    system_routes
 )
-from backend.database import init_db
+from backend.database import init_db, pool, writer, run_db, DEBUG
+from backend import bulk_import, recompress, status_sweep, thumbnails
+from backend.utils import pagination
 from contextlib import asynccontextmanager
+from datetime import date
+import asyncio
+import contextlib
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if DEBUG:
+        # Log any callback that holds the event loop for more than 50ms
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = 0.05
     # Initialize database
-    init_db()
+    await run_db(init_db)
+    # Bring stored statuses up to date, then re-sweep at each date rollover
+    await status_sweep.run_sweep()
+    sweep_task = asyncio.create_task(status_sweep.run_daily(last_run=date.today()))
+    # Compress payloads stored by older versions, a batch at a time
+    recompress_task = asyncio.create_task(recompress.run_recompress())
     yield
+    for task in (sweep_task, recompress_task):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    thumbnails.shutdown()
+    bulk_import.shutdown()
+    writer.stop()
+    pool.close_all()
 
 app = FastAPI(title="MarineTracker Pro API", lifespan=lifespan)
 
@@ -29,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=pagination.PAGE_HEADERS,
 )
 
 # Include routers
@@ -40,6 +66,8 @@ app.include_router(profile_routes.router, tags=["Profile"])
 app.include_router(seatimelog_routes.router, tags=["Sea Time Logs"])
 app.include_router(category_routes.router, tags=["Categories"])
 app.include_router(resume_routes.router, tags=["Resume Drafts"])
+app.include_router(search_routes.router, tags=["Search"])
+app.include_router(system_routes.router, tags=["System"])
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,425 @@
+"""
+Versioned schema migrations.
+
+The schema version lives in SQLite's PRAGMA user_version. Each entry in
+MIGRATIONS upgrades the database by one version; pending steps run in order
+inside a single write transaction, and a database that is already current
+costs a single pragma read at startup.
+
+Every step must be idempotent: databases created before versioning report
+user_version 0 but may already contain some or all of the tables and columns.
+"""
+import sqlite3
+from backend.utils.security import get_password_hash
+from backend import classifier, sea_time_rollups, search
+
+def _columns(cursor, table: str) -> set:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {info[1] for info in cursor.fetchall()}
+
+def _add_column(cursor, table: str, column: str, definition: str) -> bool:
+    if column in _columns(cursor, table):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    print(f"Migrated: Added column {column} to {table}")
+    return True
+
+def _001_baseline(cursor):
+    """Tables as of the first packaged release, plus every column added since."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS certificates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cert BLOB,
+            certType TEXT,
+            issuedBy TEXT,
+            status TEXT,
+            expiry TEXT,
+            certName TEXT,
+            issueDate TEXT,
+            uploadDate TEXT,
+            hidden BOOLEAN,
+            archived BOOLEAN DEFAULT 0,
+            user_id INTEGER
+        )
+    ''')
+    _add_column(cursor, 'certificates', 'user_id', "INTEGER")
+    _add_column(cursor, 'certificates', 'archived', "BOOLEAN DEFAULT 0")
+    _add_column(cursor, 'certificates', 'issuedBy', "TEXT")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT DEFAULT '',
+            last_name TEXT DEFAULT '',
+            middle_name TEXT DEFAULT '',
+            nationality TEXT DEFAULT '',
+            place_of_birth TEXT DEFAULT '',
+            date_available TEXT DEFAULT '',
+            email TEXT DEFAULT '',
+            phone TEXT DEFAULT '',
+            job_title TEXT DEFAULT '',
+            bio TEXT DEFAULT '',
+            avatar_url TEXT DEFAULT '',
+            skills TEXT DEFAULT '[]',
+            password_hash TEXT DEFAULT '',
+            dob TEXT DEFAULT '',
+            gender TEXT DEFAULT '',
+            permanent_address TEXT DEFAULT '{}',
+            present_address TEXT DEFAULT '{}',
+            next_of_kin TEXT DEFAULT '{}',
+            physical_description TEXT DEFAULT '{}',
+            rank TEXT DEFAULT '',
+            department TEXT DEFAULT ''
+        )
+    ''')
+    profile_columns = {
+        'middle_name': "TEXT DEFAULT ''",
+        'nationality': "TEXT DEFAULT ''",
+        'place_of_birth': "TEXT DEFAULT ''",
+        'date_available': "TEXT DEFAULT ''",
+        'dob': "TEXT DEFAULT ''",
+        'gender': "TEXT DEFAULT ''",
+        'password_hash': "TEXT DEFAULT ''",
+        'permanent_address': "TEXT DEFAULT '{}'",
+        'present_address': "TEXT DEFAULT '{}'",
+        'next_of_kin': "TEXT DEFAULT '{}'",
+        'physical_description': "TEXT DEFAULT '{}'",
+        'rank': "TEXT DEFAULT ''",
+        'department': "TEXT DEFAULT ''"
+    }
+    for col_name, col_def in profile_columns.items():
+        _add_column(cursor, 'profiles', col_name, col_def)
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sea_time_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            imo INTEGER,
+            offNo INTEGER,
+            flag TEXT,
+            vesselName TEXT,
+            type TEXT,
+            company TEXT,
+            dept TEXT DEFAULT 'ENGINE',
+            mainEngine TEXT,
+            bhp REAL,
+            kw REAL,
+            torque REAL,
+            dwt REAL,
+            rank TEXT,
+            signOn TEXT,
+            signOff TEXT,
+            uploadDate TEXT,
+            user_id INTEGER
+        )
+    ''')
+    _add_column(cursor, 'sea_time_logs', 'dept', "TEXT DEFAULT 'ENGINE'")
+    if _add_column(cursor, 'sea_time_logs', 'kw', "REAL"):
+        # Populate kw from bhp (approx conversion)
+        cursor.execute("UPDATE sea_time_logs SET kw = bhp * 0.7457 WHERE kw IS NULL AND bhp IS NOT NULL")
+    _add_column(cursor, 'sea_time_logs', 'user_id', "INTEGER")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            docID TEXT,
+            doc BLOB,
+            docType TEXT,
+            category TEXT,
+            status TEXT,
+            expiry TEXT,
+            docName TEXT,
+            issueDate TEXT,
+            uploadDate TEXT,
+            hidden BOOLEAN,
+            archived BOOLEAN DEFAULT 0,
+            issuedBy TEXT DEFAULT 'Self',
+            user_id INTEGER
+        )
+    ''')
+    _add_column(cursor, 'documents', 'user_id', "INTEGER")
+    _add_column(cursor, 'documents', 'archived', "BOOLEAN DEFAULT 0")
+    _add_column(cursor, 'documents', 'issuedBy', "TEXT DEFAULT 'Self'")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            label TEXT NOT NULL,
+            color TEXT NOT NULL,
+            icon TEXT NOT NULL,
+            pattern TEXT,
+            user_id INTEGER,
+            is_system BOOLEAN DEFAULT 0,
+            scope TEXT DEFAULT 'document'
+        )
+    ''')
+    _add_column(cursor, 'document_categories', 'scope', "TEXT DEFAULT 'document'")
+    cursor.execute("UPDATE document_categories SET scope = 'document' WHERE scope IS NULL OR scope = ''")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resume_drafts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _add_column(cursor, 'resume_drafts', 'user_id', "INTEGER")
+
+    # Seed Default Profile if empty
+    cursor.execute('SELECT count(*) FROM profiles')
+    if cursor.fetchone()[0] == 0:
+        default_password = get_password_hash("password123")
+        cursor.execute('''
+            INSERT INTO profiles (first_name, last_name, email, phone, job_title, bio, skills, password_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ('John', 'Doe', 'john.doe@example.com', '+1 (555) 0123', 'Marine Engineer', 'Experienced marine engineer.', '["Safety Management", "Navigation", "First Aid"]', default_password))
+
+    # Seed Default Categories if empty (for documents)
+    cursor.execute("SELECT count(*) FROM document_categories WHERE scope = 'document'")
+    if cursor.fetchone()[0] == 0:
+        default_categories = [
+            ('Medical', 'emerald', 'Stethoscope', 'medical|health|fever', 1, 1, 'document'),
+            ('Safety', 'orange', 'Anchor', 'safety|stcw|fire|security', 1, 1, 'document'),
+            ('Travel', 'blue', 'Plane', 'passport|visa|book|seaman|travel', 1, 1, 'document'),
+            ('Tech', 'purple', 'Wrench', 'technical|engineering|mechanical|repair', 1, 1, 'document')
+        ]
+        cursor.executemany('''
+            INSERT INTO document_categories (label, color, icon, pattern, user_id, is_system, scope)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', default_categories)
+        print("Seeded default document categories")
+
+    # Seed Default Categories if empty (for certificates)
+    cursor.execute("SELECT count(*) FROM document_categories WHERE scope = 'certificate'")
+    if cursor.fetchone()[0] == 0:
+        cert_categories = [
+            ('CoC', 'orange', 'Award', 'coc|competency|certificate of competency', 1, 1, 'certificate'),
+            ('STCW', 'blue', 'Anchor', 'stcw|training|safety', 1, 1, 'certificate'),
+            ('Medical', 'emerald', 'Stethoscope', 'medical|health', 1, 1, 'certificate'),
+            ('License', 'purple', 'FileText', 'license|endorsement', 1, 1, 'certificate'),
+            ('Other', 'zinc', 'File', 'other|misc', 1, 1, 'certificate')
+        ]
+        cursor.executemany('''
+            INSERT INTO document_categories (label, color, icon, pattern, user_id, is_system, scope)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', cert_categories)
+        print("Seeded default certificate categories")
+
+# Managed index set: (since version, name, table, columns, unique).
+# Covers every per-user list, the dashboard sorts and the login lookup;
+# backend/query_plan.py reports any controller statement that still scans.
+INDEXES = [
+    (2, 'idx_certificates_user', 'certificates', 'user_id', False),
+    (2, 'idx_documents_user_archived', 'documents', 'user_id, archived', False),
+    (2, 'idx_documents_user_upload', 'documents', 'user_id, uploadDate', False),
+    (2, 'idx_sea_time_logs_user_signon', 'sea_time_logs', 'user_id, signOn', False),
+    (2, 'idx_sea_time_logs_user_signoff', 'sea_time_logs', 'user_id, signOff', False),
+    (2, 'idx_profiles_email', 'profiles', 'email', True),
+    (2, 'idx_document_categories_scope_user', 'document_categories', 'scope, user_id', False),
+    (2, 'idx_resume_drafts_user', 'resume_drafts', 'user_id, updated_at', False),
+    (3, 'idx_documents_doc_ref', 'documents', 'doc_ref', False),
+    (3, 'idx_certificates_cert_ref', 'certificates', 'cert_ref', False),
+    (4, 'idx_certificates_user_status', 'certificates', 'user_id, status', False),
+    (4, 'idx_documents_user_status', 'documents', 'user_id, status', False),
+    (8, 'idx_documents_codec', 'documents', 'doc_codec, doc_ref', False),
+    (8, 'idx_certificates_codec', 'certificates', 'cert_codec, cert_ref', False),
+    (9, 'idx_documents_user_ref', 'documents', 'user_id, doc_ref', False),
+    (9, 'idx_certificates_user_ref', 'certificates', 'user_id, cert_ref', False),
+    # Keyset pagination: the IFNULL expressions must match backend.utils.pagination.sort_key
+    (10, 'idx_documents_user_archived_upload_key', 'documents', "user_id, archived, IFNULL(uploadDate, '')", False),
+    (10, 'idx_documents_user_archived_expiry_key', 'documents', "user_id, archived, IFNULL(expiry, '')", False),
+    (10, 'idx_certificates_user_upload_key', 'certificates', "user_id, IFNULL(uploadDate, '')", False),
+    (10, 'idx_certificates_user_expiry_key', 'certificates', "user_id, IFNULL(expiry, '')", False),
+    (10, 'idx_sea_time_logs_user_signon_key', 'sea_time_logs', "user_id, IFNULL(signOn, '')", False),
+    (12, 'idx_certificates_user_category', 'certificates', 'user_id, category', False),
+]
+
+def ensure_indexes(cursor, version: int):
+    """Create every managed index introduced at or before `version`."""
+    for since, name, table, columns, unique in INDEXES:
+        if since > version:
+            continue
+        if unique:
+            cursor.execute(f"SELECT {columns} FROM {table} GROUP BY {columns} HAVING count(*) > 1 LIMIT 1")
+            duplicate = cursor.fetchone()
+            if duplicate:
+                # Don't fail the upgrade over existing duplicate rows; index them
+                # without the constraint until the data is cleaned up.
+                print(f"Index warning: duplicate {table} ({columns}) {tuple(duplicate)}, creating {name} as non-unique")
+                unique = False
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        cursor.execute(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns})")
+
+def _002_indexes(cursor):
+    ensure_indexes(cursor, 2)
+
+def _move_inline_payloads(cursor, table: str, payload_col: str, ref_col: str, size_col: str) -> int:
+    # Deferred import: blob_store depends on backend.database, which imports this module.
+    from backend import blob_store
+
+    cursor.execute(f"SELECT id FROM {table} WHERE {payload_col} IS NOT NULL")
+    ids = [row[0] for row in cursor.fetchall()]
+    for row_id in ids:
+        cursor.execute(f"SELECT {payload_col} FROM {table} WHERE id = ?", (row_id,))
+        data = blob_store.to_bytes(cursor.fetchone()[0])
+        # Stored uncompressed: the codec columns only arrive in version 8
+        ref, _ = blob_store.put(data, compress=False)
+        cursor.execute(
+            f"UPDATE {table} SET {ref_col} = ?, {size_col} = ?, {payload_col} = NULL WHERE id = ?",
+            (ref, len(data), row_id)
+        )
+    if ids:
+        print(f"Migrated: Moved {len(ids)} inline {table}.{payload_col} payloads to the blob store")
+    return len(ids)
+
+def _003_blob_store(cursor):
+    _add_column(cursor, 'documents', 'doc_ref', "TEXT")
+    _add_column(cursor, 'documents', 'doc_size', "INTEGER DEFAULT 0")
+    _add_column(cursor, 'certificates', 'cert_ref', "TEXT")
+    _add_column(cursor, 'certificates', 'cert_size', "INTEGER DEFAULT 0")
+    _move_inline_payloads(cursor, 'documents', 'doc', 'doc_ref', 'doc_size')
+    _move_inline_payloads(cursor, 'certificates', 'cert', 'cert_ref', 'cert_size')
+    ensure_indexes(cursor, 3)
+
+def _004_status_indexes(cursor):
+    ensure_indexes(cursor, 4)
+
+def _005_sea_time_rollups(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sea_time_rollups (
+            user_id INTEGER NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            days INTEGER NOT NULL DEFAULT 0,
+            logs INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, dimension, key)
+        ) WITHOUT ROWID
+    ''')
+    sea_time_rollups.rebuild(cursor.connection)
+
+def _006_sea_time_rollup_dimensions(cursor):
+    # New dept / power / month dimensions: recompute from the logs
+    sea_time_rollups.rebuild(cursor.connection)
+
+def _007_document_encoding(cursor):
+    # Existing payloads came through the JSON API as base64 text
+    _add_column(cursor, 'documents', 'doc_encoding', "TEXT DEFAULT 'base64'")
+
+def _008_payload_codecs(cursor):
+    # NULL = stored before compression existed; backend.recompress fills it in
+    _add_column(cursor, 'documents', 'doc_codec', "TEXT")
+    _add_column(cursor, 'certificates', 'cert_codec', "TEXT")
+    ensure_indexes(cursor, 8)
+
+def _009_duplicate_indexes(cursor):
+    ensure_indexes(cursor, 9)
+
+def _010_pagination_indexes(cursor):
+    ensure_indexes(cursor, 10)
+
+def _011_full_text_search(cursor):
+    search.create(cursor)
+
+def _012_certificate_categories(cursor):
+    _add_column(cursor, 'certificates', 'category', "TEXT")
+    ensure_indexes(cursor, 12)
+    # Tag existing certificates with the user's certificate-scope patterns, as create_certificate does
+    cursor.execute("SELECT DISTINCT user_id FROM certificates WHERE category IS NULL")
+    tagged = 0
+    for (user_id,) in cursor.fetchall():
+        categorize = classifier.Classifier(classifier.category_patterns(cursor.connection, user_id, classifier.CERTIFICATE)).classify
+        cursor.execute("SELECT id, certType, certName FROM certificates WHERE user_id = ? AND category IS NULL", (user_id,))
+        updates = [
+            (categorize(classifier.certificate_text(cert_type, cert_name)) or classifier.DEFAULT_CATEGORY, row_id)
+            for row_id, cert_type, cert_name in cursor.fetchall()
+        ]
+        cursor.executemany("UPDATE certificates SET category = ? WHERE id = ?", updates)
+        tagged += len(updates)
+    if tagged:
+        print(f"Migrated: Tagged {tagged} certificates with a category")
+
+def _013_decoded_payload_sizes(cursor):
+    # Deferred import: blob_store depends on backend.database, which imports this module.
+    from backend import blob_store
+
+    # Base64 payloads recorded the length of their text; record what they decode to, as raw uploads do
+    fixed = 0
+    for table, ref_col, size_col, codec_col, base64_rows in (
+        ('documents', 'doc_ref', 'doc_size', 'doc_codec', "IFNULL(doc_encoding, 'base64') = 'base64'"),
+        ('certificates', 'cert_ref', 'cert_size', 'cert_codec', '1'),
+    ):
+        cursor.execute(f"SELECT DISTINCT {ref_col}, {codec_col} FROM {table} WHERE {ref_col} IS NOT NULL AND {base64_rows}")
+        for ref, codec in cursor.fetchall():
+            try:
+                with blob_store.Payload(ref, blob_store.ENCODING_BASE64, codec) as payload:
+                    size = payload.size
+            except FileNotFoundError:
+                continue
+            cursor.execute(f"UPDATE {table} SET {size_col} = ? WHERE {ref_col} = ? AND {base64_rows}", (size, ref))
+            fixed += cursor.rowcount
+    if fixed:
+        print(f"Migrated: Recorded the decoded size of {fixed} base64 payloads")
+
+def _014_default_certificate_category(cursor):
+    # Version 12 left certificates no pattern matched uncategorized; documents get DEFAULT_CATEGORY instead
+    cursor.execute("UPDATE certificates SET category = ? WHERE category IS NULL", (classifier.DEFAULT_CATEGORY,))
+    if cursor.rowcount:
+        print(f"Migrated: Tagged {cursor.rowcount} uncategorized certificates as {classifier.DEFAULT_CATEGORY}")
+
+# (version, description, step) -- append only, never renumber.
+MIGRATIONS = [
+    (1, "Baseline schema, legacy column upgrades and seed data", _001_baseline),
+    (2, "Indexes for per-user lists, dashboard sorts and login", _002_indexes),
+    (3, "Move document and certificate payloads to the blob store", _003_blob_store),
+    (4, "Covering indexes for dashboard status counts", _004_status_indexes),
+    (5, "Incrementally maintained sea-time rollups", _005_sea_time_rollups),
+    (6, "Sea-time rollups by department, engine power and month", _006_sea_time_rollup_dimensions),
+    (7, "Record whether a document payload is raw bytes or base64 text", _007_document_encoding),
+    (8, "Record the compression codec of document and certificate payloads", _008_payload_codecs),
+    (9, "Per-user payload hash indexes for duplicate detection", _009_duplicate_indexes),
+    (10, "Sort-key indexes for keyset pagination of list endpoints", _010_pagination_indexes),
+    (11, "Full-text search indexes for certificates, documents and sea time logs", _011_full_text_search),
+    (12, "Certificate categories, backfilled from the category patterns", _012_certificate_categories),
+    (13, "Record base64 payload sizes as decoded bytes", _013_decoded_payload_sizes),
+    (14, "Default category for certificates no pattern matched", _014_default_certificate_category),
+]
+
+# Versions that free enough pages to be worth a VACUUM once they are applied.
+VACUUM_AFTER = {3}
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> list:
+    """
+    Bring the database up to SCHEMA_VERSION.
+    Returns the list of versions applied (empty when already current).
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return []
+
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-read under the write lock in case another process migrated first
+        current = get_schema_version(conn)
+        pending = [m for m in MIGRATIONS if m[0] > current]
+        for version, description, step in pending:
+            step(cursor)
+            print(f"Applied migration {version}: {description}")
+        if pending:
+            cursor.execute(f"PRAGMA user_version = {pending[-1][0]}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    applied = [m[0] for m in pending]
+    if VACUUM_AFTER.intersection(applied):
+        # VACUUM can't run inside a transaction
+        conn.execute("VACUUM")
+    return applied
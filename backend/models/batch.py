@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+MAX_BATCH_OPERATIONS = 500
+
+class BatchOperation(BaseModel):
+    op: str # 'update', 'archive' (documents only) or 'delete'
+    id: int
+    changes: Optional[Dict[str, Any]] = None # for 'update'
+    archived: Optional[bool] = None # for 'archive'
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class BatchResult(BaseModel):
+    id: int
+    op: str
+    status: int # HTTP-style: 200, 400 or 404
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+    succeeded: int
+    failed: int
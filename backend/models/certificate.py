@@ -12,6 +12,7 @@ class CertificateCreate(BaseModel):
     issueDate: datetime
     uploadDate: datetime
     hidden: bool
+    category: Optional[str] = None # assigned from the category patterns when not given
 
 class CertificateUpdate(BaseModel):
     cert: Optional[str] = None
@@ -22,10 +23,13 @@ class CertificateUpdate(BaseModel):
     certName: Optional[str] = None
     issueDate: Optional[datetime] = None
     hidden: Optional[bool] = None
+    category: Optional[str] = None
 
 class Certificate(CertificateCreate):
     id: int
     user_id: Optional[int] = None
+    # Set on create responses: the user's earlier certificate with the same payload
+    duplicateOf: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -40,6 +44,7 @@ class CertificateSummary(BaseModel):
     issueDate: datetime
     uploadDate: datetime
     hidden: bool
+    category: Optional[str] = None
     user_id: Optional[int] = None
 
     class Config:
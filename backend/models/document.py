@@ -19,9 +19,19 @@ class DocumentBase(BaseModel):
 class DocumentCreate(DocumentBase):
     doc: bytes
 
+class DocumentUpdate(BaseModel):
+    docName: Optional[str] = None
+    docType: Optional[str] = None
+    issuedBy: Optional[str] = None
+    issueDate: Optional[datetime] = None
+    expiry: Optional[date] = None
+    category: Optional[str] = None
+
 class Document(DocumentCreate):
     id: int
     user_id: Optional[int] = None
+    # Set on create responses: the user's earlier document with the same payload
+    duplicateOf: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -30,6 +40,7 @@ class DocumentSummary(DocumentBase):
     id: int
     user_id: Optional[int] = None
     docSize: Optional[int] = 0
+    duplicateOf: Optional[int] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+class SearchResult(BaseModel):
+    type: str # 'certificates', 'documents' or 'seatimelogs'
+    id: int
+    title: str
+    snippet: str # best matching field, matches wrapped in <mark></mark>
+    score: float # bm25; lower is a better match
@@ -0,0 +1,212 @@
+"""
+Query-plan regression check.
+
+Runs EXPLAIN QUERY PLAN over every statement the controllers and routes issue
+and flags full table scans. By default the check builds an in-memory database
+at the current schema version, so it validates the managed index set in
+backend/migrations.py:
+
+    python -m backend.query_plan              # fresh schema
+    python -m backend.query_plan data/certmanager.db
+
+Keep HOT_QUERIES in step with the SQL in backend/controllers and backend/routes.
+"""
+import sqlite3
+import sys
+from typing import List, Dict, Any
+from backend.migrations import migrate
+
+# (label, sql, sample params)
+HOT_QUERIES = [
+    # certificate_controller
+    ("certificates.update", "UPDATE certificates SET certName = ? WHERE id = ? AND user_id = ?", ("x", 1, 1)),
+    ("certificates.page", '''
+        SELECT *, IFNULL(uploadDate, '') AS sort_value FROM certificates
+        WHERE user_id = ? AND status IN (SELECT value FROM json_each(?)) AND IFNULL(uploadDate, '') <= ? AND (IFNULL(uploadDate, '') < ? OR id < ?)
+        ORDER BY IFNULL(uploadDate, '') DESC, id DESC LIMIT ?
+    ''', (1, '["VALID"]', "2024-01-01", "2024-01-01", 1, 51)),
+    ("certificates.page_by_expiry", '''
+        SELECT *, IFNULL(expiry, '') AS sort_value FROM certificates
+        WHERE user_id = ? AND expiry >= ? AND expiry < ? AND IFNULL(expiry, '') >= ? AND (IFNULL(expiry, '') > ? OR id > ?)
+        ORDER BY IFNULL(expiry, '') ASC, id ASC LIMIT ?
+    ''', (1, "2024-01-01", "2025-01-01", "2024-06-01", "2024-06-01", 1, 51)),
+    ("certificates.count", "SELECT COUNT(*) FROM certificates WHERE user_id = ? AND hidden = ?", (1, 0)),
+    ("certificates.get", "SELECT * FROM certificates WHERE id = ? AND user_id = ?", (1, 1)),
+    ("certificates.delete", "DELETE FROM certificates WHERE id = ? AND user_id = ?", (1, 1)),
+    ("certificates.payload", "SELECT cert_ref, cert_codec, certName FROM certificates WHERE id = ? AND user_id = ?", (1, 1)),
+    ("documents.payload", "SELECT doc_ref, doc_encoding, doc_codec, docName FROM documents WHERE id = ? AND user_id = ?", (1, 1)),
+    ("certificates.cert_ref", "SELECT cert_ref FROM certificates WHERE id = ? AND user_id = ?", (1, 1)),
+    # document_controller
+    ("documents.page", '''
+        SELECT id, docID, docType, category, status, expiry, docName, issueDate, uploadDate, hidden, archived, issuedBy, user_id,
+        doc_size as docSize, IFNULL(uploadDate, '') AS sort_value FROM documents
+        WHERE user_id = ? AND archived = ? AND category IN (SELECT value FROM json_each(?)) AND IFNULL(uploadDate, '') <= ? AND (IFNULL(uploadDate, '') < ? OR id < ?)
+        ORDER BY IFNULL(uploadDate, '') DESC, id DESC LIMIT ?
+    ''', (1, 0, '["Travel"]', "2024-01-01", "2024-01-01", 1, 51)),
+    ("documents.page_by_expiry", '''
+        SELECT id, docID, docType, category, status, expiry, docName, issueDate, uploadDate, hidden, archived, issuedBy, user_id,
+        doc_size as docSize, IFNULL(expiry, '') AS sort_value FROM documents
+        WHERE user_id = ? AND archived = ? AND expiry < ?
+        ORDER BY IFNULL(expiry, '') ASC, id ASC LIMIT ?
+    ''', (1, 0, "2025-01-01", 51)),
+    ("documents.count", "SELECT COUNT(*) FROM documents WHERE user_id = ? AND archived = ? AND status IN (SELECT value FROM json_each(?))", (1, 0, '["VALID"]')),
+    ("documents.update", "UPDATE documents SET docName = ? WHERE id = ? AND user_id = ?", ("x", 1, 1)),
+    ("documents.get", "SELECT * FROM documents WHERE id = ? AND user_id = ?", (1, 1)),
+    ("documents.delete", "DELETE FROM documents WHERE id = ? AND user_id = ?", (1, 1)),
+    ("documents.archive", "UPDATE documents SET archived = ? WHERE id = ? AND user_id = ?", (1, 1, 1)),
+    ("documents.doc_ref", "SELECT doc_ref FROM documents WHERE id = ? AND user_id = ?", (1, 1)),
+    # blob_store
+    ("blobs.is_referenced", '''
+        SELECT 1 FROM documents WHERE doc_ref = ?
+        UNION ALL
+        SELECT 1 FROM certificates WHERE cert_ref = ?
+        LIMIT 1
+    ''', ("ab", "ab")),
+    # batch
+    ("batch.owned_ids", "SELECT id FROM documents WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))", (1, "[1]")),
+    ("batch.refs", "SELECT DISTINCT doc_ref FROM documents WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))", (1, "[1]")),
+    ("batch.certificate_refs", "SELECT DISTINCT cert_ref FROM certificates WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))", (1, "[1]")),
+    # classifier
+    ("classifier.patterns", '''
+        SELECT label, pattern FROM document_categories
+        WHERE (user_id = ? OR is_system = 1) AND scope = ? AND pattern IS NOT NULL AND pattern != ''
+        ORDER BY id
+    ''', (1, "document")),
+    ("classifier.reclassify_documents", "SELECT id, docType, docName, category FROM documents WHERE user_id = ?", (1,)),
+    ("classifier.reclassify_certificates", "SELECT id, certType, certName, category FROM certificates WHERE user_id = ?", (1,)),
+    ("classifier.update_document", "UPDATE documents SET category = ? WHERE id = ? AND user_id = ?", ("x", 1, 1)),
+    ("classifier.update_certificate", "UPDATE certificates SET category = ? WHERE id = ? AND user_id = ?", ("x", 1, 1)),
+    ("certificates.by_category", "SELECT id FROM certificates WHERE user_id = ? AND category IN (SELECT value FROM json_each(?))", (1, '["STCW"]')),
+    # search
+    ("search.certificates", '''
+        SELECT certificates_fts.rowid AS id, t.certName AS title,
+            snippet(certificates_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet, bm25(certificates_fts, 1.0, 1.0, 1.0, 0.0) AS score
+        FROM certificates_fts JOIN certificates t ON t.id = certificates_fts.rowid
+        WHERE certificates_fts MATCH ?
+        ORDER BY score
+        LIMIT ?
+    ''', ('owner : u1 AND {certName issuedBy certType} : ("panama"*)', 20)),
+    # duplicates
+    ("duplicates.documents", "SELECT id FROM documents WHERE user_id = ? AND doc_ref = ? ORDER BY id LIMIT 1", (1, "ab")),
+    ("duplicates.certificates", "SELECT id FROM certificates WHERE user_id = ? AND cert_ref = ? ORDER BY id LIMIT 1", (1, "ab")),
+    ("duplicates.stored", "SELECT COUNT(doc_ref), COUNT(DISTINCT doc_ref) FROM documents WHERE user_id = ?", (1,)),
+    ("documents.summary", '''
+        SELECT id, docID, docType, category, status, expiry, docName, issueDate, uploadDate, hidden, archived, issuedBy, user_id,
+        doc_size as docSize
+        FROM documents
+        WHERE id = ? AND user_id = ?
+    ''', (1, 1)),
+    # bulk_import
+    ("import.existing", '''
+        SELECT doc_ref, MIN(id) FROM documents WHERE user_id = ? AND doc_ref IN (SELECT value FROM json_each(?)) GROUP BY doc_ref
+    ''', (1, '["ab"]')),
+    # recompress
+    ("recompress.pending", '''
+        SELECT doc_ref FROM documents WHERE doc_codec IS NULL AND doc_ref IS NOT NULL
+        UNION
+        SELECT cert_ref FROM certificates WHERE cert_codec IS NULL AND cert_ref IS NOT NULL
+        LIMIT ?
+    ''', (25,)),
+    ("recompress.documents", "UPDATE documents SET doc_codec = ? WHERE doc_ref = ?", ("zlib", "ab")),
+    ("recompress.certificates", "UPDATE certificates SET cert_codec = ? WHERE cert_ref = ?", ("zlib", "ab")),
+    # dashboard_controller
+    ("dashboard.sea_time_rollups", '''
+        SELECT dimension, key, days FROM sea_time_rollups
+        WHERE user_id = ? AND dimension IN (SELECT value FROM json_each(?))
+    ''', (1, '["total"]')),
+    ("dashboard.recent_voyages", '''
+        SELECT vesselName, type, dwt, signOff, rank FROM sea_time_logs
+        WHERE user_id = ? AND julianday(signOn) IS NOT NULL
+        ORDER BY signOff DESC LIMIT 3
+    ''', (1,)),
+    ("dashboard.certificate_counts", "SELECT status, COUNT(*) AS n FROM certificates WHERE user_id = ? GROUP BY status", (1,)),
+    ("dashboard.document_counts", "SELECT status, COUNT(*) AS n FROM documents WHERE user_id = ? GROUP BY status", (1,)),
+    ("dashboard.certificate_alerts", '''
+        SELECT certName AS name, expiry FROM certificates
+        WHERE user_id = ? AND status = 'EXPIRING' AND date(substr(expiry, 1, 10)) <= ?
+    ''', (1, "2030-01-01")),
+    ("dashboard.document_alerts", '''
+        SELECT docName AS name, expiry FROM documents
+        WHERE user_id = ? AND status = 'EXPIRING' AND date(substr(expiry, 1, 10)) <= ?
+    ''', (1, "2030-01-01")),
+    ("dashboard.recent_documents", '''
+        SELECT docName AS name, status, expiry AS expiryDate, uploadDate
+        FROM documents WHERE user_id = ? ORDER BY uploadDate DESC LIMIT 3
+    ''', (1,)),
+    # profile_controller
+    ("profiles.get", "SELECT * FROM profiles WHERE id = ?", (1,)),
+    ("profiles.by_email", "SELECT * FROM profiles WHERE email = ?", ("john.doe@example.com",)),
+    ("profiles.update", "UPDATE profiles SET bio = ? WHERE id = ?", ("x", 1)),
+    # seatimelog_controller
+    ("sea_time_logs.page", '''
+        SELECT *, IFNULL(signOn, '') AS sort_value FROM sea_time_logs
+        WHERE user_id = ? AND rank IN (SELECT value FROM json_each(?)) AND IFNULL(signOn, '') <= ? AND (IFNULL(signOn, '') < ? OR id < ?)
+        ORDER BY IFNULL(signOn, '') DESC, id DESC LIMIT ?
+    ''', (1, '["Master"]', "2024-01-01", "2024-01-01", 1, 51)),
+    ("sea_time_logs.get", "SELECT * FROM sea_time_logs WHERE id = ? AND user_id = ?", (1, 1)),
+    ("sea_time_logs.delete", "DELETE FROM sea_time_logs WHERE id = ? AND user_id = ?", (1, 1)),
+    ("sea_time_logs.intervals", "SELECT signOn, signOff FROM sea_time_logs WHERE user_id = ?", (1,)),
+    ("sea_time_logs.rollup_fields", "SELECT signOn, signOff, rank, type, dept, kw, bhp FROM sea_time_logs WHERE id = ? AND user_id = ?", (1, 1)),
+    ("sea_time_rollups.breakdowns", '''
+        SELECT dimension, key, days, logs FROM sea_time_rollups
+        WHERE user_id = ? AND dimension IN (SELECT value FROM json_each(?))
+        ORDER BY dimension, days DESC
+    ''', (1, '["rank", "month"]')),
+    ("sea_time_rollups.upsert", '''
+        INSERT INTO sea_time_rollups (user_id, dimension, key, days, logs) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, dimension, key) DO UPDATE SET days = days + excluded.days, logs = logs + excluded.logs
+    ''', (1, "total", "", 1, 1)),
+    ("sea_time_rollups.prune", "DELETE FROM sea_time_rollups WHERE user_id = ? AND logs <= 0", (1,)),
+    ("sea_time_logs.update", "UPDATE sea_time_logs SET rank = ? WHERE id = ? AND user_id = ?", ("x", 1, 1)),
+    # category_routes
+    ("categories.list", '''
+        SELECT * FROM document_categories
+        WHERE (user_id = ? OR is_system = 1) AND scope = ?
+    ''', (1, "document")),
+    ("categories.get", "SELECT * FROM document_categories WHERE id = ?", (1,)),
+    ("categories.update", "UPDATE document_categories SET label = ? WHERE id = ?", ("x", 1)),
+    ("categories.delete", "DELETE FROM document_categories WHERE id = ?", (1,)),
+    # resume_routes
+    ("resumes.list", "SELECT id, user_id, name, data, created_at, updated_at FROM resume_drafts WHERE user_id = ? ORDER BY updated_at DESC", (1,)),
+    ("resumes.get", "SELECT id, user_id, name, data, created_at, updated_at FROM resume_drafts WHERE id = ? AND user_id = ?", (1, 1)),
+    ("resumes.exists", "SELECT id FROM resume_drafts WHERE id = ? AND user_id = ?", (1, 1)),
+    ("resumes.update", "UPDATE resume_drafts SET name = ? WHERE id = ?", ("x", 1)),
+    ("resumes.delete", "DELETE FROM resume_drafts WHERE id = ? AND user_id = ?", (1, 1)),
+]
+
+def explain(conn: sqlite3.Connection, sql: str, params=()) -> List[str]:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+def is_full_scan(detail: str) -> bool:
+    # "SCAN t" reads every row; "SCAN t USING [COVERING] INDEX" is an ordered
+    # index walk and "SEARCH" is a keyed lookup. A VIRTUAL TABLE scan walks a
+    # table-valued function such as json_each(?) over a bound parameter.
+    return detail.startswith("SCAN ") and " USING " not in detail and " VIRTUAL TABLE " not in detail
+
+def check_query_plans(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Return one entry per hot query whose plan contains a full table scan."""
+    problems = []
+    for label, sql, params in HOT_QUERIES:
+        plan = explain(conn, sql, params)
+        scans = [detail for detail in plan if is_full_scan(detail)]
+        if scans:
+            problems.append({"query": label, "scans": scans, "plan": plan})
+    return problems
+
+def main(argv: List[str]) -> int:
+    if len(argv) > 1:
+        conn = sqlite3.connect(argv[1])
+    else:
+        conn = sqlite3.connect(":memory:")
+        migrate(conn)
+
+    problems = check_query_plans(conn)
+    conn.close()
+
+    for problem in problems:
+        print(f"FULL SCAN in {problem['query']}: {'; '.join(problem['scans'])}")
+    print(f"Checked {len(HOT_QUERIES)} statements, {len(problems)} with full table scans")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,181 @@
+"""
+Background recompression of payloads stored before compression existed.
+
+Rows whose doc_codec / cert_codec is NULL point at uncompressed blobs written
+by older versions. The job works through them in batches: each blob is
+compressed off the writer thread (blob_store.recompress), one writer job then
+points every row sharing the blob at its new codec, and only after that
+commit is the uncompressed file removed. Blobs that don't shrink are marked
+'none' so they are not looked at again. An uncompressed file that can't be
+removed yet (open for reading, on Windows) is counted as skipped and retried
+at the start of the next run.
+
+storage_report() summarises what compression saves across all stored blobs.
+
+    python -m backend.recompress              # data/certmanager.db
+    python -m backend.recompress path/to.db
+"""
+import asyncio
+import sqlite3
+import sys
+from datetime import datetime
+from typing import List, Tuple
+
+from backend import blob_store
+from backend.database import get_db_connection, run_db, run_write
+from backend.utils.codec import CODEC_NONE
+
+BATCH_SIZE = 25
+# Pause between batches so interactive writes get the writer in between
+BATCH_PAUSE_SECONDS = 0.1
+
+_PENDING = '''
+    SELECT doc_ref FROM documents WHERE doc_codec IS NULL AND doc_ref IS NOT NULL
+    UNION
+    SELECT cert_ref FROM certificates WHERE cert_codec IS NULL AND cert_ref IS NOT NULL
+    LIMIT ?
+'''
+
+_stats = {"running": False, "lastRun": None, "blobs": 0, "compressed": 0, "failed": 0, "skipped": 0,
+          "bytesBefore": 0, "bytesAfter": 0}
+
+def pending_refs(conn: sqlite3.Connection, limit: int = BATCH_SIZE) -> List[str]:
+    return [row[0] for row in conn.execute(_PENDING, (limit,))]
+
+def compress_blobs(refs: List[str]) -> List[Tuple[str, str, int, int]]:
+    """(ref, codec, bytes before, bytes after) for each blob; failures keep CODEC_NONE."""
+    results = []
+    for ref in refs:
+        try:
+            results.append((ref, *blob_store.recompress(ref)))
+        except Exception as e:
+            print(f"Error recompressing blob {ref}: {e}")
+            _stats["failed"] += 1
+            results.append((ref, CODEC_NONE, 0, 0))
+    return results
+
+def record_codecs(conn: sqlite3.Connection, results: List[Tuple[str, str, int, int]]) -> int:
+    """Writer job: point every row that shares a blob at the blob's codec."""
+    params = [(codec, ref) for ref, codec, _, _ in results]
+    updated = conn.executemany('UPDATE documents SET doc_codec = ? WHERE doc_ref = ?', params).rowcount
+    updated += conn.executemany('UPDATE certificates SET cert_codec = ? WHERE cert_ref = ?', params).rowcount
+    return updated
+
+def _discard(results: List[Tuple[str, str, int, int]]):
+    for ref, codec, _, _ in results:
+        try:
+            blob_store.discard_uncompressed(ref, codec)
+        except Exception as e:
+            print(f"Error discarding uncompressed blob {ref}: {e}")
+        if blob_store.is_leftover(ref):
+            _stats["skipped"] += 1
+
+def _count(results: List[Tuple[str, str, int, int]]):
+    for _, codec, before, after in results:
+        _stats["blobs"] += 1
+        if codec != CODEC_NONE and before:
+            _stats["compressed"] += 1
+            _stats["bytesBefore"] += before
+            _stats["bytesAfter"] += after
+
+def _pending_batch() -> List[str]:
+    conn = get_db_connection()
+    try:
+        return pending_refs(conn)
+    finally:
+        conn.close()
+
+async def run_recompress() -> int:
+    """Background task: recompress every pending blob. Returns the number of blobs examined."""
+    if _stats["running"]:
+        return 0
+    _stats["running"] = True
+    examined = 0
+    try:
+        # Uncompressed copies a reader kept open during the last run
+        await run_write(blob_store.remove_leftovers)
+        while True:
+            refs = await run_db(_pending_batch)
+            if not refs:
+                break
+            results = await asyncio.to_thread(compress_blobs, refs)
+            await run_write(record_codecs, results)
+            await asyncio.to_thread(_discard, results)
+            _count(results)
+            examined += len(results)
+            await asyncio.sleep(BATCH_PAUSE_SECONDS)
+    except Exception as e:
+        print(f"Payload recompression failed: {e}")
+    finally:
+        _stats["running"] = False
+        _stats["lastRun"] = datetime.now().isoformat(timespec="seconds")
+    if examined:
+        print(f"Recompression: examined {examined} blobs, compressed {_stats['compressed']}")
+    return examined
+
+def get_recompress_stats() -> dict:
+    stats = dict(_stats)
+    stats["savedBytes"] = stats["bytesBefore"] - stats["bytesAfter"]
+    return stats
+
+def storage_report(conn: sqlite3.Connection) -> dict:
+    """Uncompressed vs on-disk bytes of every stored blob, overall and per codec."""
+    blobs = {}
+    for ref, codec, size in conn.execute('''
+        SELECT doc_ref, doc_codec, MAX(doc_size) FROM documents WHERE doc_ref IS NOT NULL GROUP BY doc_ref
+        UNION ALL
+        SELECT cert_ref, cert_codec, MAX(cert_size) FROM certificates WHERE cert_ref IS NOT NULL GROUP BY cert_ref
+    '''):
+        # A blob shared by a document and a certificate is stored (and counted) once
+        blobs.setdefault(ref, (codec, size or 0))
+
+    by_codec = {}
+    logical = stored = 0
+    for ref, (codec, size) in blobs.items():
+        on_disk = blob_store.stored_size(ref, codec)
+        entry = by_codec.setdefault(codec or "pending", {"blobs": 0, "logicalBytes": 0, "storedBytes": 0})
+        entry["blobs"] += 1
+        entry["logicalBytes"] += size
+        entry["storedBytes"] += on_disk
+        logical += size
+        stored += on_disk
+    return {
+        "blobs": len(blobs),
+        "logicalBytes": logical,
+        "storedBytes": stored,
+        "savedBytes": logical - stored,
+        "savedPercent": round(100 * (logical - stored) / logical, 1) if logical else 0.0,
+        "byCodec": by_codec,
+    }
+
+def main(argv: List[str]) -> int:
+    if len(argv) > 1:
+        database = argv[1]
+    else:
+        from backend.database import DATABASE_NAME
+        database = DATABASE_NAME
+    conn = sqlite3.connect(database)
+    try:
+        from backend.migrations import migrate
+        migrate(conn)
+        with conn:
+            blob_store.remove_leftovers(conn)
+        while True:
+            refs = pending_refs(conn)
+            if not refs:
+                break
+            results = compress_blobs(refs)
+            with conn:
+                record_codecs(conn, results)
+            _discard(results)
+            _count(results)
+        report = storage_report(conn)
+    finally:
+        conn.close()
+    print(f"Recompressed {_stats['compressed']} of {_stats['blobs']} blobs in {database}")
+    print(f"{report['blobs']} blobs: {report['logicalBytes']} bytes stored as {report['storedBytes']} "
+          f"({report['savedPercent']}% saved)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -3,13 +3,15 @@ from backend.models.auth import Token, LoginRequest
 from backend.models.profile import ProfileCreate, Profile
 from backend.controllers import profile_controller
 from backend.utils.security import verify_password, create_access_token
+from backend.dependencies import get_db
+from backend.database import UnitOfWork
 from datetime import timedelta
 
 router = APIRouter()
 
 @router.post("/auth/login", response_model=Token)
-def login(login_request: LoginRequest):
-    user = profile_controller.get_profile_by_email(login_request.email)
+def login(login_request: LoginRequest, db: UnitOfWork = Depends(get_db)):
+    user = profile_controller.get_profile_by_email(db, login_request.email)
     if not user or not verify_password(login_request.password, user.get('password_hash', '')):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -23,8 +25,8 @@ def login(login_request: LoginRequest):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/auth/register", response_model=Profile)
-def register(profile: ProfileCreate):
-    user = profile_controller.get_profile_by_email(profile.email)
+def register(profile: ProfileCreate, db: UnitOfWork = Depends(get_db)):
+    user = profile_controller.get_profile_by_email(db, profile.email)
     if user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return profile_controller.create_profile(profile)
+    return profile_controller.create_profile(db, profile)
@@ -1,40 +1,110 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from datetime import date
+from typing import List, Optional
+from backend.models.batch import BatchRequest, BatchResponse
 from backend.models.certificate import Certificate, CertificateCreate, CertificateUpdate, CertificateSummary
+from backend import duplicates
 from backend.controllers import certificate_controller
-from backend.dependencies import get_current_user
+from backend.dependencies import get_current_user, get_db
+from backend.database import UnitOfWork
 from backend.models.profile import Profile
+from backend.utils import fieldsets, pagination
+from backend.utils.content import payload_response
 
 router = APIRouter()
 
 @router.post("/certificates", response_model=Certificate, status_code=status.HTTP_201_CREATED)
-def create_certificate(cert: CertificateCreate, current_user: Profile = Depends(get_current_user)):
+def create_certificate(
+    cert: CertificateCreate,
+    response: Response,
+    onDuplicate: str = Query(duplicates.DUPLICATE_ALLOW, pattern=duplicates.POLICY_PATTERN),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    """onDuplicate: allow (default), reuse (200 with the existing certificate) or reject (409)."""
     try:
-        return certificate_controller.create_certificate(cert, current_user.id)
+        created = certificate_controller.create_certificate(db, cert, current_user.id, onDuplicate)
+    except duplicates.DuplicatePayload as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "duplicateOf": e.existing_id})
     except Exception as e:
         print(f"Error creating certificate: {e}")
         raise e
+    if created.id == created.duplicateOf:
+        response.status_code = status.HTTP_200_OK
+    return created
+
+@router.post("/certificates/batch", response_model=BatchResponse)
+def batch_certificates(request: BatchRequest, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    """Update / delete many certificates in one transaction; per-item results."""
+    try:
+        return certificate_controller.apply_batch(db, request.operations, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/certificates", response_model=List[CertificateSummary])
-def read_certificates(current_user: Profile = Depends(get_current_user)):
-    return certificate_controller.get_certificates(current_user.id)
+def read_certificates(
+    response: Response,
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    cert_type: Optional[List[str]] = Query(None, alias="certType"),
+    hidden: Optional[bool] = None,
+    category: Optional[List[str]] = Query(None),
+    expiry_from: Optional[date] = Query(None, alias="expiryFrom"),
+    expiry_to: Optional[date] = Query(None, alias="expiryTo"),
+    sort: str = "-uploadDate",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    count: bool = False,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. certName,expiry"),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    """Certificate summaries; paged, filtered and trimmed like GET /documents."""
+    try:
+        names = fieldsets.parse(fields, certificate_controller.SUMMARY_COLUMNS)
+        certs, next_cursor, total = certificate_controller.get_certificates(
+            db, current_user.id, status_filter, cert_type, hidden, category, expiry_from, expiry_to, sort, cursor, limit, count, names
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if names is not None:
+        response = fieldsets.json_response(certs)
+    pagination.set_page_headers(response, next_cursor, total)
+    return certs if names is None else response
 
 @router.get("/certificates/{cert_id}", response_model=Certificate)
-def read_certificate(cert_id: int, current_user: Profile = Depends(get_current_user)):
-    cert = certificate_controller.get_certificate_by_id(cert_id, current_user.id)
+def read_certificate(
+    cert_id: int,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; the payload is only read if 'cert' is listed"),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    try:
+        names = fieldsets.parse(fields, certificate_controller.DETAIL_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cert = certificate_controller.get_certificate_by_id(db, cert_id, current_user.id, names)
     if cert is None:
         raise HTTPException(status_code=404, detail="Certificate not found")
-    return cert
+    return cert if names is None else fieldsets.json_response(cert)
 
 @router.put("/certificates/{cert_id}", response_model=Certificate)
-def update_certificate(cert_id: int, cert_update: CertificateUpdate, current_user: Profile = Depends(get_current_user)):
-    updated_cert = certificate_controller.update_certificate(cert_id, cert_update, current_user.id)
+def update_certificate(cert_id: int, cert_update: CertificateUpdate, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    updated_cert = certificate_controller.update_certificate(db, cert_id, cert_update, current_user.id)
     if updated_cert is None:
         raise HTTPException(status_code=404, detail="Certificate not found")
     return updated_cert
 
+@router.get("/certificates/{cert_id}/content")
+def read_certificate_content(cert_id: int, request: Request, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    """Raw certificate file bytes, streamed in chunks, with ETag and Range (206) support."""
+    found = certificate_controller.get_certificate_payload(db, cert_id, current_user.id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Certificate not found")
+    payload, filename = found
+    return payload_response(request, payload, filename)
+
 @router.delete("/certificates/{cert_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_certificate(cert_id: int, current_user: Profile = Depends(get_current_user)):
-    success = certificate_controller.delete_certificate(cert_id, current_user.id)
+def delete_certificate(cert_id: int, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    success = certificate_controller.delete_certificate(db, cert_id, current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Certificate not found")
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends
 from backend.controllers.dashboard_controller import get_dashboard_summary
-from backend.dependencies import get_current_user
+from backend.dependencies import get_current_user, get_db
+from backend.database import run_db, UnitOfWork
 from backend.models.profile import Profile
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 @router.get("/summary")
-async def dashboard_summary(current_user: Profile = Depends(get_current_user)):
+async def dashboard_summary(current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
     """Get aggregated dashboard summary data."""
-    return get_dashboard_summary(current_user.id)
+    return await run_db(get_dashboard_summary, db, current_user.id)
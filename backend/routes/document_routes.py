@@ -1,47 +1,197 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
-from backend.models.document import Document, DocumentCreate, DocumentSummary
+from fastapi import APIRouter, HTTPException, status, Depends, File, Form, Query, Request, Response, UploadFile
+from datetime import date, datetime
+from typing import List, Optional
+from pydantic import ValidationError
+from backend.models.batch import BatchRequest, BatchResponse
+from backend.models.document import Document, DocumentBase, DocumentCreate, DocumentSummary
+from backend import blob_store, bulk_import, duplicates
+from backend.utils import fieldsets, pagination
+from backend.utils.content import payload_response
 from backend.controllers import document_controller
-from backend.dependencies import get_current_user
+from backend.dependencies import get_current_user, get_db
+from backend.database import UnitOfWork
 from backend.models.profile import Profile
 
 router = APIRouter()
 
 @router.post("/documents", response_model=Document, status_code=status.HTTP_201_CREATED)
-def create_document(doc: DocumentCreate, current_user: Profile = Depends(get_current_user)):
+def create_document(
+    doc: DocumentCreate,
+    response: Response,
+    onDuplicate: str = Query(duplicates.DUPLICATE_ALLOW, pattern=duplicates.POLICY_PATTERN),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    """onDuplicate: allow (default), reuse (200 with the existing document) or reject (409)."""
     try:
-        return document_controller.create_document(doc, current_user.id)
+        created = document_controller.create_document(db, doc, current_user.id, onDuplicate)
+    except duplicates.DuplicatePayload as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "duplicateOf": e.existing_id})
     except Exception as e:
         print(f"Error creating document: {e}")
         raise e
+    if created.id == created.duplicateOf:
+        response.status_code = status.HTTP_200_OK
+    return created
+
+@router.post("/documents/upload", response_model=DocumentSummary, status_code=status.HTTP_201_CREATED)
+def upload_document(
+    file: UploadFile = File(...),
+    docID: str = Form(...),
+    docType: str = Form(...),
+    category: str = Form("", description="Leave empty to assign one from the category patterns"),
+    docName: Optional[str] = Form(None),
+    issueDate: datetime = Form(...),
+    uploadDate: Optional[datetime] = Form(None),
+    expiry: Optional[date] = Form(None),
+    issuedBy: str = Form("Self"),
+    hidden: bool = Form(False),
+    archived: bool = Form(False),
+    response: Response = None,
+    onDuplicate: str = Query(duplicates.DUPLICATE_ALLOW, pattern=duplicates.POLICY_PATTERN),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    """Multipart upload: the file is streamed to the blob store in chunks, never buffered whole."""
+    meta = DocumentBase(
+        docID=docID, docType=docType, category=category, status="VALID", expiry=expiry,
+        issuedBy=issuedBy, docName=docName or file.filename, issueDate=issueDate,
+        uploadDate=uploadDate or datetime.now(), hidden=hidden, archived=archived
+    )
+    try:
+        created = document_controller.create_document_from_upload(db, meta, file.file, current_user.id, onDuplicate)
+    except blob_store.BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except duplicates.DuplicatePayload as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "duplicateOf": e.existing_id})
+    finally:
+        file.file.close()
+    if created.id == created.duplicateOf:
+        response.status_code = status.HTTP_200_OK
+    return created
+
+@router.post("/documents/import", status_code=status.HTTP_202_ACCEPTED)
+def import_documents(
+    file: UploadFile = File(...),
+    onDuplicate: str = Query(duplicates.DUPLICATE_ALLOW, pattern=duplicates.POLICY_PATTERN),
+    current_user: Profile = Depends(get_current_user)
+):
+    """Import every file in a ZIP archive as a document; poll GET /documents/import/{jobId} for progress."""
+    try:
+        job = bulk_import.start_import(current_user.id, file.file, onDuplicate)
+    except blob_store.BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        file.file.close()
+    return job.to_dict()
+
+@router.get("/documents/import/{job_id}")
+def read_import_job(job_id: str, current_user: Profile = Depends(get_current_user)):
+    job = bulk_import.get_job(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.to_dict()
+
+@router.post("/documents/batch", response_model=BatchResponse)
+def batch_documents(request: BatchRequest, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    """Update / archive / delete many documents in one transaction; per-item results."""
+    try:
+        return document_controller.apply_batch(db, request.operations, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/documents", response_model=List[DocumentSummary])
-def read_documents(archived: bool = False, current_user: Profile = Depends(get_current_user)):
-    return document_controller.get_documents(current_user.id, archived)
+def read_documents(
+    response: Response,
+    archived: bool = False,
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    category: Optional[List[str]] = Query(None),
+    hidden: Optional[bool] = None,
+    expiry_from: Optional[date] = Query(None, alias="expiryFrom"),
+    expiry_to: Optional[date] = Query(None, alias="expiryTo"),
+    sort: str = "-uploadDate",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    count: bool = False,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. docName,expiry"),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    """
+    Document summaries, newest upload first by default. With `limit`, returns
+    one page and sets X-Next-Cursor while more remain; pass it back as
+    `cursor`. `count=true` adds the filtered total as X-Total-Count.
+    """
+    try:
+        names = fieldsets.parse(fields, document_controller.SUMMARY_COLUMNS)
+        docs, next_cursor, total = document_controller.get_documents(
+            db, current_user.id, archived, status_filter, category, hidden, expiry_from, expiry_to, sort, cursor, limit, count, names
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if names is not None:
+        response = fieldsets.json_response(docs)
+    pagination.set_page_headers(response, next_cursor, total)
+    return docs if names is None else response
 
 @router.get("/documents/{doc_id}", response_model=Document)
-def read_document(doc_id: int, current_user: Profile = Depends(get_current_user)):
-    doc = document_controller.get_document_by_id(doc_id, current_user.id)
+def read_document(
+    doc_id: int,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; the payload is only read if 'doc' is listed"),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    try:
+        names = fieldsets.parse(fields, document_controller.DETAIL_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    doc = document_controller.get_document_by_id(db, doc_id, current_user.id, names)
     if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
-    return doc
+    return doc if names is None else fieldsets.json_response(doc)
+
+@router.get("/documents/{doc_id}/content")
+def read_document_content(doc_id: int, request: Request, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    """Raw document bytes, streamed in chunks, with ETag and Range (206) support."""
+    found = document_controller.get_document_payload(db, doc_id, current_user.id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    payload, filename = found
+    return payload_response(request, payload, filename)
+
+@router.get("/documents/{doc_id}/thumbnail")
+def read_document_thumbnail(doc_id: int, request: Request, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    """Small JPEG preview of the document (first PDF page or downscaled image)."""
+    found = document_controller.get_document_thumbnail(db, doc_id, current_user.id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="No preview available")
+    image, ref = found
+    headers = {"ETag": f'"{ref}-thumb"', "Cache-Control": "private, max-age=86400"}
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=image, media_type="image/jpeg", headers=headers)
 
 @router.delete("/documents/{doc_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_document(doc_id: int, current_user: Profile = Depends(get_current_user)):
-    success = document_controller.delete_document(doc_id, current_user.id)
+def delete_document(doc_id: int, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    success = document_controller.delete_document(db, doc_id, current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Document not found")
 
 @router.patch("/documents/{doc_id}/archive", status_code=status.HTTP_200_OK)
-def archive_document(doc_id: int, archived: bool, current_user: Profile = Depends(get_current_user)):
-    success = document_controller.toggle_archive_status(doc_id, current_user.id, archived)
+def archive_document(doc_id: int, archived: bool, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    success = document_controller.toggle_archive_status(db, doc_id, current_user.id, archived)
     if not success:
         raise HTTPException(status_code=404, detail="Document not found")
     return {"message": "Document archive status updated"}
 
 @router.patch("/documents/{doc_id}", status_code=status.HTTP_200_OK)
-def update_document_details(doc_id: int, updates: dict, current_user: Profile = Depends(get_current_user)):
-    success = document_controller.update_document(doc_id, current_user.id, updates)
+def update_document_details(doc_id: int, updates: dict, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    try:
+        success = document_controller.update_document(db, doc_id, current_user.id, updates)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid changes: {e.errors()[0]['loc'][0]}: {e.errors()[0]['msg']}")
     if not success:
         raise HTTPException(status_code=404, detail="Document not found or no changes made")
     return {"message": "Document updated successfully"}
@@ -1,17 +1,33 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from typing import Optional
 from backend.models.profile import Profile, ProfileUpdate
 from backend.controllers import profile_controller
-from backend.dependencies import get_current_user
+from backend.dependencies import get_current_user, get_db
+from backend.database import UnitOfWork
+from backend.utils import fieldsets
 
 router = APIRouter()
 
+# The profile row is already read in full to authenticate the request, so a
+# fieldset here only trims what is serialized
+PROFILE_FIELDS = dict.fromkeys(Profile.model_fields)
+
 @router.get("/profile", response_model=Profile)
-def read_profile(current_user: Profile = Depends(get_current_user)):
-    return current_user
+def read_profile(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. first_name,last_name,rank"),
+    current_user: Profile = Depends(get_current_user)
+):
+    try:
+        names = fieldsets.parse(fields, PROFILE_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if names is None:
+        return current_user
+    return fieldsets.json_response(current_user.model_dump(mode="json", include=set(names)))
 
 @router.put("/profile", response_model=Profile)
-def update_profile(profile_data: ProfileUpdate, current_user: Profile = Depends(get_current_user)):
-    updated_profile = profile_controller.update_profile(profile_data, current_user.id)
+def update_profile(profile_data: ProfileUpdate, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    updated_profile = profile_controller.update_profile(db, profile_data, current_user.id)
     if updated_profile is None:
          raise HTTPException(status_code=404, detail="Profile not found")
     return updated_profile
@@ -3,97 +3,54 @@ from typing import List, Optional
 from datetime import datetime
 import json
 
-from backend.database import get_db_connection
+from backend.database import UnitOfWork
 from backend.models.resume import ResumeDraft, ResumeDraftCreate, ResumeDraftUpdate
-from backend.dependencies import get_current_user
+from backend.dependencies import get_current_user, get_db
 from backend.models.profile import Profile
 
 router = APIRouter(prefix="/resumes", tags=["Resume Drafts"])
 
+def _draft_from_row(row) -> ResumeDraft:
+    return ResumeDraft(
+        id=row["id"],
+        user_id=row["user_id"],
+        name=row["name"],
+        data=json.loads(row["data"]),
+        created_at=row["created_at"],
+        updated_at=row["updated_at"]
+    )
+
 @router.post("/", response_model=ResumeDraft)
-async def create_resume_draft(draft: ResumeDraftCreate, current_user: Profile = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def create_resume_draft(draft: ResumeDraftCreate, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
     try:
-        cursor.execute(
+        result = await db.execute(
             "INSERT INTO resume_drafts (user_id, name, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
             (current_user.id, draft.name, json.dumps(draft.data), datetime.now(), datetime.now())
         )
-        conn.commit()
-        draft_id = cursor.lastrowid
-        
-        cursor.execute("SELECT * FROM resume_drafts WHERE id = ?", (draft_id,))
-        new_draft = cursor.fetchone()
-        
-        return ResumeDraft(
-            id=new_draft["id"],
-            user_id=new_draft["user_id"],
-            name=new_draft["name"],
-            data=json.loads(new_draft["data"]),
-            created_at=new_draft["created_at"],
-            updated_at=new_draft["updated_at"]
-        )
+        new_draft = await db.fetch_one("SELECT * FROM resume_drafts WHERE id = ?", (result.lastrowid,))
+        return _draft_from_row(new_draft)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @router.get("/", response_model=List[ResumeDraft])
-async def get_resume_drafts(current_user: Profile = Depends(get_current_user)):
-    conn = get_db_connection()
-    conn.row_factory = lambda cursor, row: {
-        "id": row[0],
-        "user_id": row[1],
-        "name": row[2],
-        "data": json.loads(row[3]),
-        "created_at": row[4],
-        "updated_at": row[5]
-    }
-    cursor = conn.cursor()
-    
-    try:
-        # Explicitly fetching columns to match row_factory indices
-        cursor.execute("SELECT id, user_id, name, data, created_at, updated_at FROM resume_drafts WHERE user_id = ? ORDER BY updated_at DESC", (current_user.id,))
-        drafts = cursor.fetchall()
-        return drafts
-    finally:
-        conn.close()
+async def get_resume_drafts(current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    rows = await db.fetch_all("SELECT id, user_id, name, data, created_at, updated_at FROM resume_drafts WHERE user_id = ? ORDER BY updated_at DESC", (current_user.id,))
+    return [_draft_from_row(row) for row in rows]
 
 @router.get("/{draft_id}", response_model=ResumeDraft)
-async def get_resume_draft(draft_id: int, current_user: Profile = Depends(get_current_user)):
-    conn = get_db_connection()
-    conn.row_factory = lambda cursor, row: {
-        "id": row[0],
-        "user_id": row[1],
-        "name": row[2],
-        "data": json.loads(row[3]),
-        "created_at": row[4],
-        "updated_at": row[5]
-    }
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("SELECT id, user_id, name, data, created_at, updated_at FROM resume_drafts WHERE id = ? AND user_id = ?", (draft_id, current_user.id))
-        draft = cursor.fetchone()
-        
-        if not draft:
-            raise HTTPException(status_code=404, detail="Draft not found")
-            
-        return draft
-    finally:
-        conn.close()
+async def get_resume_draft(draft_id: int, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    draft = await db.fetch_one("SELECT id, user_id, name, data, created_at, updated_at FROM resume_drafts WHERE id = ? AND user_id = ?", (draft_id, current_user.id))
+
+    if not draft:
+        raise HTTPException(status_code=404, detail="Draft not found")
+
+    return _draft_from_row(draft)
 
 @router.put("/{draft_id}", response_model=ResumeDraft)
-async def update_resume_draft(draft_id: int, draft_update: ResumeDraftUpdate, current_user: Profile = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def update_resume_draft(draft_id: int, draft_update: ResumeDraftUpdate, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
     try:
         # Check if draft exists and belongs to user
-        cursor.execute("SELECT * FROM resume_drafts WHERE id = ? AND user_id = ?", (draft_id, current_user.id))
-        existing_draft = cursor.fetchone()
+        existing_draft = await db.fetch_one("SELECT id FROM resume_drafts WHERE id = ? AND user_id = ?", (draft_id, current_user.id))
         
         if not existing_draft:
             raise HTTPException(status_code=404, detail="Draft not found")
@@ -115,41 +72,20 @@ async def update_resume_draft(draft_id: int, draft_update: ResumeDraftUpdate, cu
         values.append(draft_id)
         
         query = f"UPDATE resume_drafts SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, tuple(values))
-        conn.commit()
+        await db.execute(query, tuple(values))
         
         # Return updated draft
-        # Use simple row factory/manual fetch for updated draft to handle JSON parsing
-        cursor.execute("SELECT id, user_id, name, data, created_at, updated_at FROM resume_drafts WHERE id = ?", (draft_id,))
-        row = cursor.fetchone()
-        
-        return ResumeDraft(
-            id=row[0],
-            user_id=row[1],
-            name=row[2],
-            data=json.loads(row[3]),
-            created_at=row[4],
-            updated_at=row[5]
-        )
+        row = await db.fetch_one("SELECT id, user_id, name, data, created_at, updated_at FROM resume_drafts WHERE id = ?", (draft_id,))
+        return _draft_from_row(row)
         
     except HTTPException:
         raise
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @router.delete("/{draft_id}")
-async def delete_resume_draft(draft_id: int, current_user: Profile = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("DELETE FROM resume_drafts WHERE id = ? AND user_id = ?", (draft_id, current_user.id))
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Draft not found")
-        conn.commit()
-        return {"message": "Draft deleted successfully"}
-    finally:
-        conn.close()
+async def delete_resume_draft(draft_id: int, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    result = await db.execute("DELETE FROM resume_drafts WHERE id = ? AND user_id = ?", (draft_id, current_user.id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    return {"message": "Draft deleted successfully"}
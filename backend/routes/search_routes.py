@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
+from backend import search
+from backend.dependencies import get_current_user, get_db
+from backend.database import UnitOfWork
+from backend.models.profile import Profile
+from backend.models.search import SearchResult
+
+router = APIRouter()
+
+@router.get("/search", response_model=List[SearchResult])
+def search_records(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[List[str]] = Query(None, description="Any of certificates, documents, seatimelogs; all by default"),
+    limit: int = Query(20, ge=1, le=search.MAX_RESULTS),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    """Ranked full-text matches across the user's certificates, documents and sea time logs."""
+    try:
+        return search.search(db.conn, current_user.id, q, types, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,37 +1,94 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
+from datetime import date
+from typing import List, Optional
 from backend.models.seatimelog import SeaTimeLog, SeaTimeLogCreate
 from backend.controllers import seatimelog_controller
-from backend.dependencies import get_current_user
+from backend.dependencies import get_current_user, get_db
+from backend.database import UnitOfWork
+from backend.utils import fieldsets, pagination
 from backend.models.profile import Profile
 
 router = APIRouter()
 
 @router.post("/seatimelogs", response_model=SeaTimeLog, status_code=status.HTTP_201_CREATED)
-def create_seatimelog(log: SeaTimeLogCreate, current_user: Profile = Depends(get_current_user)):
-    return seatimelog_controller.create_seatimelog(log, current_user.id)
+def create_seatimelog(log: SeaTimeLogCreate, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    return seatimelog_controller.create_seatimelog(db, log, current_user.id)
 
 @router.get("/seatimelogs", response_model=List[SeaTimeLog])
-def read_seatimelogs(current_user: Profile = Depends(get_current_user)):
-    return seatimelog_controller.get_seatimelogs(current_user.id)
+def read_seatimelogs(
+    response: Response,
+    rank: Optional[List[str]] = Query(None),
+    vessel_type: Optional[List[str]] = Query(None, alias="type"),
+    dept: Optional[List[str]] = Query(None),
+    sign_on_from: Optional[date] = Query(None, alias="signOnFrom"),
+    sign_on_to: Optional[date] = Query(None, alias="signOnTo"),
+    sort: str = "-signOn",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    count: bool = False,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. vesselName,rank,signOn,signOff"),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    """Sea time logs, latest sign-on first; paged, filtered and trimmed like GET /documents."""
+    try:
+        names = fieldsets.parse(fields, seatimelog_controller.COLUMNS)
+        logs, next_cursor, total = seatimelog_controller.get_seatimelogs(
+            db, current_user.id, rank, vessel_type, dept, sign_on_from, sign_on_to, sort, cursor, limit, count, names
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if names is not None:
+        response = fieldsets.json_response(logs)
+    pagination.set_page_headers(response, next_cursor, total)
+    return logs if names is None else response
+
+# Registered before /seatimelogs/{log_id} so "analytics" and "nri" aren't parsed as ids
+@router.get("/seatimelogs/analytics")
+def read_sea_time_analytics(
+    group_by: Optional[List[str]] = Query(None, alias="groupBy"),
+    start_month: Optional[str] = Query(None, alias="from", pattern=r"^\d{4}-\d{2}$"),
+    end_month: Optional[str] = Query(None, alias="to", pattern=r"^\d{4}-\d{2}$"),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    """Sea service by rank, vessel type, dept, engine power band and year, plus a month timeline."""
+    try:
+        return seatimelog_controller.get_sea_time_analytics(db, current_user.id, group_by, start_month, end_month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/seatimelogs/nri")
+def read_nri_history(current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    """NRI residency status for every fiscal year of the user's sea career."""
+    return seatimelog_controller.get_nri_history(db, current_user.id)
 
 @router.get("/seatimelogs/{log_id}", response_model=SeaTimeLog)
-def read_seatimelog(log_id: int, current_user: Profile = Depends(get_current_user)):
-    log = seatimelog_controller.get_seatimelog_by_id(log_id, current_user.id)
+def read_seatimelog(
+    log_id: int,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    current_user: Profile = Depends(get_current_user),
+    db: UnitOfWork = Depends(get_db)
+):
+    try:
+        names = fieldsets.parse(fields, seatimelog_controller.COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log = seatimelog_controller.get_seatimelog_by_id(db, log_id, current_user.id, names)
     if log is None:
         raise HTTPException(status_code=404, detail="Sea Time Log not found")
-    return log
+    return log if names is None else fieldsets.json_response(log)
 
 
 @router.put("/seatimelogs/{log_id}", response_model=SeaTimeLog)
-def update_seatimelog(log_id: int, log: SeaTimeLogCreate, current_user: Profile = Depends(get_current_user)):
-    updated_log = seatimelog_controller.update_seatimelog(log_id, log, current_user.id)
+def update_seatimelog(log_id: int, log: SeaTimeLogCreate, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    updated_log = seatimelog_controller.update_seatimelog(db, log_id, log, current_user.id)
     if updated_log is None:
         raise HTTPException(status_code=404, detail="Sea Time Log not found")
     return updated_log
 
 @router.delete("/seatimelogs/{log_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_seatimelog(log_id: int, current_user: Profile = Depends(get_current_user)):
-    success = seatimelog_controller.delete_seatimelog(log_id, current_user.id)
+def delete_seatimelog(log_id: int, current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    success = seatimelog_controller.delete_seatimelog(db, log_id, current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Sea Time Log not found")
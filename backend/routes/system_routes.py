@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+from backend.database import UnitOfWork, get_pool_stats, get_writer_stats
+from backend.cache import get_cache_stats
+from backend.status_sweep import get_sweep_stats
+from backend.thumbnails import get_thumbnail_stats
+from backend.recompress import get_recompress_stats, storage_report
+from backend.duplicates import get_duplicate_stats, stored_duplicates
+from backend.bulk_import import get_import_stats
+from backend.dependencies import get_current_user, get_db
+from backend.models.profile import Profile
+
+router = APIRouter(prefix="/system")
+
+@router.get("/stats")
+def system_stats(current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    """Runtime statistics for the backend's internal subsystems."""
+    return {
+        "connectionPool": get_pool_stats(),
+        "writer": get_writer_stats(),
+        "statusSweep": get_sweep_stats(),
+        "cache": get_cache_stats(),
+        "thumbnails": get_thumbnail_stats(),
+        "recompress": get_recompress_stats(),
+        "duplicates": {**get_duplicate_stats(), "stored": stored_duplicates(db.conn, current_user.id)},
+        "imports": get_import_stats()
+    }
+
+@router.get("/storage")
+def storage_stats(current_user: Profile = Depends(get_current_user), db: UnitOfWork = Depends(get_db)):
+    """Space used by stored payloads and how much compression saves."""
+    return storage_report(db.conn)
@@ -0,0 +1,214 @@
+"""
+Incrementally maintained sea-time aggregates.
+
+sea_time_rollups holds, per user, the sea days contributed by all of their
+sea_time_logs rows, broken down by dimension:
+
+    total  ''       lifetime sea days
+    fy     '2025'   days inside fiscal year 2025 (31 Mar 2025 - 31 Mar 2026)
+    rank   <rank>   days served in each rank
+    type   <type>   days served on each vessel type
+    dept   <dept>   days per department (ENGINE / DECK)
+    power  <band>   days per main engine power band (POWER_BANDS)
+    month  '2025-04' days inside each calendar month (timelines, per-year totals)
+
+The seatimelog controller applies each log's contribution inside the same
+writer job as the INSERT/UPDATE/DELETE, so the rollups commit (or roll back)
+together with the log and aggregate reads are a primary-key lookup however
+long the career history is. Day counting matches the dashboard: whole days,
+negative spans count as zero, fiscal-year and month overlap use naive local
+times.
+Rollups are per-log sums (service days); NRI residency, where overlapping
+voyages must not be counted twice, uses backend.utils.intervals instead.
+
+Rebuild from scratch (e.g. after restoring a backup):
+
+    python -m backend.sea_time_rollups              # data/certmanager.db
+    python -m backend.sea_time_rollups path/to.db
+"""
+import json
+import sqlite3
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+TOTAL = "total"
+FISCAL_YEAR = "fy"
+RANK = "rank"
+VESSEL_TYPE = "type"
+DEPT = "dept"
+POWER = "power"
+MONTH = "month"
+
+DIMENSIONS = (TOTAL, FISCAL_YEAR, RANK, VESSEL_TYPE, DEPT, POWER, MONTH)
+
+# (upper bound in kW, label); STCW engine-room certificate thresholds
+POWER_BANDS = (
+    (750, "<750 kW"),
+    (3000, "750-3000 kW"),
+    (None, "3000+ kW"),
+)
+UNKNOWN_POWER = "Unknown"
+KW_PER_BHP = 0.7457
+
+# Columns of sea_time_logs that contribute to the rollups
+LOG_COLUMNS = ('signOn', 'signOff', 'rank', 'type', 'dept', 'kw', 'bhp')
+
+_UPSERT = '''
+    INSERT INTO sea_time_rollups (user_id, dimension, key, days, logs) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, dimension, key) DO UPDATE SET
+        days = days + excluded.days,
+        logs = logs + excluded.logs
+'''
+
+def fiscal_year_bounds(year: int) -> Tuple[datetime, datetime]:
+    """Fiscal year `year` runs from 31 Mar `year` to 31 Mar `year + 1`."""
+    return datetime(year, 3, 31), datetime(year + 1, 3, 31)
+
+def current_fiscal_year(today: datetime) -> int:
+    # Up to and including 31 Mar, today belongs to the year that ends on it
+    if today.month < 3 or (today.month == 3 and today.day <= 31):
+        return today.year - 1
+    return today.year
+
+def _utc(value: str) -> Optional[datetime]:
+    # Same reading as SQLite's julianday(): zone offsets are applied, naive is UTC
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _naive(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value[:19])
+    except (TypeError, ValueError):
+        return None
+
+def _whole_days(start: datetime, end: datetime) -> int:
+    # Truncates toward zero like CAST(julianday(...) AS INTEGER)
+    return int((end - start).total_seconds() / 86400)
+
+def power_band(kw: Optional[float], bhp: Optional[float] = None) -> str:
+    if not kw and bhp:
+        kw = bhp * KW_PER_BHP
+    if not kw:
+        return UNKNOWN_POWER
+    for limit, label in POWER_BANDS:
+        if limit is None or kw < limit:
+            return label
+
+def _next_month(moment: datetime) -> datetime:
+    if moment.month == 12:
+        return datetime(moment.year + 1, 1, 1)
+    return datetime(moment.year, moment.month + 1, 1)
+
+def log_contributions(log) -> List[Tuple[str, str, int]]:
+    """(dimension, key, days) rows one sea_time_logs row adds to its user's rollups."""
+    sign_on, sign_off = _utc(log['signOn']), _utc(log['signOff'])
+    if sign_on is None or sign_off is None:
+        return []
+    days = max(0, _whole_days(sign_on, sign_off))
+    rows = [
+        (TOTAL, '', days),
+        (RANK, log['rank'] or '', days),
+        (VESSEL_TYPE, log['type'] or '', days),
+        (DEPT, log['dept'] or 'ENGINE', days),
+        (POWER, power_band(log['kw'], log['bhp']), days),
+    ]
+
+    on, off = _naive(log['signOn']), _naive(log['signOff'])
+    if on is not None and off is not None and on < off:
+        for year in range(current_fiscal_year(on), current_fiscal_year(off) + 1):
+            start, end = fiscal_year_bounds(year)
+            overlap = _whole_days(max(on, start), min(off, end))
+            if overlap > 0:
+                rows.append((FISCAL_YEAR, str(year), overlap))
+
+        month_start = datetime(on.year, on.month, 1)
+        while month_start < off:
+            month_end = _next_month(month_start)
+            overlap = _whole_days(max(on, month_start), min(off, month_end))
+            if overlap > 0:
+                rows.append((MONTH, month_start.strftime('%Y-%m'), overlap))
+            month_start = month_end
+    return rows
+
+def apply_log(conn: sqlite3.Connection, user_id: int, log, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) one log's contribution. Call inside the log's write."""
+    rows = log_contributions(log)
+    if not rows:
+        return
+    conn.executemany(_UPSERT, [(user_id, dimension, key, sign * days, sign) for dimension, key, days in rows])
+    if sign < 0:
+        conn.execute('DELETE FROM sea_time_rollups WHERE user_id = ? AND logs <= 0', (user_id,))
+
+def rebuild(conn: sqlite3.Connection, user_id: Optional[int] = None) -> int:
+    """Recompute rollups from sea_time_logs for one user or everyone. Returns rows written."""
+    totals: Dict[tuple, list] = defaultdict(lambda: [0, 0])
+    columns = ('user_id',) + LOG_COLUMNS
+    select = f"SELECT {', '.join(columns)} FROM sea_time_logs"
+    if user_id is None:
+        conn.execute('DELETE FROM sea_time_rollups')
+        logs = conn.execute(f'{select} WHERE user_id IS NOT NULL')
+    else:
+        conn.execute('DELETE FROM sea_time_rollups WHERE user_id = ?', (user_id,))
+        logs = conn.execute(f'{select} WHERE user_id = ?', (user_id,))
+
+    for log in logs:
+        log = dict(zip(columns, log))
+        for dimension, key, days in log_contributions(log):
+            entry = totals[(log['user_id'], dimension, key)]
+            entry[0] += days
+            entry[1] += 1
+
+    conn.executemany(
+        'INSERT INTO sea_time_rollups (user_id, dimension, key, days, logs) VALUES (?, ?, ?, ?, ?)',
+        [(*k, days, count) for k, (days, count) in totals.items()]
+    )
+    return len(totals)
+
+def get_rollups(conn: sqlite3.Connection, user_id: int, dimensions=DIMENSIONS) -> Dict[str, Dict[str, int]]:
+    """A user's rollups as {dimension: {key: days}}."""
+    result = {dimension: {} for dimension in dimensions}
+    rows = conn.execute(
+        'SELECT dimension, key, days FROM sea_time_rollups WHERE user_id = ? AND dimension IN (SELECT value FROM json_each(?))',
+        (user_id, json.dumps(list(dimensions)))
+    )
+    for dimension, key, days in rows:
+        result[dimension][key] = days
+    return result
+
+def get_breakdowns(conn: sqlite3.Connection, user_id: int, dimensions=DIMENSIONS) -> Dict[str, List[dict]]:
+    """A user's rollups with log counts as {dimension: [{key, days, logs}]}, most days first."""
+    result = {dimension: [] for dimension in dimensions}
+    rows = conn.execute(
+        '''SELECT dimension, key, days, logs FROM sea_time_rollups
+           WHERE user_id = ? AND dimension IN (SELECT value FROM json_each(?))
+           ORDER BY dimension, days DESC''',
+        (user_id, json.dumps(list(dimensions)))
+    )
+    for dimension, key, days, logs in rows:
+        result[dimension].append({'key': key, 'days': days, 'logs': logs})
+    return result
+
+def main(argv: List[str]) -> int:
+    if len(argv) > 1:
+        database = argv[1]
+    else:
+        from backend.database import DATABASE_NAME
+        database = DATABASE_NAME
+    conn = sqlite3.connect(database)
+    try:
+        with conn:
+            written = rebuild(conn)
+    finally:
+        conn.close()
+    print(f"Rebuilt sea_time_rollups in {database}: {written} rows")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
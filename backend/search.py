@@ -0,0 +1,150 @@
+"""
+Full-text search over certificates, documents and sea time logs.
+
+Each table has an FTS5 index kept in sync by triggers, so every write path
+(API, batch, bulk import, migrations) updates it in the same transaction:
+
+    certificates_fts   certName, issuedBy, certType
+    documents_fts      docName, docType, category, docID
+    sea_time_logs_fts  vesselName, company, flag
+
+The indexes are external-content tables over <table>_fts_source views, so
+the text is stored once, in the base table, and read back only to build
+snippets. Every row also indexes an owner token ('u' || user_id), and each
+query is ANDed with the caller's token, so FTS5 intersects the term's
+posting list with the caller's and only the caller's rows are ranked and
+joined back to the base table.
+
+Rebuild the indexes from the base tables (e.g. after restoring a backup):
+
+    python -m backend.search              # data/certmanager.db
+    python -m backend.search path/to.db
+"""
+import re
+import sqlite3
+import sys
+from typing import Dict, List, Optional
+
+# table -> (result type, as in the API paths; title column; indexed columns)
+INDEXED = {
+    "certificates": ("certificates", "certName", ("certName", "issuedBy", "certType")),
+    "documents": ("documents", "docName", ("docName", "docType", "category", "docID")),
+    "sea_time_logs": ("seatimelogs", "vesselName", ("vesselName", "company", "flag")),
+}
+TYPES = {kind: table for table, (kind, _, _) in INDEXED.items()}
+
+MAX_RESULTS = 100
+MAX_TERMS = 8
+SNIPPET_TOKENS = 12
+HIGHLIGHT = ("<mark>", "</mark>")
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+def _owner(user_id) -> str:
+    return f"'u' || {user_id}"
+
+def create(cursor: sqlite3.Cursor):
+    """Create the views, FTS tables and triggers, and index every existing row."""
+    for table, (_, _, columns) in INDEXED.items():
+        fts = f"{table}_fts"
+        cols = ", ".join(columns)
+        new = ", ".join(f"new.{c}" for c in columns)
+        old = ", ".join(f"old.{c}" for c in columns)
+        cursor.execute(f"CREATE VIEW IF NOT EXISTS {fts}_source AS SELECT id, {cols}, 'u' || user_id AS owner FROM {table}")
+        # owner is the last column so snippet() picks a text column on ties
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {cols}, owner,
+                content='{fts}_source', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {cols}, owner) VALUES (new.id, {new}, {_owner("new.user_id")});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}, owner) VALUES ('delete', old.id, {old}, {_owner("old.user_id")});
+            END
+        ''')
+        # Status sweeps and archive toggles don't touch indexed text, so they don't reindex
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {cols}, user_id ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}, owner) VALUES ('delete', old.id, {old}, {_owner("old.user_id")});
+                INSERT INTO {fts}(rowid, {cols}, owner) VALUES (new.id, {new}, {_owner("new.user_id")});
+            END
+        ''')
+    rebuild(cursor.connection)
+
+def rebuild(conn: sqlite3.Connection):
+    for table in INDEXED:
+        conn.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+def match_expression(text: str) -> Optional[str]:
+    """
+    FTS5 query for free text: every word must match, the last one as a
+    prefix so results follow the user's typing. None when the text has no
+    words. Quoting each term keeps FTS5 operators in user input from being
+    interpreted.
+    """
+    terms = _TERM.findall(text)[:MAX_TERMS]
+    if not terms:
+        return None
+    # Only the last term is a prefix: expanding a short prefix reads the
+    # doclists of every matching token, which costs far more than an exact term
+    return " AND ".join(f'"{term}"' for term in terms) + "*"
+
+def search(conn: sqlite3.Connection, user_id: int, text: str, types: Optional[List[str]] = None, limit: int = 20) -> List[Dict]:
+    """
+    The user's best matches across the requested types (all by default),
+    ranked by bm25 (lower is better) and capped at `limit`, each with a
+    highlighted snippet. Raises ValueError for unknown types.
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    unknown = set(types or ()) - TYPES.keys()
+    if unknown:
+        raise ValueError(f"Unknown types: {', '.join(sorted(unknown))}; use any of: {', '.join(TYPES)}")
+
+    results = []
+    for kind in types or TYPES:
+        table = TYPES[kind]
+        _, title, columns = INDEXED[table]
+        fts = f"{table}_fts"
+        query = f"owner : u{int(user_id)} AND {{{' '.join(columns)}}} : ({expression})"
+        # owner gets weight 0 so matching the caller's own token doesn't affect ranking
+        weights = ", ".join(["1.0"] * len(columns) + ["0.0"])
+        rows = conn.execute(f'''
+            SELECT {fts}.rowid AS id, t.{title} AS title,
+                snippet({fts}, -1, ?, ?, '…', ?) AS snippet, bm25({fts}, {weights}) AS score
+            FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+            WHERE {fts} MATCH ?
+            ORDER BY score
+            LIMIT ?
+        ''', (*HIGHLIGHT, SNIPPET_TOKENS, query, limit)).fetchall()
+        results += [{"type": kind, "id": row["id"], "title": row["title"], "snippet": row["snippet"],
+                     "score": row["score"]} for row in rows]
+    results.sort(key=lambda result: result["score"])
+    return results[:limit]
+
+def main(argv: List[str]) -> int:
+    if len(argv) > 1:
+        database = argv[1]
+    else:
+        from backend.database import DATABASE_NAME
+        database = DATABASE_NAME
+    conn = sqlite3.connect(database)
+    try:
+        from backend.migrations import migrate
+        if not migrate(conn):
+            with conn:
+                rebuild(conn)
+    finally:
+        conn.close()
+    print(f"Rebuilt search indexes in {database}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,85 @@
+"""
+Materialized expiry status for certificates and documents.
+
+status is computed once when a row is written and then kept current by a
+sweep that runs at startup and again at every local date rollover. The sweep
+classifies every row in one vectorized pass (backend.utils.expiry) and issues
+one UPDATE per status per table for the rows that changed, across all users,
+so list endpoints never have to reclassify or write anything.
+"""
+import asyncio
+import json
+import time
+from datetime import date, datetime, timedelta
+from sqlite3 import Connection
+from typing import Optional
+
+import numpy as np
+
+from backend.cache import dashboard_cache
+from backend.database import run_write
+from backend.utils import expiry
+
+SWEPT_TABLES = ("certificates", "documents")
+
+# Upper bound on a single sleep, so a suspended machine or a clock change
+# delays the rollover sweep by minutes rather than a day
+SWEEP_POLL_SECONDS = 300
+
+_last_sweep = {"lastRun": None, "forDate": None, "updated": 0, "durationMs": 0}
+
+def sweep_statuses(conn: Connection, today: Optional[date] = None) -> int:
+    """Writer job: bring every stored status in line with today's date."""
+    updated = 0
+    for table in SWEPT_TABLES:
+        rows = conn.execute(f"SELECT id, expiry, status FROM {table}").fetchall()
+        if not rows:
+            continue
+        ids = np.fromiter((row["id"] for row in rows), dtype=np.int64, count=len(rows))
+        current = np.array([row["status"] for row in rows], dtype=object)
+        statuses = expiry.classify((row["expiry"] for row in rows), today).statuses
+        changed = statuses != current
+        for status in (expiry.VALID, expiry.EXPIRING, expiry.EXPIRED):
+            target = ids[changed & (statuses == status)]
+            if len(target):
+                cursor = conn.execute(
+                    f"UPDATE {table} SET status = ? WHERE id IN (SELECT value FROM json_each(?))",
+                    (status, json.dumps(target.tolist()))
+                )
+                updated += cursor.rowcount
+    return updated
+
+async def run_sweep(today: Optional[date] = None) -> int:
+    today = today or date.today()
+    started = time.perf_counter()
+    updated = await run_write(sweep_statuses, today)
+    _last_sweep.update({
+        "lastRun": datetime.now().isoformat(timespec="seconds"),
+        "forDate": today.isoformat(),
+        "updated": updated,
+        "durationMs": round((time.perf_counter() - started) * 1000, 3),
+    })
+    if updated:
+        dashboard_cache.clear()
+        print(f"Status sweep for {today}: {updated} rows updated")
+    return updated
+
+def _seconds_until_midnight() -> float:
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+async def run_daily(last_run: Optional[date] = None):
+    """Background task: sweep whenever the local date changes."""
+    while True:
+        today = date.today()
+        if today != last_run:
+            try:
+                await run_sweep(today)
+                last_run = today
+            except Exception as e:
+                print(f"Status sweep failed: {e}")
+        await asyncio.sleep(min(_seconds_until_midnight() + 1, SWEEP_POLL_SECONDS))
+
+def get_sweep_stats() -> dict:
+    return dict(_last_sweep)
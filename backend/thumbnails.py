@@ -0,0 +1,252 @@
+"""
+Document preview thumbnails.
+
+A thumbnail is a small JPEG of the first PDF page or a downscaled image,
+rendered by a background worker pool when a document is uploaded (or on
+first request) and kept in an on-disk cache under <data dir>/thumbnails,
+keyed by the payload's content hash. The cache is bounded by
+THUMBNAIL_CACHE_BYTES; the least recently served thumbnails are evicted
+first.
+
+Rendering uses Pillow for images and JPEG encoding and PyMuPDF for PDFs.
+Both are in requirements.txt and bundled by the PyInstaller build; the
+imports stay guarded so a checkout without them still runs, with the
+corresponding previews unavailable (/documents/{id}/thumbnail answers 404
+and the thumbnail stats report which renderers are present).
+"""
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from backend import blob_store
+from backend.database import DATA_DIR
+from backend.utils import mime
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow not installed: no image previews
+    Image = None
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF < 1.24
+    except ImportError:  # PyMuPDF not installed: no PDF previews
+        pymupdf = None
+
+THUMBNAIL_DIR = os.path.join(DATA_DIR, "thumbnails")
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024
+THUMBNAIL_WORKERS = 2
+
+# Image payloads bigger than this are not decoded for a preview
+MAX_SOURCE_BYTES = 64 * 1024 * 1024
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+_unsupported = set()  # refs that produced no preview; not retried until restart
+_cache_bytes = None  # lazily initialised from the directory
+_stats = {"hits": 0, "misses": 0, "generated": 0, "failed": 0, "evicted": 0}
+
+def renderers() -> dict:
+    return {"image": Image is not None, "pdf": pymupdf is not None and Image is not None}
+
+def _path(ref: str) -> str:
+    return os.path.join(THUMBNAIL_DIR, ref[:2], ref + ".jpg")
+
+def _to_jpeg(image) -> bytes:
+    image.thumbnail(THUMBNAIL_SIZE)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    return out.getvalue()
+
+def _render_pdf(data: bytes) -> bytes:
+    with pymupdf.open(stream=data, filetype="pdf") as pdf:
+        page = pdf[0]
+        scale = min(THUMBNAIL_SIZE[0] / page.rect.width, THUMBNAIL_SIZE[1] / page.rect.height)
+        pix = page.get_pixmap(matrix=pymupdf.Matrix(scale, scale), alpha=False)
+        image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    return _to_jpeg(image)
+
+def _render_image(data: bytes) -> bytes:
+    with Image.open(io.BytesIO(data)) as image:
+        # Lets the JPEG decoder downscale while decoding
+        image.draft("RGB", THUMBNAIL_SIZE)
+        return _to_jpeg(image)
+
+def render(payload: blob_store.Payload) -> Optional[bytes]:
+    """JPEG thumbnail bytes for a payload, or None when it can't be previewed."""
+    if Image is None or payload.size == 0 or payload.size > MAX_SOURCE_BYTES:
+        return None
+    content_type = mime.sniff(payload.read(0, mime.SNIFF_BYTES), payload.media_type)
+    if content_type == "application/pdf":
+        if pymupdf is None:
+            return None
+        return _render_pdf(payload.read())
+    if content_type.startswith("image/"):
+        return _render_image(payload.read())
+    return None
+
+def _store(ref: str, data: bytes):
+    global _cache_bytes
+    path = _path(ref)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=THUMBNAIL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    with _lock:
+        if _cache_bytes is not None:
+            _cache_bytes += len(data)
+    _enforce_limit()
+
+def _scan() -> list:
+    entries = []
+    for root, _, files in os.walk(THUMBNAIL_DIR):
+        for name in files:
+            if name.endswith(".jpg"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+def _enforce_limit():
+    """Evict least recently served thumbnails until the cache is within bounds."""
+    global _cache_bytes
+    with _lock:
+        if _cache_bytes is not None and _cache_bytes <= THUMBNAIL_CACHE_BYTES:
+            return
+    entries = _scan()
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    if total > THUMBNAIL_CACHE_BYTES:
+        # Trim to 90% so the scan doesn't repeat on every new thumbnail
+        target = THUMBNAIL_CACHE_BYTES * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+    with _lock:
+        _cache_bytes = total
+        _stats["evicted"] += evicted
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def generate(ref: str, encoding: Optional[str], codec: Optional[str] = None) -> Optional[bytes]:
+    """Render and cache the thumbnail for a blob; returns the JPEG bytes or None."""
+    cached = _read(_path(ref))
+    if cached is not None:
+        return cached
+    if ref in _unsupported:
+        return None
+    try:
+        with blob_store.Payload(ref, encoding, codec) as payload:
+            data = render(payload)
+    except Exception as e:
+        print(f"Error rendering thumbnail for {ref}: {e}")
+        data = None
+        with _lock:
+            _stats["failed"] += 1
+    if data is None:
+        with _lock:
+            _unsupported.add(ref)
+        return None
+    _store(ref, data)
+    with _lock:
+        _stats["generated"] += 1
+    return data
+
+def is_cached(ref: str) -> bool:
+    return os.path.exists(_path(ref))
+
+def put(ref: str, data: bytes):
+    """Cache a thumbnail rendered elsewhere (an import worker process)."""
+    if os.path.exists(_path(ref)):
+        return
+    _store(ref, data)
+    with _lock:
+        _stats["generated"] += 1
+
+def _generate_pending(ref: str, encoding: Optional[str], codec: Optional[str]):
+    try:
+        generate(ref, encoding, codec)
+    finally:
+        with _lock:
+            _pending.discard(ref)
+
+def schedule(ref: Optional[str], encoding: Optional[str], codec: Optional[str] = None):
+    """Queue background thumbnail generation for a newly stored payload."""
+    global _executor
+    if not ref or Image is None:
+        return
+    with _lock:
+        if ref in _pending:
+            return
+        _pending.add(ref)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+        executor = _executor
+    executor.submit(_generate_pending, ref, encoding, codec)
+
+def get_thumbnail(ref: str, encoding: Optional[str], codec: Optional[str] = None) -> Optional[bytes]:
+    """
+    JPEG bytes of the cached thumbnail, rendering it now on a cache miss.
+    Returned as bytes (a few KB) rather than a path so eviction can't pull
+    the file out from under a response.
+    """
+    path = _path(ref)
+    try:
+        # mtime doubles as the last-served time for LRU eviction
+        os.utime(path)
+        cached = _read(path)
+    except FileNotFoundError:
+        cached = None
+    if cached is not None:
+        with _lock:
+            _stats["hits"] += 1
+        return cached
+    with _lock:
+        _stats["misses"] += 1
+    return generate(ref, encoding, codec)
+
+def shutdown():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_thumbnail_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["pending"] = len(_pending)
+        stats["cacheBytes"] = _cache_bytes
+    stats["maxCacheBytes"] = THUMBNAIL_CACHE_BYTES
+    stats["renderers"] = renderers()
+    return stats
@@ -0,0 +1,63 @@
+"""
+Bulk mutations for the /documents/batch and /certificates/batch endpoints.
+
+A batch runs as one writer job, so it is a single transaction and a single
+commit. Operations are validated up front, the ids that belong to the user
+are looked up with one query, and each kind of operation is applied with
+executemany. Updates are grouped by the set of fields they change so each
+group shares one statement. Within a batch, updates run first, then archive
+toggles, then deletes.
+"""
+import json
+from collections import defaultdict
+from sqlite3 import Connection
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from backend.models.batch import BatchOperation, BatchResponse, BatchResult, MAX_BATCH_OPERATIONS
+
+UPDATE = "update"
+ARCHIVE = "archive"
+DELETE = "delete"
+
+def owned_ids(conn: Connection, table: str, user_id: int, ids: List[int]) -> Set[int]:
+    rows = conn.execute(
+        f'SELECT id FROM {table} WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))',
+        (user_id, json.dumps(ids))
+    )
+    return {row[0] for row in rows}
+
+def apply_updates(conn: Connection, table: str, user_id: int, updates: List[Tuple[int, dict]]):
+    """executemany per distinct set of changed columns."""
+    groups = defaultdict(list)
+    for row_id, changes in updates:
+        columns = tuple(sorted(changes))
+        groups[columns].append([changes[c] for c in columns] + [row_id, user_id])
+    for columns, params in groups.items():
+        set_clause = ", ".join(f"{column} = ?" for column in columns)
+        conn.executemany(f'UPDATE {table} SET {set_clause} WHERE id = ? AND user_id = ?', params)
+
+def validate(operations: List[BatchOperation], check: Callable[[BatchOperation], Optional[str]]) -> Tuple[List[BatchOperation], Dict[int, str]]:
+    """Split operations into valid ones and {index: error}; check(op) returns an error message or None."""
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"A batch can hold at most {MAX_BATCH_OPERATIONS} operations")
+    valid, errors = [], {}
+    for index, op in enumerate(operations):
+        error = check(op)
+        if error:
+            errors[index] = error
+        else:
+            valid.append(op)
+    return valid, errors
+
+def summarize(operations: List[BatchOperation], errors: Dict[int, str], found: Set[int]) -> BatchResponse:
+    """Per-item results: 400 for invalid operations, 404 for ids the user doesn't own."""
+    results = []
+    for index, op in enumerate(operations):
+        if index in errors:
+            results.append(BatchResult(id=op.id, op=op.op, status=400, error=errors[index]))
+        elif op.id not in found:
+            results.append(BatchResult(id=op.id, op=op.op, status=404, error="Not found"))
+        else:
+            results.append(BatchResult(id=op.id, op=op.op, status=200))
+    succeeded = sum(1 for r in results if r.status == 200)
+    return BatchResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
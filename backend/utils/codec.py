@@ -0,0 +1,104 @@
+"""
+Per-blob compression codecs.
+
+compress() keeps a payload as-is unless a codec actually makes it smaller:
+a zlib pass over a leading sample rejects already-compressed content (JPEG
+scans, PDFs with compressed streams) cheaply, small payloads then try both
+zlib and lzma and keep the smaller, and large ones use zlib only so a write
+never spends seconds in lzma.
+"""
+import lzma
+import zlib
+from typing import BinaryIO, Tuple
+
+CODEC_NONE = "none"
+CODEC_ZLIB = "zlib"
+CODEC_LZMA = "lzma"
+CODECS = (CODEC_NONE, CODEC_ZLIB, CODEC_LZMA)
+
+# A codec has to save at least this fraction of the payload to be used
+MIN_SAVING = 0.05
+SAMPLE_BYTES = 64 * 1024
+# Payloads up to this size also try lzma
+LZMA_MAX_BYTES = 2 * 1024 * 1024
+ZLIB_LEVEL = 6
+LZMA_PRESET = 6
+
+CHUNK_SIZE = 1024 * 1024
+
+def worth_it(original: int, compressed: int) -> bool:
+    return compressed <= original * (1 - MIN_SAVING)
+
+def compressible(sample: bytes) -> bool:
+    """Cheap check on a payload's first SAMPLE_BYTES."""
+    if len(sample) < 64:
+        return False
+    sample = sample[:SAMPLE_BYTES]
+    return worth_it(len(sample), len(zlib.compress(sample, 1)))
+
+def compressor(codec: str):
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(ZLIB_LEVEL)
+    if codec == CODEC_LZMA:
+        return lzma.LZMACompressor(preset=LZMA_PRESET)
+    raise ValueError(f"Unknown codec: {codec}")
+
+def decompressor(codec: str):
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj()
+    if codec == CODEC_LZMA:
+        return lzma.LZMADecompressor()
+    raise ValueError(f"Unknown codec: {codec}")
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """(codec, stored bytes) for a payload; CODEC_NONE and the data itself when nothing helps."""
+    if not compressible(data):
+        return CODEC_NONE, data
+    best_codec, best = CODEC_NONE, data
+    codecs = (CODEC_ZLIB, CODEC_LZMA) if len(data) <= LZMA_MAX_BYTES else (CODEC_ZLIB,)
+    for codec in codecs:
+        c = compressor(codec)
+        packed = c.compress(data) + c.flush()
+        if len(packed) < len(best):
+            best_codec, best = codec, packed
+    if best_codec != CODEC_NONE and worth_it(len(data), len(best)):
+        return best_codec, best
+    return CODEC_NONE, data
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec in (None, CODEC_NONE):
+        return data
+    d = decompressor(codec)
+    return d.decompress(data) + (d.flush() if codec == CODEC_ZLIB else b"")
+
+def copy_compressed(codec: str, source: BinaryIO, target: BinaryIO) -> int:
+    """Stream source into target through a codec; returns bytes written."""
+    c = compressor(codec)
+    written = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        packed = c.compress(chunk)
+        target.write(packed)
+        written += len(packed)
+    tail = c.flush()
+    target.write(tail)
+    return written + len(tail)
+
+def copy_decompressed(codec: str, source: BinaryIO, target: BinaryIO) -> int:
+    """Stream a compressed source into target; returns bytes written."""
+    d = decompressor(codec)
+    written = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        data = d.decompress(chunk)
+        target.write(data)
+        written += len(data)
+    if codec == CODEC_ZLIB:
+        tail = d.flush()
+        target.write(tail)
+        written += len(tail)
+    return written
@@ -0,0 +1,82 @@
+"""
+Streaming responses for stored payloads with ETag and single-range support.
+
+Only one "bytes=" range per request is honoured; anything else (several
+ranges, a stale If-Range) falls back to the full 200 response, which RFC 9110
+allows.
+"""
+import re
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from backend import blob_store
+from backend.utils import mime
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single satisfiable range, None to serve the
+    whole payload. Raises ValueError when the range can't be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+def _stream(payload: blob_store.Payload, start: int, end: int):
+    try:
+        yield from payload.iter_range(start, end)
+    finally:
+        payload.close()
+
+def payload_response(request: Request, payload: blob_store.Payload, filename: Optional[str] = None) -> Response:
+    """Stream a payload (takes ownership and closes it), honouring If-None-Match and Range."""
+    etag = f'"{payload.ref}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=0, must-revalidate"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        payload.close()
+        return Response(status_code=304, headers=headers)
+
+    content_type = mime.sniff(payload.read(0, mime.SNIFF_BYTES), payload.media_type)
+    if filename:
+        headers["Content-Disposition"] = f"inline; filename*=UTF-8''{quote(filename)}"
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), payload.size)
+        except ValueError:
+            payload.close()
+            headers["Content-Range"] = f"bytes */{payload.size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        start, end, status_code = 0, payload.size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{payload.size}"
+    headers["Content-Length"] = str(max(0, end - start + 1))
+
+    return StreamingResponse(_stream(payload, start, end), status_code=status_code,
+                             media_type=content_type, headers=headers)
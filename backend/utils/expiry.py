@@ -0,0 +1,73 @@
+"""
+Expiry classification shared by certificates, documents and the dashboard.
+
+A batch of expiry values is converted to datetime64[D] once and classified
+with array arithmetic, so a whole fleet's documents are handled in one pass
+instead of a datetime parse per row. Only the YYYY-MM-DD prefix of a value
+counts; time and zone suffixes are ignored. Missing or unparseable expiries
+have no days remaining and are treated as VALID (unlimited validity).
+"""
+from collections import namedtuple
+from datetime import date
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+VALID = "VALID"
+EXPIRING = "EXPIRING"
+EXPIRED = "EXPIRED"
+
+# Days before expiry at which an item counts as EXPIRING, and at which it is
+# urgent enough to raise a dashboard alert
+EXPIRING_DAYS = 90
+ALERT_DAYS = 30
+
+Classification = namedtuple("Classification", ["statuses", "days_remaining"])
+
+ExpiryValue = Union[str, date, None]
+
+def _day(value: ExpiryValue) -> str:
+    if not value:
+        return "NaT"
+    if isinstance(value, date):
+        return value.isoformat()[:10]
+    return value[:10]
+
+def _parse_one(value: str) -> np.datetime64:
+    try:
+        return np.datetime64(value, "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
+
+def to_days(values: Iterable[ExpiryValue]) -> np.ndarray:
+    """Expiry values as a datetime64[D] array, NaT where there is no usable date."""
+    days = [_day(v) for v in values]
+    try:
+        return np.array(days, dtype="datetime64[D]")
+    except ValueError:
+        # At least one malformed value: fall back to element-wise parsing
+        return np.array([_parse_one(d) for d in days], dtype="datetime64[D]")
+
+def classify(values: Iterable[ExpiryValue], today: Optional[date] = None,
+             expiring_days: int = EXPIRING_DAYS) -> Classification:
+    """
+    Classify a batch of expiry values.
+
+    Returns parallel arrays: statuses (VALID / EXPIRING / EXPIRED) and
+    days_remaining as a masked int array, masked where there is no expiry.
+    """
+    expiry = to_days(values)
+    today = np.datetime64(today or date.today(), "D")
+
+    missing = np.isnat(expiry)
+    delta = np.where(missing, 0, (expiry - today).astype(np.int64))
+
+    statuses = np.full(expiry.shape, VALID, dtype=object)
+    statuses[~missing & (delta <= expiring_days)] = EXPIRING
+    statuses[~missing & (delta < 0)] = EXPIRED
+
+    return Classification(statuses, np.ma.masked_array(delta, mask=missing))
+
+def status_of(value: ExpiryValue, today: Optional[date] = None) -> str:
+    """Status for a single expiry value (create / update paths)."""
+    return classify([value], today).statuses[0]
@@ -0,0 +1,52 @@
+"""
+Sparse fieldsets: ?fields=certName,expiry on list and detail endpoints.
+
+Each resource maps its API field names to SQL column expressions. The
+requested names become the SELECT column list, so other columns are never
+read, and payload fields (mapped to None) are only fetched from the blob
+store when asked for. Rows are validated into a model holding just the
+requested fields, built from the full model's annotations so values
+serialize exactly as they do in full responses.
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Type
+
+import pydantic_core
+from fastapi import Response
+from pydantic import BaseModel, create_model
+
+def parse(fields: Optional[str], columns: Dict[str, Optional[str]]) -> Optional[List[str]]:
+    """
+    Requested field names in `columns` order, always including 'id'; None
+    when no fieldset was given. Raises ValueError for unknown names.
+    """
+    if fields is None:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = names - columns.keys()
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}; available: {', '.join(columns)}")
+    names.add("id")
+    return [name for name in columns if name in names]
+
+def select_list(names: List[str], columns: Dict[str, Optional[str]]) -> str:
+    """SELECT column list for the requested names; payload fields (None) are left to the caller."""
+    return ", ".join(
+        name if columns[name] == name else f"{columns[name]} AS {name}"
+        for name in names if columns[name] is not None
+    )
+
+@lru_cache(maxsize=256)
+def partial_model(model: Type[BaseModel], names: tuple) -> Type[BaseModel]:
+    return create_model(
+        f"{model.__name__}Fields",
+        **{name: (Optional[model.model_fields[name].annotation], None) for name in names}
+    )
+
+def build(model: Type[BaseModel], names: List[str], row: dict) -> BaseModel:
+    """Validate a row into the partial `model` for `names`; other keys in the row are ignored."""
+    return partial_model(model, tuple(names))(**row)
+
+def json_response(data) -> Response:
+    """Serialize partial models (or a list of them) directly, bypassing the route's response_model."""
+    return Response(content=pydantic_core.to_json(data), media_type="application/json")
@@ -0,0 +1,100 @@
+"""
+Merged interval sets with prefix sums.
+
+Voyages are sorted and merged once with a sweep line, so overlapping or
+duplicated sign-on/sign-off entries count each moment at sea only once.
+Prefix sums over the merged intervals then answer "time covered within
+[a, b]" for any window with two binary searches, and a whole batch of
+windows (every fiscal year of a career) in one vectorized call.
+
+Timestamps are naive: only the YYYY-MM-DDTHH:MM:SS prefix of an ISO string
+is read, zone suffixes are ignored.
+"""
+from datetime import datetime
+from typing import Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+
+Timestamp = Union[str, datetime, None]
+
+def _seconds(value: Timestamp) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=None).isoformat()
+    try:
+        return int(np.datetime64(value[:19], "s").astype(np.int64))
+    except ValueError:
+        return None
+
+def merge(intervals: Iterable[Tuple[int, int]]) -> np.ndarray:
+    """Sort and merge (start, end) pairs; returns an (n, 2) array of disjoint intervals."""
+    pairs = np.array([(s, e) for s, e in intervals if e > s], dtype=np.int64).reshape(-1, 2)
+    if len(pairs) == 0:
+        return pairs
+    pairs = pairs[np.argsort(pairs[:, 0], kind="stable")]
+
+    merged = [pairs[0].tolist()]
+    for start, end in pairs[1:].tolist():
+        last = merged[-1]
+        if start <= last[1]:
+            # Overlapping or touching: extend the current run
+            if end > last[1]:
+                last[1] = end
+        else:
+            merged.append([start, end])
+    return np.array(merged, dtype=np.int64)
+
+class IntervalSet:
+    """Disjoint, sorted intervals (epoch seconds) with cumulative covered time."""
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]]):
+        merged = merge(intervals)
+        self.starts = merged[:, 0]
+        self.ends = merged[:, 1]
+        # prefix[i] = time covered by the first i intervals
+        self.prefix = np.concatenate(([0], np.cumsum(self.ends - self.starts)))
+
+    @classmethod
+    def from_timestamps(cls, pairs: Iterable[Tuple[Timestamp, Timestamp]]) -> "IntervalSet":
+        """Build from (start, end) ISO strings or datetimes; unparseable pairs are skipped."""
+        seconds = ((_seconds(start), _seconds(end)) for start, end in pairs)
+        return cls((s, e) for s, e in seconds if s is not None and e is not None)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def first(self) -> Optional[datetime]:
+        return np.datetime64(int(self.starts[0]), "s").item() if len(self) else None
+
+    @property
+    def last(self) -> Optional[datetime]:
+        return np.datetime64(int(self.ends[-1]), "s").item() if len(self) else None
+
+    def _covered_before(self, points: np.ndarray) -> np.ndarray:
+        # Time covered in (-inf, point] for each point
+        k = np.searchsorted(self.starts, points, side="right")
+        inside = k > 0
+        idx = np.maximum(k - 1, 0)
+        partial = np.minimum(points, self.ends[idx]) - self.starts[idx] if len(self) else np.zeros_like(points)
+        return np.where(inside, self.prefix[idx] + partial, 0)
+
+    def covered_seconds(self, starts, ends) -> np.ndarray:
+        """Seconds covered within each window [starts[i], ends[i]] (arrays of epoch seconds)."""
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.maximum(np.asarray(ends, dtype=np.int64), starts)
+        return self._covered_before(ends) - self._covered_before(starts)
+
+    def covered_days(self, start: datetime, end: datetime) -> int:
+        """Whole days covered within [start, end]."""
+        seconds = self.covered_seconds([_seconds(start)], [_seconds(end)])[0]
+        return int(seconds // SECONDS_PER_DAY)
+
+    def covered_days_many(self, windows: Iterable[Tuple[datetime, datetime]]) -> np.ndarray:
+        windows = list(windows)
+        starts = [_seconds(start) for start, _ in windows]
+        ends = [_seconds(end) for _, end in windows]
+        return self.covered_seconds(starts, ends) // SECONDS_PER_DAY
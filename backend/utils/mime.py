@@ -0,0 +1,27 @@
+"""Content-Type detection from a payload's leading bytes."""
+from typing import Optional
+
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+# (offset, magic bytes, content type)
+_SIGNATURES = (
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (8, b"WEBP", "image/webp"),
+    (4, b"ftypheic", "image/heic"),
+    (0, b"PK\x03\x04", "application/zip"),
+)
+
+SNIFF_BYTES = 16
+
+def sniff(head: bytes, fallback: Optional[str] = None) -> str:
+    """Content type for a payload starting with `head` (at least SNIFF_BYTES when available)."""
+    for offset, magic, content_type in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type
+    return fallback or DEFAULT_CONTENT_TYPE
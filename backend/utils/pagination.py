@@ -0,0 +1,129 @@
+"""
+Keyset pagination for the per-user list endpoints.
+
+A page is "the next `limit` rows after (sort value, id)" in the list's sort
+order, so every page is one index range read no matter how deep the client
+has paged, unlike OFFSET which walks and discards every earlier row. The
+cursor handed back to the client is the last row's (sort value, id), opaque
+to the client as urlsafe base64 JSON.
+
+Sort columns are wrapped in IFNULL(column, '') so rows with no value still
+have a total order; the matching expression indexes are in
+backend.migrations.INDEXES.
+"""
+import base64
+import binascii
+import json
+from datetime import date, timedelta
+from sqlite3 import Connection
+from typing import List, Optional, Tuple
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+# Listed in the CORS expose_headers so the frontend can read them
+PAGE_HEADERS = [NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER]
+
+class InvalidCursor(ValueError):
+    pass
+
+def sort_key(column: str) -> str:
+    return f"IFNULL({column}, '')"
+
+def parse_sort(sort: str, allowed: Tuple[str, ...]) -> Tuple[str, bool]:
+    """'-uploadDate' -> ('uploadDate', descending=True); raises ValueError for unknown columns."""
+    descending = sort.startswith("-")
+    column = sort.lstrip("-")
+    if column not in allowed:
+        raise ValueError(f"Can't sort by {column}; use one of: {', '.join(allowed)}")
+    return column, descending
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    raw = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[str, int]:
+    """(sort value, id) from a cursor issued for the same sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, row_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if cursor_sort != sort or not isinstance(value, str) or not isinstance(row_id, int):
+        raise InvalidCursor("Cursor doesn't match this sort")
+    return value, row_id
+
+def date_range(column: str, start: Optional[date], end: Optional[date]) -> Tuple[List[str], list]:
+    """Conditions and params for start <= column <= end (inclusive days, either bound optional)."""
+    conditions, params = [], []
+    if start is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        # Stored dates may carry a time suffix, so "up to and including `end`" is "< the next day"
+        conditions.append(f"{column} < ?")
+        params.append((end + timedelta(days=1)).isoformat())
+    return conditions, params
+
+def one_of(column: str, values: Optional[List[str]]) -> Tuple[List[str], list]:
+    if not values:
+        return [], []
+    return [f"{column} IN (SELECT value FROM json_each(?))"], [json.dumps(values)]
+
+def set_page_headers(response, next_cursor: Optional[str], total: Optional[int]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+
+def fetch_page(
+    conn: Connection,
+    table: str,
+    columns: str,
+    where: List[str],
+    params: list,
+    sort: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    count: bool = False,
+) -> Tuple[list, Optional[str], Optional[int]]:
+    """
+    Select `columns` from the rows of `table` matching `where` (ANDed) in
+    `sort` order (already checked with parse_sort) and return (rows, next
+    cursor, total). The cursor is None on the last page; total (rows matching
+    the filters, ignoring the cursor) is only computed when `count` is set.
+    Without a limit every remaining row is returned.
+    """
+    descending = sort.startswith("-")
+    key = sort_key(sort.lstrip("-"))
+    total = None
+    if count:
+        total = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {' AND '.join(where)}", params).fetchone()[0]
+
+    conditions, values = list(where), list(params)
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort)
+        op = "<" if descending else ">"
+        # Spelled out rather than as a row value (key, id) < (?, ?) so the
+        # first term is a range on the index and deep pages don't walk the
+        # rows before the cursor
+        conditions.append(f"{key} {op}= ? AND ({key} {op} ? OR id {op} ?)")
+        values += [value, value, row_id]
+    direction = "DESC" if descending else "ASC"
+    sql = f'''
+        SELECT {columns}, {key} AS sort_value FROM {table}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {key} {direction}, id {direction}
+    '''
+    if limit is not None:
+        # One extra row tells whether there is a next page
+        sql += " LIMIT ?"
+        values.append(limit + 1)
+    rows = conn.execute(sql, values).fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, last["sort_value"], last["id"])
+    return rows, next_cursor, total
@@ -14,6 +14,7 @@ if (Test-Path "backend/build") { Remove-Item "backend/build" -Recurse -Force }
 # --name: Output filename
 # --distpath: Output directory
 # --paths: Search paths for modules
+# --hidden-import: PyMuPDF is imported in a try/except, which PyInstaller may skip (PDF thumbnails)
 # --clean: Clean cache
 # --noconfirm: Overwrite existing
 pyinstaller backend/run_server.py `
@@ -22,6 +23,7 @@ pyinstaller backend/run_server.py `
     --distpath backend/dist `
     --workpath backend/build `
     --paths . `
+    --hidden-import pymupdf `
     --clean `
     --noconfirm
 
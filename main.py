@@ -1,13 +1,29 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from backend.database import get_db_connection, init_db
-from backend.routes import certificate_routes, profile_routes, seatimelog_routes, document_routes, auth_routes, dashboard_routes, category_routes, resume_routes
+from backend.database import get_db_connection, init_db, pool, writer, run_db
+from backend import bulk_import, recompress, status_sweep, thumbnails
+from backend.utils import pagination
+from backend.routes import certificate_routes, profile_routes, seatimelog_routes, document_routes, auth_routes, dashboard_routes, category_routes, resume_routes, search_routes, system_routes
+from datetime import date
+import asyncio
 import contextlib
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    await run_db(init_db)
+    await status_sweep.run_sweep()
+    sweep_task = asyncio.create_task(status_sweep.run_daily(last_run=date.today()))
+    # Compress payloads stored by older versions, a batch at a time
+    recompress_task = asyncio.create_task(recompress.run_recompress())
     yield
+    for task in (sweep_task, recompress_task):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    thumbnails.shutdown()
+    bulk_import.shutdown()
+    writer.stop()
+    pool.close_all()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -17,6 +33,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=pagination.PAGE_HEADERS,
 )
 
 app.include_router(certificate_routes.router)
@@ -27,6 +44,8 @@ app.include_router(auth_routes.router)
 app.include_router(dashboard_routes.router)
 app.include_router(category_routes.router)
 app.include_router(resume_routes.router)
+app.include_router(search_routes.router)
+app.include_router(system_routes.router)
 
 if __name__ == "__main__":
     try:
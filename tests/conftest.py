@@ -0,0 +1,39 @@
+"""
+Fixtures pointing the backend at a fresh database and blob store per test.
+
+The pool and writer are module-level singletons that backend.main also
+imported, so they are retargeted in place rather than replaced.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import blob_store, cache, database, thumbnails
+
+EMAIL = "john.doe@example.com"
+PASSWORD = "password123"
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "test.db")
+    database.writer.stop()
+    database.pool.close_all()
+    monkeypatch.setattr(database, "DATABASE_NAME", path)
+    monkeypatch.setattr(database.pool, "database", path)
+    monkeypatch.setattr(database.writer, "database", path)
+    monkeypatch.setattr(blob_store, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    for user_cache in (cache.dashboard_cache, cache.sea_interval_cache, cache.category_cache):
+        user_cache.clear()
+    database.init_db()
+    yield path
+    database.writer.stop()
+    database.pool.close_all()
+
+@pytest.fixture
+def client(db_path):
+    from backend.main import app
+    with TestClient(app) as c:
+        response = c.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        c.headers["Authorization"] = "Bearer " + response.json()["access_token"]
+        yield c
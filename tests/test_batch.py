@@ -0,0 +1,34 @@
+import base64
+
+DOC = {
+    "docID": "P123", "docType": "passport", "category": "Travel", "status": "VALID", "expiry": "2030-06-01",
+    "docName": "passport.pdf", "issueDate": "2015-01-01T00:00:00", "uploadDate": "2024-02-01T00:00:00",
+    "hidden": False,
+}
+
+def _create(client, n):
+    return [client.post("/documents", json=dict(DOC, doc=base64.b64encode(f"doc {i}".encode()).decode())).json()["id"]
+            for i in range(n)]
+
+def test_document_batch_reports_invalid_changes_per_item(client):
+    ids = _create(client, 4)
+    response = client.post("/documents/batch", json={"operations": [
+        {"op": "update", "id": ids[0], "changes": {"expiry": 20300101}},
+        {"op": "update", "id": ids[1], "changes": {"docName": {"nested": True}}},
+        {"op": "update", "id": ids[2], "changes": {"docName": "Renamed", "expiry": "2001-01-01"}},
+        {"op": "delete", "id": ids[3]},
+    ]})
+    assert response.status_code == 200
+    statuses = [result["status"] for result in response.json()["results"]]
+    assert statuses == [400, 400, 200, 200]
+    renamed = client.get(f"/documents/{ids[2]}").json()
+    assert renamed["docName"] == "Renamed"
+    assert renamed["status"] != "VALID"
+    assert client.get(f"/documents/{ids[0]}").json()["expiry"] == "2030-06-01"
+    assert client.get(f"/documents/{ids[3]}").status_code == 404
+
+def test_document_patch_rejects_wrong_types(client):
+    [doc_id] = _create(client, 1)
+    assert client.patch(f"/documents/{doc_id}", json={"expiry": [1]}).status_code == 400
+    assert client.patch(f"/documents/{doc_id}", json={"expiry": None}).status_code == 200
+    assert client.get(f"/documents/{doc_id}").json()["expiry"] is None
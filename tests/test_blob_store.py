@@ -0,0 +1,101 @@
+import base64
+import io
+import os
+
+from backend import blob_store
+from backend.controllers import document_controller
+
+DOC = {
+    "docID": "P123", "docType": "passport", "category": "Travel", "status": "VALID", "expiry": "2030-06-01",
+    "docName": "passport.pdf", "issueDate": "2015-01-01T00:00:00", "uploadDate": "2024-02-01T00:00:00",
+    "hidden": False, "doc": base64.b64encode(b"shared payload").decode(),
+}
+
+def _delete_blob_before_insert(monkeypatch, ref_holder):
+    # Stands in for a concurrent delete landing between put() and the INSERT
+    categorize = document_controller._category
+
+    def category_then_delete(db, doc, user_id):
+        blob_store.delete_unreferenced(ref_holder)
+        return categorize(db, doc, user_id)
+    monkeypatch.setattr(document_controller, "_category", category_then_delete)
+
+def test_delete_unreferenced_keeps_referenced_blobs(client):
+    first = client.post("/documents", json=DOC).json()
+    second = client.post("/documents", json=DOC).json()
+    ref = blob_store.ref_of(DOC["doc"])
+    assert client.delete(f"/documents/{first['id']}").status_code == 204
+    assert blob_store.exists(ref)
+    assert client.delete(f"/documents/{second['id']}").status_code == 204
+    assert not blob_store.exists(ref)
+
+def test_create_restores_blob_deleted_before_insert(client, monkeypatch):
+    _delete_blob_before_insert(monkeypatch, [blob_store.ref_of(DOC["doc"])])
+    created = client.post("/documents", json=DOC).json()
+    response = client.get(f"/documents/{created['id']}/content")
+    assert response.status_code == 200
+    assert response.content == b"shared payload"
+
+def test_upload_restores_blob_deleted_before_insert(client, monkeypatch):
+    _delete_blob_before_insert(monkeypatch, [blob_store.ref_of(b"uploaded bytes")])
+    response = client.post(
+        "/documents/upload",
+        data={"docID": "U1", "docType": "scan", "issueDate": "2020-01-01T00:00:00"},
+        files={"file": ("scan.txt", b"uploaded bytes", "text/plain")},
+    )
+    assert response.status_code == 201, response.text
+    content = client.get(f"/documents/{response.json()['id']}/content")
+    assert content.content == b"uploaded bytes"
+
+def test_json_and_multipart_record_the_same_size(client):
+    payload = b"same file, either way"
+    client.post("/documents", json=dict(DOC, doc="data:application/pdf;base64," + base64.b64encode(payload).decode()))
+    client.post("/documents/upload", data={"docID": "P123", "docType": "passport", "issueDate": "2015-01-01T00:00:00"},
+                files={"file": ("passport.pdf", payload, "application/pdf")})
+    assert [summary["docSize"] for summary in client.get("/documents").json()] == [len(payload)] * 2
+
+def test_payload_range_reads(db_path):
+    data = bytes(range(256)) * 40
+    # Incompressible-looking raw bytes, a base64 data: URL, and a compressible payload
+    raw_ref, _, raw_codec = blob_store.put_stream(io.BytesIO(data), compress=False)
+    text = b"data:application/pdf;base64," + base64.b64encode(data)
+    text_ref, text_codec = blob_store.put(text, compress=False)
+    packed_ref, packed_codec = blob_store.put(b"stcw " * 5000)
+    assert (raw_codec, text_codec) == ("none", "none") and packed_codec != "none"
+
+    with blob_store.Payload(raw_ref, blob_store.ENCODING_RAW, raw_codec) as payload:
+        assert payload.size == len(data)
+        assert payload.read(1000, 50) == data[1000:1050]
+    with blob_store.Payload(text_ref, blob_store.ENCODING_BASE64, text_codec) as payload:
+        assert payload.media_type == "application/pdf" and payload.size == len(data)
+        assert b"".join(payload.iter_range(7, 5000, chunk_size=333)) == data[7:5001]
+    with blob_store.Payload(packed_ref, blob_store.ENCODING_RAW, packed_codec) as payload:
+        assert payload.read(5, 10) == (b"stcw " * 5000)[5:15]
+    assert blob_store.read(raw_ref, raw_codec) == data
+    assert blob_store.read(packed_ref, packed_codec) == b"stcw " * 5000
+
+def test_empty_blob(db_path):
+    ref, codec = blob_store.put(b"", compress=False)
+    assert blob_store.read(ref, codec) == b""
+    with blob_store.Payload(ref, blob_store.ENCODING_RAW, codec) as payload:
+        assert payload.size == 0 and payload.read() == b""
+
+def test_delete_succeeds_when_blob_file_is_locked(client, monkeypatch):
+    created = client.post("/documents", json=dict(DOC, doc=base64.b64encode(b"locked").decode())).json()
+    ref = blob_store.ref_of(base64.b64encode(b"locked").decode())
+    remove = os.remove
+
+    def locked(path, *args, **kwargs):
+        # What Windows does while a reader has the file open or mapped
+        if ref in os.path.basename(path):
+            raise PermissionError(13, "The process cannot access the file", path)
+        return remove(path, *args, **kwargs)
+    monkeypatch.setattr(os, "remove", locked)
+
+    assert client.delete(f"/documents/{created['id']}").status_code == 204
+    assert client.get(f"/documents/{created['id']}").status_code == 404
+    assert blob_store.exists(ref) and blob_store.is_leftover(ref)
+
+    monkeypatch.setattr(os, "remove", remove)
+    blob_store.delete_unreferenced([])
+    assert not blob_store.exists(ref) and not blob_store.is_leftover(ref)
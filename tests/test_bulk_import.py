@@ -0,0 +1,12 @@
+import zipfile
+
+from backend import blob_store, bulk_import
+
+def test_unrenderable_pdf_is_still_imported(db_path, tmp_path):
+    archive = str(tmp_path / "import.zip")
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("Medical/broken.pdf", b"%PDF-1.4\nnot really a pdf")
+    row = bulk_import.process_entry(archive, "Medical/broken.pdf", (("Medical", "medical"),))
+    assert row["thumbnail"] is None
+    assert row["category"] == "Medical"
+    assert blob_store.exists(row["ref"])
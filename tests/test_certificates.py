@@ -0,0 +1,23 @@
+import base64
+
+from backend import blob_store
+
+CERT = {
+    "cert": base64.b64encode(b"certificate").decode(), "certType": "STCW", "issuedBy": "DG Shipping",
+    "status": "VALID", "expiry_date": "2030-01-01", "certName": "Basic Safety",
+    "issueDate": "2020-01-01T00:00:00", "uploadDate": "2024-01-01T00:00:00", "hidden": False,
+}
+
+def test_update_replaces_payload(client):
+    created = client.post("/certificates", json=CERT).json()
+    payload = base64.b64encode(b"renewed").decode()
+    response = client.put(f"/certificates/{created['id']}", json={"cert": payload})
+    assert response.status_code == 200
+    assert blob_store.exists(blob_store.ref_of(payload))
+    assert not blob_store.exists(blob_store.ref_of(CERT["cert"]))
+
+def test_update_of_missing_certificate_keeps_no_blob(client):
+    payload = base64.b64encode(b"orphan").decode()
+    response = client.put("/certificates/99999", json={"cert": payload})
+    assert response.status_code == 404
+    assert not blob_store.exists(blob_store.ref_of(payload))
@@ -0,0 +1,37 @@
+from backend import classifier
+from backend.cache import invalidate_categories
+from backend.database import UnitOfWork, execute_write
+
+def test_first_matching_pattern_wins():
+    categories = classifier.Classifier([("Medical", "medical|health"), ("Safety", "safety|stcw"), ("Broken", "(")])
+    assert categories.labels == ["Medical", "Safety"]
+    assert categories.classify("STCW basic safety and health") == "Medical"
+    assert categories.classify("stcw") == "Safety"
+    assert categories.classify("passport") is None
+
+def test_classifier_sees_categories_committed_during_the_request(db_path):
+    db = UnitOfWork()
+    try:
+        # The request's read snapshot starts before the category is added
+        assert classifier.get_classifier(db, 1, classifier.DOCUMENT).classify("zzyzx") is None
+        execute_write(lambda conn: conn.execute(
+            "INSERT INTO document_categories (label, color, icon, pattern, user_id, is_system, scope) VALUES ('Zed', 'zinc', 'File', 'zzyzx', 1, 0, 'document')"
+        ))
+        invalidate_categories(1)
+        assert classifier.get_classifier(db, 1, classifier.DOCUMENT).classify("zzyzx") == "Zed"
+    finally:
+        db.close()
+
+def test_blank_category_is_assigned_on_create(client):
+    document = {
+        "docID": "P1", "docType": "Passport", "category": "", "status": "VALID", "docName": "scan.pdf",
+        "issueDate": "2015-01-01T00:00:00", "uploadDate": "2024-02-01T00:00:00", "hidden": False, "doc": "eHg=",
+    }
+    assert client.post("/documents", json=document).json()["category"] == "Travel"
+
+def test_unmatched_certificate_gets_the_default_category(client):
+    certificate = {
+        "cert": "eHg=", "certType": "Misc", "issuedBy": "Self", "status": "VALID", "certName": "Cooking course",
+        "issueDate": "2020-01-01T00:00:00", "uploadDate": "2024-01-01T00:00:00", "hidden": False,
+    }
+    assert client.post("/certificates", json=certificate).json()["category"] == classifier.DEFAULT_CATEGORY
@@ -0,0 +1,93 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from backend import database
+from backend.database import BlockingCallError, DatabaseWriter, UnitOfWork, execute_write, run_db
+
+@pytest.fixture
+def writer(tmp_path):
+    path = str(tmp_path / "writer.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    conn.close()
+    # A wide window so every job submitted below lands in one batch
+    writer = DatabaseWriter(path, window=0.5)
+    yield writer, path
+    writer.stop()
+
+def _names(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT name FROM items"))
+    finally:
+        conn.close()
+
+def _insert(conn, name):
+    return conn.execute("INSERT INTO items (name) VALUES (?)", (name,)).lastrowid
+
+def _insert_then_fail(conn, name):
+    _insert(conn, name)
+    raise ValueError("job failed")
+
+def test_jobs_share_one_commit(writer):
+    writer, path = writer
+    futures = [writer.submit(_insert, f"item {i}") for i in range(5)]
+    assert len({future.result() for future in futures}) == 5
+    stats = writer.stats()
+    assert stats["batches"] == 1 and stats["jobs"] == 5
+    assert len(_names(path)) == 5
+
+def test_failed_job_rolls_back_only_itself(writer):
+    writer, path = writer
+    first = writer.submit(_insert, "first")
+    failing = writer.submit(_insert_then_fail, "failing")
+    last = writer.submit(_insert, "last")
+    first.result(), last.result()
+    with pytest.raises(ValueError):
+        failing.result()
+    assert writer.stats()["batches"] == 1
+    assert _names(path) == ["first", "last"]
+
+def test_unit_of_work_sees_its_own_write(db_path):
+    db = UnitOfWork()
+    try:
+        before = db.conn.execute("SELECT count(*) FROM sea_time_logs").fetchone()[0]
+        db.write(lambda conn: conn.execute(
+            "INSERT INTO sea_time_logs (vesselName, signOn, signOff, user_id) VALUES ('MV Test', '2023-01-01', '2023-02-01', 1)"
+        ))
+        assert db.conn.execute("SELECT count(*) FROM sea_time_logs").fetchone()[0] == before + 1
+    finally:
+        db.close()
+
+def test_unit_of_work_snapshot_until_refresh(db_path):
+    db = UnitOfWork()
+    try:
+        # The read transaction starts lazily on first use and holds its snapshot
+        assert db.conn.in_transaction
+        before = db.conn.execute("SELECT count(*) FROM resume_drafts").fetchone()[0]
+        execute_write(lambda conn: conn.execute("INSERT INTO resume_drafts (name, data, user_id) VALUES ('cv', '{}', 1)"))
+        assert db.conn.execute("SELECT count(*) FROM resume_drafts").fetchone()[0] == before
+        db.refresh()
+        assert db.conn.execute("SELECT count(*) FROM resume_drafts").fetchone()[0] == before + 1
+    finally:
+        db.close()
+
+def test_blocking_call_guard(db_path, monkeypatch):
+    monkeypatch.setattr(database, "DEBUG", True)
+    conn = database.get_db_connection()
+
+    async def on_loop():
+        with pytest.raises(BlockingCallError):
+            conn.execute("SELECT 1")
+        with pytest.raises(BlockingCallError):
+            execute_write(lambda c: None)
+        # The same call through the DB thread pool is allowed
+        return await run_db(lambda: conn.execute("SELECT 1").fetchone()[0])
+
+    try:
+        assert asyncio.run(on_loop()) == 1
+        assert conn.execute("SELECT 1").fetchone()[0] == 1
+    finally:
+        conn.close()
@@ -0,0 +1,43 @@
+import base64
+
+from backend import duplicates
+
+DOC = {
+    "docID": "P123", "docType": "passport", "category": "Travel", "status": "VALID", "expiry": "2030-06-01",
+    "docName": "passport.pdf", "issueDate": "2015-01-01T00:00:00", "uploadDate": "2024-02-01T00:00:00",
+    "hidden": False, "doc": base64.b64encode(b"scanned once").decode(),
+}
+UPLOAD = {"docID": "P123", "docType": "passport", "issueDate": "2015-01-01T00:00:00"}
+
+def _miss_first_check(monkeypatch):
+    # Stands in for a concurrent create committing after the request's read snapshot was taken
+    check = duplicates.check
+    calls = []
+
+    def stale_then_check(conn, *args, **kwargs):
+        calls.append(conn)
+        return None if len(calls) == 1 else check(conn, *args, **kwargs)
+    monkeypatch.setattr(duplicates, "check", stale_then_check)
+
+def test_reject_rechecks_inside_the_writer(client, monkeypatch):
+    first = client.post("/documents", json=DOC).json()
+    _miss_first_check(monkeypatch)
+    response = client.post("/documents?onDuplicate=reject", json=DOC)
+    assert response.status_code == 409
+    assert response.json()["detail"]["duplicateOf"] == first["id"]
+    assert len(client.get("/documents").json()) == 1
+
+def test_reuse_rechecks_inside_the_writer(client, monkeypatch):
+    first = client.post("/documents", json=DOC).json()
+    _miss_first_check(monkeypatch)
+    response = client.post("/documents?onDuplicate=reuse", json=DOC)
+    assert response.status_code == 200
+    assert response.json()["id"] == first["id"]
+
+def test_upload_reject_rechecks_inside_the_writer(client, monkeypatch):
+    files = {"file": ("scan.pdf", b"uploaded once", "application/pdf")}
+    first = client.post("/documents/upload", data=UPLOAD, files=files).json()
+    _miss_first_check(monkeypatch)
+    response = client.post("/documents/upload?onDuplicate=reject", data=UPLOAD, files=files)
+    assert response.status_code == 409
+    assert response.json()["detail"]["duplicateOf"] == first["id"]
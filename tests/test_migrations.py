@@ -0,0 +1,98 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from backend import blob_store, migrations
+
+COMMITTED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "certmanager.db")
+
+@pytest.fixture(autouse=True)
+def blobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_DIR", str(tmp_path / "blobs"))
+
+def _connect(path):
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _legacy_database(path):
+    """Tables as shipped before versioning: inline payloads, most of the columns _001_baseline adds missing."""
+    conn = sqlite3.connect(str(path))
+    conn.executescript('''
+        CREATE TABLE certificates (id INTEGER PRIMARY KEY AUTOINCREMENT, cert BLOB, certType TEXT, status TEXT,
+            expiry TEXT, certName TEXT, issueDate TEXT, uploadDate TEXT, hidden BOOLEAN, user_id INTEGER);
+        CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, docID TEXT, doc BLOB, docType TEXT,
+            category TEXT, status TEXT, expiry TEXT, docName TEXT, issueDate TEXT, uploadDate TEXT, hidden BOOLEAN);
+        CREATE TABLE sea_time_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, imo INTEGER, offNo INTEGER, flag TEXT,
+            vesselName TEXT, type TEXT, company TEXT, mainEngine TEXT, bhp REAL, torque REAL, dwt REAL, rank TEXT,
+            signOn TEXT, signOff TEXT, uploadDate TEXT);
+        INSERT INTO certificates (cert, certType, certName, expiry, user_id) VALUES (X'6365727431', 'STCW', 'Basic Safety Training', '2030-01-01', 1);
+        INSERT INTO certificates (cert, certType, certName, expiry, user_id) VALUES (X'6365727432', 'Misc', 'Cooking course', '2030-01-01', 1);
+        INSERT INTO documents (docID, doc, docType, category, docName) VALUES ('P1', 'ZG9jMQ==', 'passport', 'Travel', 'passport.pdf');
+        INSERT INTO sea_time_logs (imo, vesselName, type, bhp, rank, signOn, signOff)
+            VALUES (1234567, 'MV Legacy', 'Tanker', 10000, 'Third Engineer', '2023-01-01T00:00:00', '2023-03-01T00:00:00');
+    ''')
+    conn.commit()
+    conn.close()
+
+def test_fresh_database_reaches_current_version(tmp_path):
+    conn = _connect(tmp_path / "fresh.db")
+    try:
+        assert migrations.migrate(conn) == [version for version, _, _ in migrations.MIGRATIONS]
+        assert migrations.get_schema_version(conn) == migrations.SCHEMA_VERSION
+        assert migrations.migrate(conn) == []
+    finally:
+        conn.close()
+
+def test_legacy_database_is_upgraded(tmp_path):
+    path = tmp_path / "legacy.db"
+    _legacy_database(path)
+    conn = _connect(path)
+    try:
+        migrations.migrate(conn)
+        assert migrations.get_schema_version(conn) == migrations.SCHEMA_VERSION
+
+        doc = conn.execute("SELECT doc, doc_ref, doc_size FROM documents").fetchone()
+        assert doc["doc"] is None and doc["doc_size"] == 4
+        assert blob_store.read(doc["doc_ref"]) == b"ZG9jMQ=="
+        cert, unmatched = conn.execute("SELECT cert, cert_ref, category FROM certificates ORDER BY id").fetchall()
+        assert cert["cert"] is None and blob_store.read(cert["cert_ref"]) == b"cert1"
+        assert cert["category"] == "STCW"
+        assert unmatched["category"] == "Other"
+        log = conn.execute("SELECT kw, dept FROM sea_time_logs").fetchone()
+        assert log["kw"] == pytest.approx(7457) and log["dept"] == "ENGINE"
+        assert conn.execute("SELECT count(*) FROM documents_fts WHERE documents_fts MATCH 'passport'").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+def test_every_step_is_idempotent(tmp_path):
+    path = tmp_path / "twice.db"
+    _legacy_database(path)
+    conn = _connect(path)
+    try:
+        migrations.migrate(conn)
+        tables = ("documents", "certificates", "sea_time_logs", "profiles", "document_categories", "sea_time_rollups")
+        counts = {table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in tables}
+        rollups = conn.execute("SELECT * FROM sea_time_rollups ORDER BY dimension, key").fetchall()
+        # Re-run every step over the migrated schema, as for a pre-versioning copy
+        conn.execute("PRAGMA user_version = 0")
+        migrations.migrate(conn)
+        assert migrations.get_schema_version(conn) == migrations.SCHEMA_VERSION
+        assert {table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in tables} == counts
+        assert conn.execute("SELECT * FROM sea_time_rollups ORDER BY dimension, key").fetchall() == rollups
+    finally:
+        conn.close()
+
+@pytest.mark.skipif(not os.path.exists(COMMITTED_DB), reason="no bundled database")
+def test_committed_database_migrates(tmp_path):
+    path = tmp_path / "committed.db"
+    shutil.copy(COMMITTED_DB, path)
+    conn = _connect(path)
+    try:
+        migrations.migrate(conn)
+        assert migrations.get_schema_version(conn) == migrations.SCHEMA_VERSION
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    finally:
+        conn.close()
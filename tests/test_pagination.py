@@ -0,0 +1,83 @@
+import base64
+import json
+import sqlite3
+from datetime import date
+
+import pytest
+
+from backend.utils import pagination
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, user_id INTEGER, expiry TEXT)")
+    # Many rows share a sort value (and some have none), so pages must split ties by id
+    rows = [(i, 1, ["2024-01-01", "2024-06-01", None][i % 3]) for i in range(1, 31)]
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?)", rows + [(100, 2, "2024-01-01")])
+    yield conn
+    conn.close()
+
+def _all_pages(conn, sort, limit):
+    ids, cursor = [], None
+    while True:
+        rows, cursor, _ = pagination.fetch_page(conn, "items", "id", ["user_id = ?"], [1], sort, cursor, limit)
+        ids += [row["id"] for row in rows]
+        if cursor is None:
+            return ids
+
+@pytest.mark.parametrize("sort", ["expiry", "-expiry"])
+def test_pages_cover_every_row_once_in_order(conn, sort):
+    descending = sort.startswith("-")
+    expected = [row["id"] for row in conn.execute(
+        f"SELECT id FROM items WHERE user_id = 1 ORDER BY IFNULL(expiry, '') {'DESC' if descending else 'ASC'}, id {'DESC' if descending else 'ASC'}"
+    )]
+    for limit in (1, 4, 7, 30, 50):
+        assert _all_pages(conn, sort, limit) == expected
+
+def test_total_ignores_the_cursor(conn):
+    _, cursor, total = pagination.fetch_page(conn, "items", "id", ["user_id = ?"], [1], "expiry", None, 5, count=True)
+    _, _, later = pagination.fetch_page(conn, "items", "id", ["user_id = ?"], [1], "expiry", cursor, 5, count=True)
+    assert total == later == 30
+
+def test_cursor_round_trip():
+    cursor = pagination.encode_cursor("-uploadDate", "2024-01-01T00:00:00", 42)
+    assert "=" not in cursor
+    assert pagination.decode_cursor(cursor, "-uploadDate") == ("2024-01-01T00:00:00", 42)
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(json.dumps(["expiry", "2024-01-01", "7"]).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps(["expiry", 5, 7]).encode()).decode(),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(cursor, "expiry")
+
+def test_cursor_for_another_sort_is_rejected():
+    cursor = pagination.encode_cursor("expiry", "2024-01-01", 7)
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(cursor, "-expiry")
+
+def test_parse_sort_and_filters():
+    assert pagination.parse_sort("-expiry", ("uploadDate", "expiry")) == ("expiry", True)
+    with pytest.raises(ValueError):
+        pagination.parse_sort("id; DROP TABLE items", ("uploadDate", "expiry"))
+    conditions, params = pagination.date_range("expiry", date(2024, 1, 1), date(2024, 1, 31))
+    assert conditions == ["expiry >= ?", "expiry < ?"] and params == ["2024-01-01", "2024-02-01"]
+
+def test_list_endpoint_pages_and_rejects_bad_cursor(client):
+    for i in range(5):
+        client.post("/seatimelogs", json={
+            "imo": 1234567, "offNo": i, "flag": "Panama", "vesselName": f"MV {i}", "type": "Tanker", "company": "ACME",
+            "dept": "ENGINE", "mainEngine": "MAN", "bhp": 10000, "kw": 7457, "dwt": 50000, "rank": "Third Engineer",
+            "signOn": "2023-01-01T00:00:00", "signOff": "2023-02-01T00:00:00", "uploadDate": "2024-01-01T00:00:00",
+        })
+    first = client.get("/seatimelogs", params={"limit": 2, "count": True})
+    assert first.status_code == 200 and first.headers[pagination.TOTAL_COUNT_HEADER] == "5"
+    second = client.get("/seatimelogs", params={"limit": 10, "cursor": first.headers[pagination.NEXT_CURSOR_HEADER]})
+    ids = [log["id"] for log in first.json() + second.json()]
+    assert len(ids) == len(set(ids)) == 5
+    assert pagination.NEXT_CURSOR_HEADER not in second.headers
+    assert client.get("/seatimelogs", params={"limit": 2, "cursor": "garbage"}).status_code == 400
@@ -0,0 +1,43 @@
+import asyncio
+import os
+
+from backend import blob_store, recompress
+from backend.database import UnitOfWork, execute_write
+
+PAYLOAD = b"stcw basic safety training " * 2000
+
+def _legacy_document(ref):
+    execute_write(lambda conn: conn.execute(
+        "INSERT INTO documents (docID, doc_ref, doc_size, doc_codec, docType, category, docName, user_id) "
+        "VALUES ('L1', ?, ?, NULL, 'scan', 'Other', 'legacy.txt', 1)", (ref, len(PAYLOAD))
+    ))
+
+def _codec(ref):
+    db = UnitOfWork()
+    try:
+        return db.conn.execute("SELECT doc_codec FROM documents WHERE doc_ref = ?", (ref,)).fetchone()[0]
+    finally:
+        db.close()
+
+def test_locked_uncompressed_blob_is_skipped_and_retried(db_path, monkeypatch):
+    ref, _ = blob_store.put(PAYLOAD, compress=False)
+    _legacy_document(ref)
+    uncompressed = blob_store.blob_path(ref)
+    remove = os.remove
+
+    def locked(path, *args, **kwargs):
+        if path == uncompressed:
+            raise PermissionError(13, "The process cannot access the file", path)
+        return remove(path, *args, **kwargs)
+    monkeypatch.setattr(os, "remove", locked)
+    skipped = recompress.get_recompress_stats()["skipped"]
+
+    assert asyncio.run(recompress.run_recompress()) == 1
+    codec = _codec(ref)
+    assert codec != "none" and os.path.exists(uncompressed)
+    assert recompress.get_recompress_stats()["skipped"] == skipped + 1
+
+    monkeypatch.setattr(os, "remove", remove)
+    assert asyncio.run(recompress.run_recompress()) == 0
+    assert not os.path.exists(uncompressed)
+    assert blob_store.read(ref, codec) == PAYLOAD
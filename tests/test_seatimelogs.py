@@ -0,0 +1,24 @@
+LOG = {
+    "imo": 1234567, "offNo": 1, "flag": "Panama", "vesselName": "MV Test", "type": "Tanker", "company": "ACME",
+    "dept": "ENGINE", "mainEngine": "MAN", "bhp": 10000, "kw": 7457, "dwt": 50000, "rank": "Third Engineer",
+    "signOn": "2023-01-01T00:00:00", "signOff": "2023-03-01T00:00:00", "uploadDate": "2024-01-01T00:00:00",
+}
+
+def test_analytics_timeline(client):
+    assert client.post("/seatimelogs", json=LOG).status_code in (200, 201)
+    response = client.get("/seatimelogs/analytics", params={"from": "2022-11", "to": "2023-02"})
+    assert response.status_code == 200
+    timeline = response.json()["timeline"]
+    assert [m["month"] for m in timeline] == ["2022-11", "2022-12", "2023-01", "2023-02"]
+    assert timeline[0]["days"] == 0 and timeline[2]["days"] > 0
+
+def test_analytics_rejects_out_of_range_month(client):
+    for params in ({"from": "2024-13", "to": "2025-01"}, {"from": "2024-01", "to": "2024-00"}):
+        response = client.get("/seatimelogs/analytics", params=params)
+        assert response.status_code == 400, params
+
+def test_analytics_caps_the_timeline_span(client):
+    response = client.get("/seatimelogs/analytics", params={"from": "0001-01", "to": "9999-12"})
+    assert response.status_code == 400
+    response = client.get("/seatimelogs/analytics", params={"from": "1925-01", "to": "2024-12"})
+    assert response.status_code == 200 and len(response.json()["timeline"]) == 1200